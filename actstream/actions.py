@@ -1,3 +1,4 @@
+import threading
 
 from django.utils import timezone
 
@@ -5,6 +6,11 @@ from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 
 from actstream.exceptions import check_actionable_model
+from actstream.signals import action
+
+# actions waiting to be recorded, and ids of the actions waiting to be fanned
+# out, in the current thread, see buffer_actions()
+_buffer = threading.local()
 
 
 def follow(user, obj, send_action=True, actor_only=False, request=None):
@@ -92,10 +98,67 @@ def is_following(user, obj):
         content_type=ContentType.objects.get_for_model(obj)).count())
 
 
+def buffer_actions():
+    """
+    Starts buffering the actions sent in the current thread instead of saving
+    them, if ACTSTREAM_BUFFER_ACTIONS is enabled. Buffered actions are saved
+    by flush_actions(). Used by actstream.middleware.ActionBufferMiddleware to
+    record the actions of a request with a single Celery task.
+
+    The fan out to the feed inboxes of the actions saved right away is
+    delayed until flush_actions() too, so that the task does not run before
+    the request transaction commits them.
+    """
+    from actstream import settings as actstream_settings
+
+    _buffer.fan_outs = []
+    if actstream_settings.BUFFER_ACTIONS:
+        _buffer.actions = []
+
+
+def flush_actions(discard=False):
+    """
+    Stops buffering actions in the current thread and queues the buffered
+    ones to be bulk inserted, unless discard is True.
+    """
+    fan_outs, _buffer.fan_outs = getattr(_buffer, 'fan_outs', None), None
+    if fan_outs and not discard:
+        from actstream.tasks import fan_out_action
+        for action_id in fan_outs:
+            fan_out_action.delay(action_id)
+
+    actions, _buffer.actions = getattr(_buffer, 'actions', None), None
+    if not actions or discard:
+        return
+
+    from actstream.tasks import record_actions
+    record_actions.delay([dict([(f.attname, getattr(a, f.attname))
+        for f in a._meta.local_fields if f.attname != 'id'])
+        for a in actions])
+
+
+def create_action(actor, **kwargs):
+    """
+    Sends the action signal and returns the Action created by
+    action_handler(), or None if it is not connected.
+
+    Buffered actions have no id until they are recorded. Pass buffered=False
+    to save the action right away, e.g. to link it to another object::
+
+        vote.action_id = create_action(request.user, verb='voted',
+            action_object=election, buffered=False).id
+    """
+    for receiver, response in action.send(actor, **kwargs):
+        if receiver is action_handler:
+            return response
+
+
 def action_handler(verb, **kwargs):
     """
     Handler function to create Action instance upon action signal call.
+    Returns the created action.
     """
+    from actstream import settings as actstream_settings
     from actstream.models import Action
 
     kwargs.pop('signal', None)
@@ -119,4 +182,18 @@ def action_handler(verb, **kwargs):
             setattr(newaction, '%s_content_type' % opt,
                     ContentType.objects.get_for_model(obj))
 
+    buffered_actions = getattr(_buffer, 'actions', None)
+    if buffered_actions is not None and kwargs.pop('buffered', True):
+        buffered_actions.append(newaction)
+        return newaction
+
     newaction.save()
+
+    if actstream_settings.USE_FEED_INBOX and newaction.public:
+        fan_outs = getattr(_buffer, 'fan_outs', None)
+        if fan_outs is not None:
+            fan_outs.append(newaction.id)
+        else:
+            from actstream.tasks import fan_out_action
+            fan_out_action.delay(newaction.id)
+    return newaction
@@ -1,7 +1,6 @@
 from django.conf import settings
 from django.db.models import Manager
 from django.db.models.query import QuerySet, EmptyQuerySet
-from django.utils.encoding import smart_unicode
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.generic import GenericForeignKey
@@ -9,6 +8,14 @@ from django.contrib.contenttypes.generic import GenericForeignKey
 USE_PREFETCH = getattr(settings, 'USE_PREFETCH', False)
 FETCH_RELATIONS = getattr(settings, 'FETCH_RELATIONS', True)
 
+# Options used to load the objects of each model, keyed by
+# "app_label.modelname", as in:
+#
+#     {'agora_core.election': {'select_related': ('agora', ), 'only': ()}}
+#
+# Models not listed are loaded without following any foreign key.
+FETCH_OPTIONS = getattr(settings, 'ACTSTREAM_GFK_FETCH_OPTIONS', {})
+
 
 class GFKManager(Manager):
     """
@@ -22,6 +29,64 @@ class GFKManager(Manager):
         return self.get_query_set().none()
 
 
+def get_fetch_queryset(model_class, using):
+    """
+    Returns the queryset used to load the objects of a model pointed by generic
+    foreign keys, applying its ACTSTREAM_GFK_FETCH_OPTIONS.
+    """
+    key = '%s.%s' % (model_class._meta.app_label, model_class._meta.module_name)
+    options = FETCH_OPTIONS.get(key, {})
+    objects = model_class._default_manager.using(using)
+    if options.get('select_related'):
+        objects = objects.select_related(*options['select_related'])
+    if options.get('only'):
+        objects = objects.only(*options['only'])
+    return objects
+
+
+def fetch_generic_relations(items, gfk_fields, using=None):
+    """
+    Loads the objects pointed by the given generic foreign keys of a list of
+    model instances with one query per content type, and caches them in the
+    instances. Content types come from the ContentType cache.
+    """
+    if not items or not gfk_fields:
+        return
+
+    model = items[0].__class__
+    ct_fields = dict([(gfk.name, model._meta.get_field(gfk.ct_field))
+        for gfk in gfk_fields])
+
+    ct_map = {}
+    for item in items:
+        for gfk in gfk_fields:
+            ct_id = getattr(item, ct_fields[gfk.name].column)
+            object_id = getattr(item, gfk.fk_field)
+            if ct_id is not None and object_id is not None:
+                ct_map.setdefault(ct_id, set()).add(object_id)
+
+    ctypes, data_map = {}, {}
+    for ct_id, object_ids in ct_map.iteritems():
+        ctypes[ct_id] = ContentType.objects.db_manager(using).get_for_id(ct_id)
+        model_class = ctypes[ct_id].model_class()
+        if model_class is None:
+            continue
+        objects = get_fetch_queryset(model_class, using)
+        for o in objects.filter(pk__in=object_ids):
+            data_map[(ct_id, o.pk)] = o
+
+    for item in items:
+        for gfk in gfk_fields:
+            ct_field = ct_fields[gfk.name]
+            ct_id = getattr(item, ct_field.column)
+            if ct_id is None:
+                continue
+            setattr(item, ct_field.get_cache_name(), ctypes[ct_id])
+            # objects which no longer exist are cached as None
+            setattr(item, gfk.cache_attr, data_map.get(
+                (ct_id, getattr(item, gfk.fk_field))))
+
+
 class GFKQuerySet(QuerySet):
     """
     A QuerySet with a fetch_generic_relations() method to bulk fetch
@@ -31,60 +96,70 @@ class GFKQuerySet(QuerySet):
     Based on http://www.djangosnippets.org/snippets/984/
     Firstly improved at http://www.djangosnippets.org/snippets/1079/
 
-    Extended in django-activity-stream to allow for multi db, text primary keys
-    and empty querysets.
+    Extended in django-activity-stream to allow for multi db and empty
+    querysets. Object ids are integers, as are the actionable models primary
+    keys.
+
+    Generic relations are fetched when the queryset is evaluated, so that a
+    sliced stream only loads the objects of the actions in the slice. Prefetch
+    hooks added with add_prefetch_hook() are then called with the list of
+    loaded instances, to load in bulk other objects related to them.
     """
+    _gfk_names = None
+    _prefetch_hooks = ()
+
     def fetch_generic_relations(self, *args):
         qs = self._clone()
 
         if not FETCH_RELATIONS:
             return qs
 
-        gfk_fields = [g for g in self.model._meta.virtual_fields
-                      if isinstance(g, GenericForeignKey)]
+        gfk_names = [g.name for g in self.model._meta.virtual_fields
+                     if isinstance(g, GenericForeignKey)]
         if args:
-            gfk_fields = filter(lambda g: g.name in args, gfk_fields)
+            gfk_names = filter(lambda name: name in args, gfk_names)
 
         if USE_PREFETCH and hasattr(self, 'prefetch_related'):
-            return qs.prefetch_related(*[g.name for g in gfk_fields])
-
-        ct_map, data_map = {}, {}
-
-        for item in qs:
-            for gfk in gfk_fields:
-                ct_id_field = self.model._meta.get_field(gfk.ct_field).column
-                ct_map.setdefault(getattr(item, ct_id_field), {}
-                    )[smart_unicode(getattr(item, gfk.fk_field))] = (gfk.name,
-                        item.pk)
-
-        ctypes = ContentType.objects.using(self.db).in_bulk(ct_map.keys())
-
-        for ct_id, items_ in ct_map.items():
-            if ct_id:
-                ct = ctypes[ct_id]
-                model_class = ct.model_class()
-                objects = model_class._default_manager.select_related()
-                for o in objects.filter(pk__in=items_.keys()):
-                    (gfk_name, item_id) = items_[smart_unicode(o.pk)]
-                    data_map[(ct_id, smart_unicode(o.pk))] = o
-
-        for item in qs:
-            for gfk in gfk_fields:
-                if getattr(item, gfk.fk_field) != None:
-                    ct_id_field = self.model._meta.get_field(gfk.ct_field)\
-                        .column
-                    setattr(item, gfk.name,
-                        data_map[(
-                            getattr(item, ct_id_field),
-                            smart_unicode(getattr(item, gfk.fk_field))
-                        )])
+            return qs.prefetch_related(*gfk_names)
+
+        qs._gfk_names = gfk_names
+        return qs
 
+    def add_prefetch_hook(self, hook):
+        """
+        Returns a queryset which calls hook(instances) with the list of its
+        instances when it is evaluated.
+        """
+        qs = self._clone()
+        qs._prefetch_hooks = self._prefetch_hooks + (hook, )
         return qs
 
+    def iterator(self):
+        if not self._gfk_names and not self._prefetch_hooks:
+            for item in super(GFKQuerySet, self).iterator():
+                yield item
+            return
+
+        items = list(super(GFKQuerySet, self).iterator())
+        if self._gfk_names:
+            fetch_generic_relations(items, [g
+                for g in self.model._meta.virtual_fields
+                if g.name in self._gfk_names], self.db)
+        for hook in self._prefetch_hooks:
+            hook(items)
+        for item in items:
+            yield item
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        c = super(GFKQuerySet, self)._clone(klass, setup, **kwargs)
+        c._gfk_names = self._gfk_names
+        c._prefetch_hooks = self._prefetch_hooks
+        return c
+
     def none(self):
         return self._clone(klass=EmptyGFKQuerySet)
 
 
 class EmptyGFKQuerySet(GFKQuerySet, EmptyQuerySet):
-    def fetch_generic_relations(self):
+    def fetch_generic_relations(self, *args):
         return self
@@ -111,6 +111,20 @@ class ActionManager(GFKManager):
         """
         Stream of most recent actions by objects that the passed User object is
         following.
+
+        If ACTSTREAM_USE_FEED_INBOX is enabled, the stream is read from the
+        inbox of the user, filled when the actions are created.
+        """
+        from actstream import settings as actstream_settings
+        if actstream_settings.USE_FEED_INBOX:
+            return self.public(inbox_entries__user=object, **kwargs)\
+                .order_by('-inbox_entries__timestamp')
+        return self.followed_actions(object, **kwargs)
+
+    def followed_actions(self, object, **kwargs):
+        """
+        Most recent actions by objects that the passed User object is
+        following, queried from its follows.
         """
         from actstream.models import Follow
         q = Q()
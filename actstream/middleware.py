@@ -0,0 +1,21 @@
+from actstream.actions import buffer_actions, flush_actions
+
+
+class ActionBufferMiddleware(object):
+    """
+    Buffers the actions sent while processing a request and queues them to be
+    recorded once the response is ready, if ACTSTREAM_BUFFER_ACTIONS is
+    enabled. The actions of requests which raise an exception are discarded.
+
+    Must be placed before TransactionMiddleware, so that the buffered actions
+    and fan outs are queued after the request transaction commits.
+    """
+    def process_request(self, request):
+        buffer_actions()
+
+    def process_response(self, request, response):
+        flush_actions()
+        return response
+
+    def process_exception(self, request, exception):
+        flush_actions(discard=True)
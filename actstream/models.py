@@ -29,6 +29,8 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
+        # used to find the followers of an object
+        index_together = (('content_type', 'object_id'), )
 
     def __unicode__(self):
         return u'%s -> %s' % (self.user, self.follow_object)
@@ -64,7 +66,7 @@ class Action(models.Model):
 
     """
     actor_content_type = models.ForeignKey(ContentType, related_name='actor')
-    actor_object_id = models.CharField(max_length=255)
+    actor_object_id = models.IntegerField()
     actor = generic.GenericForeignKey('actor_content_type', 'actor_object_id')
 
     verb = models.CharField(max_length=255)
@@ -72,14 +74,13 @@ class Action(models.Model):
 
     target_content_type = models.ForeignKey(ContentType, related_name='target',
         blank=True, null=True)
-    target_object_id = models.CharField(max_length=255, blank=True, null=True)
+    target_object_id = models.IntegerField(blank=True, null=True)
     target = generic.GenericForeignKey('target_content_type',
         'target_object_id')
 
     action_object_content_type = models.ForeignKey(ContentType,
         related_name='action_object', blank=True, null=True)
-    action_object_object_id = models.CharField(max_length=255, blank=True,
-        null=True)
+    action_object_object_id = models.IntegerField(blank=True, null=True)
     action_object = generic.GenericForeignKey('action_object_content_type',
         'action_object_object_id')
 
@@ -94,6 +95,14 @@ class Action(models.Model):
 
     class Meta:
         ordering = ('-timestamp', )
+        # all the actionable models have integer primary keys. These indexes
+        # match the stream queries, which filter by object and sort by date
+        index_together = (
+            ('actor_content_type', 'actor_object_id', 'timestamp'),
+            ('target_content_type', 'target_object_id', 'timestamp'),
+            ('action_object_content_type', 'action_object_object_id',
+                'timestamp'),
+        )
 
     def __unicode__(self):
         ctx = {
@@ -145,6 +154,69 @@ class Action(models.Model):
         return ('actstream.views.detail', [self.pk])
 
 
+class ArchivedAction(models.Model):
+    """
+    An action moved out of the Action table because of its age, see
+    actstream.tasks.archive_actions. It keeps the id and the fields of the
+    original action.
+    """
+    id = models.IntegerField(primary_key=True)
+
+    actor_content_type = models.ForeignKey(ContentType, related_name='+')
+    actor_object_id = models.IntegerField()
+    actor = generic.GenericForeignKey('actor_content_type', 'actor_object_id')
+
+    verb = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+
+    target_content_type = models.ForeignKey(ContentType, related_name='+',
+        blank=True, null=True)
+    target_object_id = models.IntegerField(blank=True, null=True)
+    target = generic.GenericForeignKey('target_content_type',
+        'target_object_id')
+
+    action_object_content_type = models.ForeignKey(ContentType,
+        related_name='+', blank=True, null=True)
+    action_object_object_id = models.IntegerField(blank=True, null=True)
+    action_object = generic.GenericForeignKey('action_object_content_type',
+        'action_object_object_id')
+
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    public = models.BooleanField(default=True)
+
+    geolocation = models.CharField(max_length=255, null=True, blank=True)
+    ipaddr = models.CharField(max_length=20, null=True, blank=True)
+
+    class Meta:
+        ordering = ('-timestamp', )
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.actor, self.verb, self.timestamp)
+
+
+class InboxEntry(models.Model):
+    """
+    An action in the stream of a user, copied there when the action is created
+    because the user follows its actor, target or action object. Only used if
+    ACTSTREAM_USE_FEED_INBOX is enabled, see actstream.tasks.fan_out_action.
+    """
+    user = models.ForeignKey(User, related_name='inbox_entries')
+    action = models.ForeignKey(Action, related_name='inbox_entries')
+
+    # copy of action.timestamp, so that the stream of a user is a range scan
+    # of the (user, timestamp) index
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('-timestamp', )
+        unique_together = ('user', 'action')
+        index_together = (('user', 'timestamp'), )
+
+    def __unicode__(self):
+        return u'%s <- %s' % (self.user, self.action)
+
+
 # convenient accessors
 actor_stream = Action.objects.actor
 action_object_stream = Action.objects.action_object
@@ -5,6 +5,8 @@ from tastypie.resources import ModelResource
 from tastypie.exceptions import ImmediateHttpResponse
 from tastypie import fields, http
 
+from datetime import datetime
+
 from actstream.models import user_stream, object_stream
 from actstream.models import Follow, Action
 
@@ -16,6 +18,9 @@ from django.core.urlresolvers import reverse
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.comments.models import Comment
 from django.contrib.markup.templatetags.markup import textile
+from django.db.models import Q
+from django.http import HttpResponseBadRequest
+from django.utils import timezone
 
 from agora_site.misc.utils import GenericForeignKeyField
 from agora_site.misc.generic_resource import GenericResource, GenericMeta
@@ -49,6 +54,61 @@ class TinyCommentResource(GenericResource):
     def dehydrate_comment(self, bundle):
         return textile(bundle.obj.comment)
 
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(action):
+    '''
+    Returns the pagination cursor pointing after the given action in a
+    stream, made of its UTC timestamp and its id
+    '''
+    timestamp = action.timestamp
+    if timezone.is_aware(timestamp):
+        timestamp = timestamp.astimezone(timezone.utc)
+    return '%s_%d' % (timestamp.strftime(CURSOR_DATE_FORMAT), action.id)
+
+
+def decode_cursor(value):
+    '''
+    Returns the (timestamp, id) pair of a cursor returned by encode_cursor(),
+    or None if the cursor is empty. Raises ValueError if it is not valid.
+    '''
+    if not value:
+        return None
+
+    date, action_id = value.split('_')
+    timestamp = datetime.strptime(date, CURSOR_DATE_FORMAT)
+    if settings.USE_TZ:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp, int(action_id)
+
+
+def fetch_cast_votes(actions):
+    '''
+    Loads with one query the votes of the "voted" actions of a list, used as a
+    prefetch hook of the ActionResource querysets
+    '''
+    voted = [a for a in actions if a.verb == "voted"]
+    if not voted:
+        return
+
+    votes = dict([(vote.action_id, vote) for vote in CastVote.objects\
+        .select_related("voter").filter(action_id__in=[a.id for a in voted])])
+    for action in voted:
+        action._cast_vote_cache = votes.get(action.id)
+
+
+def get_cast_vote(action):
+    '''
+    Returns the vote of a "voted" action, loaded by fetch_cast_votes() if
+    possible
+    '''
+    vote = getattr(action, '_cast_vote_cache', None)
+    if vote is None:
+        vote = CastVote.objects.get(action_id=action.id)
+    return vote
+
+
 class ActionResource(GenericResource):
     '''
     Resource for actions
@@ -76,7 +136,8 @@ class ActionResource(GenericResource):
     vote = fields.DictField()
 
     class Meta(GenericMeta):
-        queryset = Action.objects.prefetch_related().filter(public=True)
+        queryset = Action.objects.filter(public=True)\
+            .fetch_generic_relations().add_prefetch_hook(fetch_cast_votes)
         filtering = {
                         'action_object': ALL,
                         'actor': ALL,
@@ -94,7 +155,7 @@ class ActionResource(GenericResource):
         Handly field used to discriminate the type of action
         '''
         if bundle.obj.verb == "voted" and bundle.obj.action_object_content_type.name == "election":
-            vote = CastVote.objects.get(action_id=bundle.obj.id)
+            vote = get_cast_vote(bundle.obj)
             if vote.is_public and vote.is_direct and vote.is_plaintext():
                 if vote.reason:
                     return "action_object_election_verb_voted_public_reason"
@@ -138,7 +199,7 @@ class ActionResource(GenericResource):
         Shows the vote related to the action, if any
         '''
         if bundle.obj.verb == "voted" and bundle.obj.action_object_content_type.name == "election":
-            vote = CastVote.objects.get(action_id=bundle.obj.id)
+            vote = get_cast_vote(bundle.obj)
 
             class CastVoteResource(GenericResource):
                 is_changed = fields.BooleanField()
@@ -193,6 +254,53 @@ class ActionResource(GenericResource):
                 self.wrap_view('election_add_comment'), name="api_election_add_comment"),
         ]
 
+    def get_stream_list(self, request, queryset):
+        '''
+        Paginates a stream of actions. Works as get_custom_list(), unless a
+        "before" cursor is given (empty for the first page): then the page
+        holds the actions older than the cursor, and meta.next_cursor is the
+        cursor of the next page or null in the last one. This way pages are
+        a range scan of the stream however old they are. The total count is
+        only included with total_count=true.
+        '''
+        if 'before' not in request.GET:
+            return self.get_custom_list(request=request, queryset=queryset)
+
+        self.method_check(request, allowed=['get'])
+        self.throttle_check(request)
+
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 20)), 1000))
+            before = decode_cursor(request.GET['before'])
+        except ValueError:
+            return HttpResponseBadRequest("Sorry, you did not provide valid input data")
+
+        stream = queryset.order_by('-timestamp', '-id')
+        if before is not None:
+            timestamp, action_id = before
+            stream = stream.filter(Q(timestamp__lt=timestamp) |
+                Q(timestamp=timestamp, id__lt=action_id))
+
+        # one more action is requested to know if there is a next page
+        object_list = list(stream[:limit + 1])
+        next_cursor = None
+        if len(object_list) > limit:
+            object_list = object_list[:limit]
+            next_cursor = encode_cursor(object_list[-1])
+
+        page = {
+            "meta": {
+                "limit": limit,
+                "next_cursor": next_cursor
+            },
+            'objects': self.full_dehydrate_list(request, object_list),
+        }
+        if request.GET.get('total_count') == 'true':
+            page['meta']['total_count'] = queryset.count()
+
+        self.log_throttled_access(request)
+        return self.create_response(request, page)
+
     @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
     def get_user_list(self, request, **kwargs):
         '''
@@ -204,7 +312,8 @@ class ActionResource(GenericResource):
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
-        return self.get_custom_list(request=request, queryset=object_stream(user))
+        queryset = object_stream(user).add_prefetch_hook(fetch_cast_votes)
+        return self.get_stream_list(request=request, queryset=queryset)
 
     @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
     def get_agora_list(self, request, **kwargs):
@@ -218,7 +327,8 @@ class ActionResource(GenericResource):
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
-        return self.get_custom_list(request=request, queryset=object_stream(agora))
+        queryset = object_stream(agora).add_prefetch_hook(fetch_cast_votes)
+        return self.get_stream_list(request=request, queryset=queryset)
 
     @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
     def get_election_list(self, request, **kwargs):
@@ -232,7 +342,8 @@ class ActionResource(GenericResource):
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
-        return self.get_custom_list(request=request, queryset=object_stream(election))
+        queryset = object_stream(election).add_prefetch_hook(fetch_cast_votes)
+        return self.get_stream_list(request=request, queryset=queryset)
 
     @permission_required('comment', (Election, 'id', 'election'))
     def election_add_comment(self, request, **kwargs):
@@ -9,3 +9,19 @@ MANAGER_MODULE = getattr(settings, 'ACTSTREAM_MANAGER',
     'actstream.managers.ActionManager')
 a, j = MANAGER_MODULE.split('.'), lambda l: '.'.join(l)
 MANAGER_MODULE = getattr(__import__(j(a[:-1]), {}, {}, [a[-1]]), a[-1])
+
+# When enabled, actions are copied into a bounded inbox per follower when they
+# are created, and user streams are read from it
+USE_FEED_INBOX = getattr(settings, 'ACTSTREAM_USE_FEED_INBOX', False)
+
+# Maximum number of actions kept in the inbox of each user
+FEED_INBOX_SIZE = getattr(settings, 'ACTSTREAM_FEED_INBOX_SIZE', 1000)
+
+# Actions older than this number of days are moved to the ArchivedAction table
+# by actstream.tasks.archive_old_actions, so that streams do not scan them.
+# None disables archiving
+ARCHIVE_AFTER_DAYS = getattr(settings, 'ACTSTREAM_ARCHIVE_AFTER_DAYS', None)
+
+# When enabled, the actions sent during a request are buffered and bulk
+# inserted afterwards by a Celery task, see actstream.actions.buffer_actions
+BUFFER_ACTIONS = getattr(settings, 'ACTSTREAM_BUFFER_ACTIONS', False)
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q, Count
+from django.utils import timezone
+
+from celery import task
+
+from actstream import settings as actstream_settings
+from actstream.models import Action, ArchivedAction, Follow, InboxEntry
+
+# maximum number of rows inserted or ids looked up per query
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
+
+
+def get_follower_ids(action):
+    """
+    Returns the ids of the users in whose stream the action appears: those
+    following its actor, and those following its target or action object
+    without actor_only.
+    """
+    q = Q(content_type=action.actor_content_type_id,
+        object_id=unicode(action.actor_object_id))
+    for field in ('target', 'action_object'):
+        content_type_id = getattr(action, '%s_content_type_id' % field)
+        if content_type_id is not None:
+            q = q | Q(content_type=content_type_id, actor_only=False,
+                object_id=unicode(getattr(action, '%s_object_id' % field)))
+    return list(Follow.objects.filter(q).values_list('user_id', flat=True)
+        .distinct())
+
+
+def trim_inboxes(user_ids):
+    """
+    Removes the oldest entries of the inboxes of the given users which hold
+    more than ACTSTREAM_FEED_INBOX_SIZE actions
+    """
+    size = actstream_settings.FEED_INBOX_SIZE
+    for user_ids_chunk in chunks(user_ids):
+        counts = InboxEntry.objects.filter(user__in=user_ids_chunk)\
+            .order_by().values('user').annotate(count=Count('id'))
+        for item in counts:
+            if item['count'] <= size:
+                continue
+            entries = InboxEntry.objects.filter(user=item['user'])
+            oldest_kept = entries.order_by('-timestamp', '-id')\
+                .values_list('id', 'timestamp')[size - 1]
+            entries.filter(Q(timestamp__lt=oldest_kept[1]) |
+                Q(timestamp=oldest_kept[1], id__lt=oldest_kept[0])).delete()
+
+
+def fan_out(action, user_ids):
+    """
+    Adds the action to the inboxes of the given users
+    """
+    user_ids = list(set(user_ids) - set(InboxEntry.objects
+        .filter(action=action).values_list('user_id', flat=True)))
+    InboxEntry.objects.bulk_create([
+        InboxEntry(user_id=user_id, action=action, timestamp=action.timestamp)
+        for user_id in user_ids], batch_size=CHUNK_SIZE)
+    trim_inboxes(user_ids)
+
+
+def rebuild_inbox(user):
+    """
+    Fills the inbox of the user with the most recent actions of the objects
+    it follows, e.g. after enabling ACTSTREAM_USE_FEED_INBOX.
+    """
+    InboxEntry.objects.filter(user=user).delete()
+    actions = Action.objects.followed_actions(user)\
+        .values_list('id', 'timestamp')[:actstream_settings.FEED_INBOX_SIZE]
+    InboxEntry.objects.bulk_create([
+        InboxEntry(user=user, action_id=action_id, timestamp=timestamp)
+        for action_id, timestamp in actions], batch_size=CHUNK_SIZE)
+
+
+@task(ignore_result=True)
+def fan_out_action(action_id):
+    """
+    Adds a newly created action to the inboxes of the users following it
+    """
+    try:
+        action = Action.objects.get(pk=action_id)
+    except Action.DoesNotExist:
+        return
+    fan_out(action, get_follower_ids(action))
+
+
+@task(ignore_result=True)
+def record_actions(actions_data):
+    """
+    Saves the actions buffered during a request, given as lists of field
+    values. They are bulk inserted unless they must be fanned out to the feed
+    inboxes, which needs their ids.
+    """
+    actions = [Action(**data) for data in actions_data]
+    if not actstream_settings.USE_FEED_INBOX:
+        Action.objects.bulk_create(actions, batch_size=CHUNK_SIZE)
+        return
+
+    for action in actions:
+        action.save()
+        if action.public:
+            fan_out(action, get_follower_ids(action))
+
+
+def archive_actions(before):
+    """
+    Moves the actions older than the given date to the ArchivedAction table,
+    so that streams do not scan them anymore. Their inbox entries are removed.
+    Returns the number of archived actions.
+    """
+    qn = connection.ops.quote_name
+    columns = ', '.join([qn(f.column) for f in Action._meta.local_fields])
+    old_actions = Action.objects.filter(timestamp__lt=before).order_by('id')
+
+    count = 0
+    while True:
+        ids = list(old_actions.values_list('id', flat=True)[:CHUNK_SIZE])
+        if not ids:
+            return count
+
+        with transaction.commit_on_success():
+            connection.cursor().execute('INSERT INTO %s (%s) SELECT %s FROM %s '
+                'WHERE %s IN (%s)' % (qn(ArchivedAction._meta.db_table),
+                    columns, columns, qn(Action._meta.db_table), qn('id'),
+                    ', '.join(['%s'] * len(ids))), ids)
+            Action.objects.filter(id__in=ids).delete()
+        count += len(ids)
+
+
+@task(ignore_result=True)
+def archive_old_actions():
+    """
+    Archives the actions older than ACTSTREAM_ARCHIVE_AFTER_DAYS, if set
+    """
+    if actstream_settings.ARCHIVE_AFTER_DAYS is None:
+        return
+    archive_actions(timezone.now() -
+        timedelta(days=actstream_settings.ARCHIVE_AFTER_DAYS))
@@ -4,7 +4,9 @@ from resources.agora import AgoraResource
 from resources.election import ElectionResource
 from resources.castvote import CastVoteResource
 from resources.delegateelectioncount import DelegateElectionCountResource
+from resources.delegateagoracount import DelegateAgoraCountResource
 from resources.search import SearchResource
+from resources.batch import BatchResource
 from actstream.resources import FollowResource, ActionResource
 
 v1 = Api("v1")
@@ -13,6 +15,8 @@ v1.register(AgoraResource())
 v1.register(ElectionResource())
 v1.register(CastVoteResource())
 v1.register(DelegateElectionCountResource())
+v1.register(DelegateAgoraCountResource())
 v1.register(FollowResource())
 v1.register(ActionResource())
 v1.register(SearchResource())
+v1.register(BatchResource())
@@ -37,8 +37,7 @@ from django.db import transaction
 
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit, Hidden, Layout, Fieldset
-from actstream.models import Action
-from actstream.actions import follow, unfollow, is_following
+from actstream.actions import follow, unfollow, is_following, create_action
 from actstream.signals import action as actstream_action
 from userena.models import UserenaSignup
 from userena import settings as userena_settings
@@ -619,13 +618,10 @@ class VoteForm(django_forms.ModelForm):
         vote.casted_at_date = timezone.now()
         vote.create_hash()
 
-        actstream_action.send(self.request.user, verb='voted', action_object=self.election,
-            target=self.election.agora,
-            geolocation=json.dumps(geolocate_ip(self.request.META.get('REMOTE_ADDR'))))
-
-        vote.action_id = Action.objects.filter(actor_object_id=self.request.user.id,
-            verb='voted', action_object_object_id=self.election.id,
-            target_object_id=self.election.agora.id).order_by('-timestamp').all()[0].id
+        vote.action_id = create_action(self.request.user, verb='voted',
+            action_object=self.election, target=self.election.agora,
+            buffered=False,
+            geolocation=json.dumps(geolocate_ip(self.request.META.get('REMOTE_ADDR')))).id
 
         vote.save()
         return vote
@@ -20,9 +20,7 @@ from agora_site.misc.utils import *
 
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit, Hidden, Layout, Fieldset
-from actstream.models import Action
-from actstream.signals import action as actstream_action
-from actstream.actions import follow, unfollow, is_following
+from actstream.actions import follow, unfollow, is_following, create_action
 from userena.models import UserenaSignup
 from userena import settings as userena_settings
 
@@ -123,13 +121,10 @@ class DelegateVoteForm(django_forms.ModelForm):
         vote.save()
 
         # Create the delegation action
-        actstream_action.send(self.request.user, verb='delegated', action_object=vote,
-            target=self.agora, ipaddr=self.request.META.get('REMOTE_ADDR'),
-            geolocation=json.dumps(geolocate_ip(self.request.META.get('REMOTE_ADDR'))))
-
-        vote.action_id = Action.objects.filter(actor_object_id=self.request.user.id,
-            verb='delegated', action_object_object_id=vote.id,
-            target_object_id=self.agora.id).order_by('-timestamp').all()[0].id
+        vote.action_id = create_action(self.request.user, verb='delegated',
+            action_object=vote, target=self.agora, buffered=False,
+            ipaddr=self.request.META.get('REMOTE_ADDR'),
+            geolocation=json.dumps(geolocate_ip(self.request.META.get('REMOTE_ADDR')))).id
 
 
         # Send the email to the voter (and maybe to the delegate too!)
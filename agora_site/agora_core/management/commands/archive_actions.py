@@ -0,0 +1,50 @@
+# Copyright (C) 2013 Eduardo Robles Elvira <edulix AT wadobo DOT com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from actstream import settings as actstream_settings
+from actstream.tasks import archive_actions
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Moves old actions out of the activity streams into the archive'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-d', '--days', action='store', dest='days',
+            default=None, type='int',
+            help='Archive the actions older than this number of days. '
+                'Defaults to ACTSTREAM_ARCHIVE_AFTER_DAYS.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        days = options.get('days')
+        if days is None:
+            days = actstream_settings.ARCHIVE_AFTER_DAYS
+        if days is None:
+            raise CommandError('Give the number of days with --days or set '
+                'ACTSTREAM_ARCHIVE_AFTER_DAYS')
+
+        count = archive_actions(timezone.now() - timedelta(days=days))
+        if verbosity >= 1:
+            print "Archived %d actions." % count
@@ -13,30 +13,166 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from optparse import make_option
+
 from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
 from agora_site.agora_core.models.election import Election
 from agora_site.agora_core.models.delegateelectioncount import DelegateElectionCount
 
-import random
+import time
 
+# status returned by update_election()
+TALLIED = 'tallied'
+SKIPPED = 'skipped'
+FAILED = 'failed'
 
-class Command(BaseCommand):
-    args = ''
-    help = 'Recalculates election results'
 
+def update_election(election_id, force=False, verbosity=1):
+    '''
+    Recalculates the result of the given election, unless its tally inputs
+    did not change since the last tally and force is False. Returns one of
+    TALLIED, SKIPPED or FAILED.
+    '''
+    e = Election.objects.get(pk=election_id)
+    if not force and e.extra_data and\
+            e.extra_data.get('tally_input_digest') == e.get_tally_input_digest():
+        if verbosity >= 2:
+            print "  skipping %s, unchanged since last tally" % e.url
+        return SKIPPED
 
-    def update_election(self, e):
+    try:
         date = e.voting_ends_at_date
         e.compute_result()
         e.result_tallied_at_date = date
         e.save()
 
-        for dec in DelegateElectionCount.objects.filter(election=e):
-            dec.created_at_date = date
-            dec.save()
+        DelegateElectionCount.objects.filter(election=e).update(
+            created_at_date=date)
+        e.render_result_artifacts()
+    except Exception, exc:
+        if verbosity >= 1:
+            print "  error tallying %s: %s" % (e.url, exc)
+        return FAILED
+    finally:
+        # Clear out the DB connections queries because it bloats up RAM.
+        reset_queries()
+
+    if verbosity >= 2:
+        print "  tallied %s" % e.url
+    return TALLIED
+
+
+def worker(bits):
+    # We need to reset the connections, otherwise the different processes
+    # will try to share the connection, which causes things to blow up.
+    from django.db import connections
+
+    for alias, info in connections.databases.items():
+        # We need to also tread lightly with SQLite, because blindly wiping
+        # out connections (via ``... = {}``) destroys in-memory DBs.
+        if not 'sqlite3' in info['ENGINE']:
+            try:
+                connections._connections[alias].close()
+                del(connections._connections[alias])
+            except KeyError:
+                pass
+
+    election_id, force, verbosity = bits
+    return update_election(election_id, force, verbosity)
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Recalculates election results'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-a', '--agora', action='store', dest='agora',
+            default=None, type='string',
+            help='Only recalculate elections of this agora, given as '
+                'username/agoraname.'
+        ),
+        make_option('-s', '--start', action='store', dest='start_date',
+            default=None, type='string',
+            help='Only recalculate elections whose voting ended after this '
+                'date. Can be any dateutil-parsable string.'
+        ),
+        make_option('-e', '--end', action='store', dest='end_date',
+            default=None, type='string',
+            help='Only recalculate elections whose voting ended before this '
+                'date. Can be any dateutil-parsable string.'
+        ),
+        make_option('-t', '--voting-system', action='store',
+            dest='voting_system', default=None, type='string',
+            help='Only recalculate elections of this type, e.g. ONE_CHOICE.'
+        ),
+        make_option('-f', '--force', action='store_true', dest='force',
+            default=False,
+            help='Recalculate even elections whose votes, delegations and '
+                'electorate did not change since the last tally.'
+        ),
+        make_option('-k', '--workers', action='store', dest='workers',
+            default=0, type='int',
+            help='Number of worker processes used to recalculate elections '
+                'in parallel. Requires multiprocessing.'
+        ),
+    )
+
+    def parse_date(self, value):
+        from dateutil.parser import parse as dateutil_parse
+
+        try:
+            return dateutil_parse(value)
+        except ValueError:
+            raise CommandError('Invalid date: %s' % value)
 
     def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        force = options.get('force', False)
+        workers = int(options.get('workers', 0))
+
         elections = Election.objects.filter(result_tallied_at_date__isnull=False)
 
-        for election in elections:
-            self.update_election(election)
+        if options.get('agora'):
+            try:
+                username, agoraname = options['agora'].split('/')
+            except ValueError:
+                raise CommandError('Agora must be given as username/agoraname')
+            elections = elections.filter(agora__name=agoraname,
+                agora__creator__username=username)
+
+        if options.get('start_date'):
+            elections = elections.filter(
+                voting_ends_at_date__gte=self.parse_date(options['start_date']))
+
+        if options.get('end_date'):
+            elections = elections.filter(
+                voting_ends_at_date__lte=self.parse_date(options['end_date']))
+
+        if options.get('voting_system'):
+            elections = elections.filter(
+                election_type=options['voting_system'])
+
+        election_ids = list(elections.order_by('id').values_list('id', flat=True))
+
+        if verbosity >= 1:
+            print "Recalculating %d elections." % len(election_ids)
+
+        start = time.time()
+        if workers > 0:
+            import multiprocessing
+            pool = multiprocessing.Pool(workers)
+            statuses = pool.map(worker,
+                [(election_id, force, verbosity) for election_id in election_ids])
+            pool.close()
+            pool.join()
+        else:
+            statuses = [update_election(election_id, force, verbosity)
+                for election_id in election_ids]
+        elapsed = time.time() - start
+
+        if verbosity >= 1:
+            print "%d tallied, %d skipped, %d failed in %.2fs (%.2f elections/s)." % (
+                statuses.count(TALLIED), statuses.count(SKIPPED),
+                statuses.count(FAILED), elapsed,
+                elapsed and len(statuses) / elapsed or 0)
@@ -0,0 +1,49 @@
+# Copyright (C) 2013 Eduardo Robles Elvira <edulix AT wadobo DOT com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+
+from actstream.tasks import rebuild_inbox
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Rebuilds the activity feed inboxes of the users from their follows'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-u', '--user', action='store', dest='username',
+            default=None, type='string',
+            help='Only rebuild the inbox of this user.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        users = User.objects.exclude(id=settings.ANONYMOUS_USER_ID)
+        if options.get('username'):
+            users = users.filter(username=options['username'])
+
+        for user in users.order_by('id').iterator():
+            if verbosity >= 2:
+                print "  rebuilding %s" % user.username
+            rebuild_inbox(user)
+            # Clear out the DB connections queries because it bloats up RAM.
+            reset_queries()
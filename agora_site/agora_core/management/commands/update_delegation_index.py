@@ -0,0 +1,52 @@
+# Copyright (C) 2013 Eduardo Robles Elvira <edulix AT wadobo DOT com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+from agora_site.agora_core.models.agora import Agora
+from agora_site.agora_core.models.delegateagoracount import update_delegate_agora_counts
+
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Rebuilds the reverse delegation index of the agoras'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-a', '--agora', action='store', dest='agora',
+            default=None, type='string',
+            help='Only rebuild the index of this agora, given as '
+                'username/agoraname.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        agoras = Agora.objects.all()
+        if options.get('agora'):
+            try:
+                username, agoraname = options['agora'].split('/')
+            except ValueError:
+                raise CommandError('Agora must be given as username/agoraname')
+            agoras = agoras.filter(name=agoraname, creator__username=username)
+
+        for agora in agoras.order_by('id').iterator():
+            if verbosity >= 2:
+                print "  rebuilding %s" % agora.get_full_name()
+            update_delegate_agora_counts(agora)
+            # Clear out the DB connections queries because it bloats up RAM.
+            reset_queries()
@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import unicodedata
 
 from django.core.urlresolvers import reverse
@@ -7,9 +8,10 @@ from django.core.mail import (EmailMultiAlternatives, EmailMessage,
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models import Q, Count
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils import translation
@@ -18,6 +20,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.shortcuts import get_object_or_404
 
 from userena.models import UserenaLanguageBaseProfile
+from userena.managers import UserenaBaseProfileManager
 from userena.utils import get_gravatar
 from userena import settings as userena_settings
 from guardian.shortcuts import *
@@ -26,13 +29,29 @@ from actstream.actions import follow, is_following
 from actstream.signals import action
 
 from agora_site.misc.utils import (JSONField, geolocate_ip, send_action,
-                                   get_base_email_context)
+                                   get_base_email_context,
+                                   bump_rest_cache_version, cache_objects,
+                                   get_cached_objects,
+                                   invalidate_cached_object, purge_edge_keys,
+                                   IdentityMapManagerMixin, map_objects,
+                                   register_identity_map)
 from agora import Agora
 from election import Election
 from castvote import CastVote
 from delegateelectioncount import DelegateElectionCount
+from delegateagoracount import DelegateAgoraCount
+from searchindexupdate import SearchIndexUpdate
+from searchindexrun import SearchIndexRun
+from electiontallylog import ElectionTallyLog
 
 
+class ProfileManager(IdentityMapManagerMixin, UserenaBaseProfileManager):
+    '''
+    Userena profile manager which looks up through the identity map, so that
+    user.get_profile() reuses the profiles already loaded in the request
+    '''
+    pass
+
 class Profile(UserenaLanguageBaseProfile):
     '''
     Profile used together with django User class, and accessible via
@@ -45,6 +64,8 @@ class Profile(UserenaLanguageBaseProfile):
     '''
     user = models.OneToOneField(User)
 
+    objects = ProfileManager()
+
     class Meta:
         app_label = 'agora_core'
 
@@ -101,8 +122,7 @@ class Profile(UserenaLanguageBaseProfile):
 
         if agora_name:
             username, agoraname = agora_name.split("/")
-            agora = get_object_or_404(Agora, name=agoraname,
-                creator__username=username)
+            agora = get_agora_or_404(username, agoraname)
             agora.members.add(self.user)
             agora.save()
         else:
@@ -190,7 +210,7 @@ class Profile(UserenaLanguageBaseProfile):
         else:
             return _('Is a member of %(num_agoras)d agoras and has emitted '
                 ' %(num_votes)d direct votes.') % dict(
-                    num_agoras=self.user.agoras.count(),
+                    num_agoras=self.count_agoras(),
                     num_votes=self.count_direct_votes())
 
     def get_first_name_or_nick(self):
@@ -219,8 +239,13 @@ class Profile(UserenaLanguageBaseProfile):
             if user.is_anonymous():
                 return False
             # only admins of the agora the user is in can send the user an email
-            if not user.administrated_agoras.only('id').filter(
-                    id__in=self.user.agoras.only('id').all().query).exists():
+            mail_admin = getattr(self, '_mail_admin_cache', None)
+            if mail_admin is not None and mail_admin[0] == user.id:
+                is_mail_admin = mail_admin[1]
+            else:
+                is_mail_admin = user.administrated_agoras.only('id').filter(
+                    id__in=self.user.agoras.only('id').all().query).exists()
+            if not is_mail_admin:
                 return False
             try:
                 validate_email(self.user.email)
@@ -285,8 +310,53 @@ class Profile(UserenaLanguageBaseProfile):
         '''
         Returns the list of valid direct votes by this user
         '''
+        if hasattr(self, '_num_direct_votes_cache'):
+            return self._num_direct_votes_cache
         return CastVote.objects.filter(voter=self.user, is_direct=True, is_counted=True).count()
 
+    def count_agoras(self):
+        '''
+        Returns the number of agoras this user is a member of
+        '''
+        if hasattr(self, '_agora_ids_cache'):
+            return len(self._agora_ids_cache)
+        return self.user.agoras.count()
+
+    @staticmethod
+    def cache_counts(profiles, user=None):
+        '''
+        Fills the count_agoras() and count_direct_votes() caches of a list of
+        profiles, typically a page of a listing, with a fixed number of
+        queries. If user is given, also the has_perms('receive_mail', user)
+        cache.
+        '''
+        profiles = list(profiles)
+        if not profiles:
+            return
+
+        user_ids = [profile.user_id for profile in profiles]
+        agora_ids = dict()
+        for user_id, agora_id in Agora.members.through.objects.filter(
+                user__in=user_ids).values_list('user_id', 'agora_id'):
+            agora_ids.setdefault(user_id, set()).add(agora_id)
+
+        num_direct_votes = dict(CastVote.objects.filter(voter__in=user_ids,
+            is_direct=True, is_counted=True).order_by().values('voter')\
+            .annotate(count=Count('id')).values_list('voter', 'count'))
+
+        admin_agora_ids = None
+        if user is not None and not user.is_anonymous():
+            admin_agora_ids = set(user.administrated_agoras.values_list('id',
+                flat=True))
+
+        for profile in profiles:
+            profile._agora_ids_cache = agora_ids.get(profile.user_id, set())
+            profile._num_direct_votes_cache = num_direct_votes.get(
+                profile.user_id, 0)
+            if admin_agora_ids is not None:
+                profile._mail_admin_cache = (user.id,
+                    bool(admin_agora_ids & profile._agora_ids_cache))
+
     def get_participated_elections(self):
         '''
         Returns the list of elections in which the user participated, either
@@ -317,19 +387,39 @@ class Profile(UserenaLanguageBaseProfile):
         except Exception, e:
             return None
 
+    @staticmethod
+    def vote_in_election_cache_key(election, user_id):
+        '''
+        Key under which get_vote_in_election() caches the vote of a user. It
+        includes the tally date because the delegated votes of an election
+        only change when it is tallied.
+        '''
+        tallied = ''
+        if election.result_tallied_at_date:
+            tallied = election.result_tallied_at_date.isoformat()
+        return 'profile_vote_in_election_%d_%d_%s' % (election.id, user_id,
+            tallied)
+
     def get_vote_in_election(self, election):
         '''
         Returns the vote of this user in the given agora if any. Note: if the
         vote is a delegated one, this only works for tallied elections.
         '''
-        if election.cast_votes.filter(voter=self.user, is_counted=True).count() == 1:
-            return election.cast_votes.filter(voter=self.user, is_counted=True)[0]
-        else:
-            votes = election.delegated_votes.filter(voter=self.user)
-            if len(votes) == 0:
-                return None
-
-            return votes[0]
+        key = Profile.vote_in_election_cache_key(election, self.user_id)
+        if settings.VOTE_CACHE_SECONDS:
+            vote = cache.get(key)
+            if vote is not None:
+                return vote or None
+
+        votes = list(election.cast_votes.filter(voter=self.user,
+            is_counted=True)[:2])
+        if len(votes) != 1:
+            votes = election.delegated_votes.filter(voter=self.user)[:1]
+
+        vote = votes and votes[0] or None
+        if settings.VOTE_CACHE_SECONDS:
+            cache.set(key, vote or False, settings.VOTE_CACHE_SECONDS)
+        return vote
 
     def get_link(self):
         return reverse('user-view', kwargs=dict(username=self.user.username))
@@ -346,3 +436,249 @@ post_save.connect(create_user_profile, sender=User)
 
 from tastypie.models import create_api_key
 post_save.connect(create_api_key, sender=User)
+
+# models whose changes invalidate the API responses cached by the {% rest %}
+# template tags. Given by label, as some are not loaded yet at this point
+REST_CACHED_MODELS = ('auth.user', 'agora_core.profile', 'agora_core.agora',
+    'agora_core.election', 'agora_core.castvote',
+    'agora_core.delegateelectioncount', 'agora_core.delegateagoracount',
+    'actstream.follow', 'guardian.userobjectpermission')
+
+def invalidate_rest_cache(sender, **kwargs):
+    '''
+    Invalidates the API responses cached by the {% rest %} template tags
+    when a model they serialize changes
+    '''
+    if not settings.REST_CACHE_SECONDS:
+        return
+
+    opts = sender._meta
+    if '%s.%s' % (opts.app_label, opts.module_name) in REST_CACHED_MODELS:
+        bump_rest_cache_version()
+
+post_save.connect(invalidate_rest_cache)
+post_delete.connect(invalidate_rest_cache)
+
+def invalidate_rest_cache_m2m(sender, action, **kwargs):
+    '''
+    Changes to agora members and admins, electorates and delegated votes
+    invalidate the cached API responses too
+    '''
+    if settings.REST_CACHE_SECONDS and\
+            action in ('post_add', 'post_remove', 'post_clear'):
+        bump_rest_cache_version()
+
+for through in (Agora.members.through, Agora.admins.through,
+        Election.electorate.through, Election.delegated_votes.through):
+    m2m_changed.connect(invalidate_rest_cache_m2m, sender=through)
+
+def purge_edge_cache(sender, instance, **kwargs):
+    '''
+    Purges from the edge cache the public API fragments which depend on a
+    saved or deleted agora, election or vote, see USE_ESI
+    '''
+    if not settings.USE_ESI or not settings.ESI_PURGE_URL:
+        return
+
+    if isinstance(instance, Agora):
+        keys = ['agora-%d' % instance.id]
+    elif isinstance(instance, Election):
+        keys = ['election-%d' % instance.id, 'agora-%d' % instance.agora_id]
+    else:
+        try:
+            election = instance.election
+        except Election.DoesNotExist:
+            return
+        # a delegation changes the votes of every election of the agora
+        if election.is_delegated_election():
+            election_ids = election.agora.elections.values_list('id', flat=True)
+        else:
+            election_ids = [election.id]
+        keys = ['election-%d' % election_id for election_id in election_ids]
+
+    purge_edge_keys(keys)
+
+for model in (Agora, Election, CastVote):
+    post_save.connect(purge_edge_cache, sender=model)
+    post_delete.connect(purge_edge_cache, sender=model)
+
+def purge_agora_members_edge_cache(sender, instance, action, reverse, pk_set,
+        **kwargs):
+    '''
+    The public agora fragments include the number of members
+    '''
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        for agora_id in pk_set:
+            purge_edge_cache(Agora, Agora(id=agora_id))
+    else:
+        purge_edge_cache(Agora, instance)
+
+m2m_changed.connect(purge_agora_members_edge_cache, sender=Agora.members.through)
+
+def invalidate_vote_counts(sender, instance, **kwargs):
+    '''
+    Invalidates the cached vote counts of a saved or deleted election
+    '''
+    instance.__dict__.pop('_vote_counts_cache', None)
+    if settings.VOTE_CACHE_SECONDS:
+        cache.delete(Election.vote_counts_cache_key(instance.id))
+
+post_save.connect(invalidate_vote_counts, sender=Election)
+post_delete.connect(invalidate_vote_counts, sender=Election)
+
+def delete_result_artifacts(sender, instance, **kwargs):
+    instance.delete_result_artifacts()
+
+post_delete.connect(delete_result_artifacts, sender=Election)
+
+def invalidate_agora_members_vote_counts(sender, instance, action, reverse,
+        pk_set, **kwargs):
+    '''
+    The percentage of participation of the elections of an agora depends on
+    its number of members
+    '''
+    if not settings.VOTE_CACHE_SECONDS or\
+            action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        agora_ids = [instance.id]
+    elif action == 'pre_clear':
+        agora_ids = list(instance.agoras.values_list('id', flat=True))
+    else:
+        agora_ids = pk_set
+
+    election_ids = Election.objects.filter(agora__in=agora_ids)\
+        .values_list('id', flat=True)
+    cache.delete_many([Election.vote_counts_cache_key(election_id)
+        for election_id in election_ids])
+
+m2m_changed.connect(invalidate_agora_members_vote_counts,
+    sender=Agora.members.through)
+
+for model in (User, Agora, Election):
+    post_save.connect(invalidate_cached_object, sender=model)
+    post_delete.connect(invalidate_cached_object, sender=model)
+
+# the same user, profile, agora or election is loaded only once per request,
+# see IdentityMapMiddleware
+register_identity_map(User, Profile, Agora, Election)
+
+def natural_key_cache_key(model, *names):
+    '''
+    Key under which the ids of the objects found by get_agora_or_404(),
+    get_election_or_404() and get_user_or_404() are cached
+    '''
+    names = u'/'.join(names).encode('utf-8')
+    return 'natural_key_%s_%s' % (model._meta.module_name,
+        hashlib.md5(names).hexdigest())
+
+def attach_agora_relations(agora, creator, delegation_election):
+    agora._creator_cache = creator
+    agora._delegation_election_cache = delegation_election
+    if delegation_election is not None:
+        delegation_election._agora_cache = agora
+
+def get_agora_or_404(username, agoraname):
+    '''
+    Returns the agora with the given name created by the given user, with its
+    creator and delegation election attached, raising Http404 if it does not
+    exist. Read through the object cache, see OBJECT_CACHE_SECONDS.
+    '''
+    queryset = Agora.objects.select_related('creator', 'delegation_election')
+    if not settings.OBJECT_CACHE_SECONDS:
+        return get_object_or_404(queryset, name=agoraname,
+            creator__username=username)
+
+    key = natural_key_cache_key(Agora, username, agoraname)
+    ids = cache.get(key)
+    if ids is not None:
+        agora_id, creator_id, delegation_id = ids
+        found = get_cached_objects((Agora, agora_id), (User, creator_id),
+            (Election, delegation_id))
+        agora = found.get((Agora, agora_id))
+        creator = found.get((User, creator_id))
+        delegation_election = found.get((Election, delegation_id))
+        # the ids never change, but names and relations might have
+        if agora is not None and creator is not None and\
+                agora.name == agoraname and creator.username == username and\
+                agora.creator_id == creator_id and\
+                agora.delegation_election_id == delegation_id and\
+                (delegation_id is None or delegation_election is not None):
+            attach_agora_relations(agora, creator, delegation_election)
+            map_objects(agora, creator, delegation_election)
+            return agora
+
+    agora = get_object_or_404(queryset, name=agoraname,
+        creator__username=username)
+    cache.set(key, (agora.id, agora.creator_id, agora.delegation_election_id),
+        settings.OBJECT_CACHE_SECONDS)
+    cache_objects(agora, agora.creator, agora.delegation_election)
+    return agora
+
+def get_election_or_404(username, agoraname, electionname):
+    '''
+    Returns the election with the given name in the given agora, with its
+    agora and the creator and delegation election of the agora attached,
+    raising Http404 if it does not exist. Read through the object cache, see
+    OBJECT_CACHE_SECONDS.
+    '''
+    queryset = Election.objects.select_related('agora', 'agora__creator',
+        'agora__delegation_election')
+    if not settings.OBJECT_CACHE_SECONDS:
+        return get_object_or_404(queryset, name=electionname,
+            agora__name=agoraname, agora__creator__username=username)
+
+    key = natural_key_cache_key(Election, username, agoraname, electionname)
+    ids = cache.get(key)
+    if ids is not None:
+        election_id, agora_id, creator_id, delegation_id = ids
+        found = get_cached_objects((Election, election_id), (Agora, agora_id),
+            (User, creator_id), (Election, delegation_id))
+        election = found.get((Election, election_id))
+        agora = found.get((Agora, agora_id))
+        creator = found.get((User, creator_id))
+        delegation_election = found.get((Election, delegation_id))
+        if election is not None and agora is not None and\
+                creator is not None and election.name == electionname and\
+                agora.name == agoraname and creator.username == username and\
+                election.agora_id == agora_id and\
+                agora.creator_id == creator_id and\
+                agora.delegation_election_id == delegation_id and\
+                (delegation_id is None or delegation_election is not None):
+            if delegation_id == election_id:
+                delegation_election = election
+            attach_agora_relations(agora, creator, delegation_election)
+            election._agora_cache = agora
+            map_objects(election, agora, creator, delegation_election)
+            return election
+
+    election = get_object_or_404(queryset, name=electionname,
+        agora__name=agoraname, agora__creator__username=username)
+    agora = election.agora
+    cache.set(key, (election.id, agora.id, agora.creator_id,
+        agora.delegation_election_id), settings.OBJECT_CACHE_SECONDS)
+    cache_objects(election, agora, agora.creator, agora.delegation_election)
+    return election
+
+def get_user_or_404(username):
+    '''
+    Returns the user with the given username, raising Http404 if it does not
+    exist. Read through the object cache, see OBJECT_CACHE_SECONDS.
+    '''
+    if not settings.OBJECT_CACHE_SECONDS:
+        return get_object_or_404(User, username=username)
+
+    key = natural_key_cache_key(User, username)
+    user_id = cache.get(key)
+    if user_id is not None:
+        user = get_cached_objects((User, user_id)).get((User, user_id))
+        if user is not None and user.username == username:
+            map_objects(user)
+            return user
+
+    user = get_object_or_404(User, username=username)
+    cache.set(key, user.id, settings.OBJECT_CACHE_SECONDS)
+    cache_objects(user)
+    return user
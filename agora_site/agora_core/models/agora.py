@@ -15,7 +15,8 @@ from django.core.exceptions import ValidationError
 
 from guardian.shortcuts import *
 
-from agora_site.misc.utils import JSONField, get_users_with_perm
+from agora_site.misc.utils import (JSONField, get_users_with_perm,
+    IdentityMapManager)
 from agora_site.agora_core.models.voting_systems.base import parse_voting_methods
 
 class Agora(models.Model):
@@ -46,6 +47,8 @@ class Agora(models.Model):
         ('DISALLOW_DELEGATION', _('Disallow delegation')),
     )
 
+    objects = IdentityMapManager()
+
     creator = models.ForeignKey(User, related_name='created_agoras',
         verbose_name=_('Creator'), null=False)
 
@@ -195,39 +198,47 @@ class Agora(models.Model):
 
     def active_delegates(self):
         '''
-        Returns active delegates of this agora: users that have emitted any valid
-        and public vote in any election of this agora.
+        Returns active delegates of this agora: users that others currently
+        delegate into, directly or not, ranked by the number of users whose
+        delegation reaches them. Read from the reverse delegation index, see
+        DelegateAgoraCount.
         '''
-
-        from agora_site.agora_core.models import CastVote
-
-        return User.objects.filter(
-            id__in=CastVote.objects.filter(is_counted=True, is_direct=True, is_public=True,
-                invalidated_at_date=None, election__agora__id=self.id).values('voter').query)
+        return User.objects.filter(delegate_agora_counts__agora__id=self.id)\
+            .order_by('-delegate_agora_counts__transitive_count',
+                '-delegate_agora_counts__count', 'id')
 
     def non_delegates(self):
         '''
         This will return those users not included by active_delegates()
         '''
-        from agora_site.agora_core.models import CastVote
-
-        return self.members.exclude(
-            id__in=CastVote.objects.filter(is_counted=True, is_direct=True, is_public=True,
-                invalidated_at_date=None, election__agora__id=self.id).values('voter').query)
+        return self.members.exclude(id__in=self.delegate_agora_counts\
+            .values('delegate').query)
 
     def active_nonmembers_delegates(self):
         '''
         Same as active_delegates but all of those who are not currently a member
         of the agora.
         '''
+        return self.active_delegates()\
+            .exclude(id__in=self.members.values('id').query)
 
-        from agora_site.agora_core.models import CastVote
+    def delegates_leaderboard(self):
+        '''
+        Returns the reverse delegation index entries of the delegates of this
+        agora, ranked by the number of users whose delegation currently reaches
+        them, directly or through other delegates.
+        '''
+        return self.delegate_agora_counts.select_related('delegate',
+            'delegate__profile').order_by('-transitive_count', '-count', 'id')
 
-        return self.members.filter(
-            id__in=CastVote.objects.filter(is_counted=True, is_direct=True, is_public=True,
-                invalidated_at_date=None, election__agora__id=self.id).values('voter').query
-            )\
-            .exclude(id__in=self.members.values('id').query)
+    def get_delegators(self, delegate):
+        '''
+        Returns the users currently delegating directly into the given
+        delegate in this agora
+        '''
+        entries = self.delegate_agora_counts.filter(delegate__id=delegate.id)
+        delegator_ids = entries and entries[0].delegator_ids or []
+        return User.objects.filter(id__in=delegator_ids)
 
     def users_who_requested_membership(self):
         '''
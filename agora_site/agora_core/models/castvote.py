@@ -1,8 +1,11 @@
 import hashlib
 import simplejson
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from django.shortcuts import get_object_or_404
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
@@ -172,12 +175,17 @@ class CastVote(models.Model):
             if self.data['answers'][0]['a'] != 'plaintext-delegate':
                 raise Exception('Invalid delegated vote')
 
-            delegate = self.get_delegate()
-            delegate_vote = delegate.get_profile().get_vote_in_election(election)
-            if delegate_vote:
-                return delegate_vote.get_chained_first_pretty_answer(election)
-            else:
+            # follow the chain from the delegate in the delegation graph of
+            # the election, which is resolved without further queries
+            chain = election.resolve_delegation_chain(self.get_delegate_id())
+            if chain['is_broken'] or not chain['is_public'] or\
+                    not chain['answers'] or not chain['answers'][0]:
                 return None
+
+            question_title = election.questions[0]['question']
+            return dict(question=question_title,
+                answer=chain['answers'][0][0],
+                reason=chain['reason'])
         else:
             raise Exception('Invalid vote')
 
@@ -205,3 +213,43 @@ class CastVote(models.Model):
             )
         else:
             raise Exception('Invalid vote')
+
+
+def invalidate_vote_caches(sender, instance, **kwargs):
+    '''
+    Invalidates the cached votes of the voter of a vote that has been
+    emitted, cancelled or removed, and the delegation graphs and vote counts
+    it is part of.
+    A delegation changes the vote of the voter in every election of the
+    agora.
+    '''
+    from agora_site.agora_core.models import Profile
+
+    try:
+        election = instance.election
+    except Election.DoesNotExist:
+        return
+
+    election.__dict__.pop('_vote_counts_cache', None)
+    election.__dict__.pop('_votes_for_voters_cache', None)
+    election.__dict__.pop('_delegation_graph_cache', None)
+    if not settings.VOTE_CACHE_SECONDS:
+        return
+
+    if election.is_delegated_election():
+        election_ids = list(election.agora.elections.values_list('id',
+            flat=True))
+    else:
+        election_ids = [election.id]
+
+    keys = [Election.vote_for_voter_cache_key(election_id, instance.voter_id)
+        for election_id in election_ids]
+    keys += [Election.delegation_graph_cache_key(election_id)
+        for election_id in election_ids]
+    keys += [Election.vote_counts_cache_key(election_id)
+        for election_id in election_ids]
+    keys.append(Profile.vote_in_election_cache_key(election, instance.voter_id))
+    cache.delete_many(keys)
+
+post_save.connect(invalidate_vote_caches, sender=CastVote)
+post_delete.connect(invalidate_vote_caches, sender=CastVote)
@@ -0,0 +1,203 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.utils.translation import ugettext_lazy as _
+from django.utils import timezone
+
+from agora_site.misc.utils import JSONField
+from agora_site.agora_core.models.agora import Agora
+from agora_site.agora_core.models.election import Election
+from agora_site.agora_core.models.castvote import CastVote
+
+
+class DelegateAgoraCount(models.Model):
+    '''
+    Reverse delegation index: stores who is currently delegating into a
+    delegate in a given agora. It is kept up to date when delegations are
+    emitted or cancelled, see update_delegator().
+    '''
+    delegate = models.ForeignKey(User, related_name='delegate_agora_counts',
+        verbose_name=_('Delegate'), null=False)
+
+    agora = models.ForeignKey(Agora, related_name='delegate_agora_counts',
+        verbose_name=_('Agora'), null=False)
+
+    # number of users currently delegating directly into the delegate
+    count = models.IntegerField(null=False, default=0)
+
+    # number of users whose delegation chain currently reaches the delegate,
+    # directly or through other delegates
+    transitive_count = models.IntegerField(null=False, default=0,
+        db_index=True)
+
+    # ids of the users currently delegating directly into the delegate
+    delegator_ids = JSONField(_('Delegator ids'), null=True)
+
+    updated_at_date = models.DateTimeField(_(u'Updated at date'),
+        default=timezone.now)
+
+    class Meta:
+        app_label = 'agora_core'
+        unique_together = (('agora', 'delegate'),)
+
+
+def get_current_delegate_id(agora, voter_id):
+    '''
+    Returns the id of the user the given voter currently delegates into in
+    the agora, or None. As in the tally, voters with more than one current
+    delegation are ignored.
+    '''
+    votes = list(agora.delegation_election.cast_votes.filter(is_direct=False,
+        is_counted=True, invalidated_at_date=None, voter__id=voter_id)[:2])
+    if len(votes) != 1:
+        return None
+    return votes[0].get_delegate_id()
+
+
+def update_delegate_agora_counts(agora):
+    '''
+    Rebuilds the whole reverse delegation index of an agora from its current
+    delegations
+    '''
+    edges = agora.delegation_election.cast_votes.filter(is_direct=False,
+        is_counted=True, invalidated_at_date=None)
+
+    # voter_id -> delegate_id, ignoring voters with more than one delegation
+    delegates = dict()
+    ignored = set()
+    for vote in edges:
+        if vote.voter_id in delegates:
+            ignored.add(vote.voter_id)
+        delegates[vote.voter_id] = vote.get_delegate_id()
+
+    # delegate_id -> ids of the users delegating into it
+    delegators = dict()
+    for delegator_id, delegate_id in delegates.iteritems():
+        if delegator_id not in ignored:
+            delegators.setdefault(delegate_id, []).append(delegator_id)
+
+    DelegateAgoraCount.objects.filter(agora=agora)\
+        .exclude(delegate__id__in=delegators.keys()).delete()
+
+    def get_transitive_count(delegate_id):
+        reached = set([delegate_id])
+        pending = [delegate_id]
+        while pending:
+            for delegator_id in delegators.get(pending.pop(), []):
+                if delegator_id not in reached:
+                    reached.add(delegator_id)
+                    pending.append(delegator_id)
+        return len(reached) - 1
+
+    now = timezone.now()
+    for delegate_id, delegator_ids in delegators.iteritems():
+        values = dict(count=len(delegator_ids),
+            transitive_count=get_transitive_count(delegate_id),
+            delegator_ids=sorted(delegator_ids), updated_at_date=now)
+        dac, created = DelegateAgoraCount.objects.get_or_create(agora=agora,
+            delegate_id=delegate_id, defaults=values)
+        if not created:
+            for key, value in values.iteritems():
+                setattr(dac, key, value)
+            dac.save()
+
+
+def update_delegator(agora, voter_id, delegate_ids):
+    '''
+    Updates the reverse delegation index of an agora after a change in the
+    delegation of voter_id. delegate_ids are the delegates the voter might
+    have been delegating into before the change.
+
+    Only the entries of the previous and new delegates of the voter and of
+    the delegates their chains reach are updated: the weight of the voter,
+    itself plus the users reaching it, is moved from one chain to the other.
+    This takes a query per delegate in the chains, whatever the size of the
+    agora. Changes that open or close a delegation loop through the voter
+    rebuild the whole index of the agora instead.
+    '''
+    new_id = get_current_delegate_id(agora, voter_id)
+    entries = dict([(dac.delegate_id, dac)
+        for dac in DelegateAgoraCount.objects.filter(agora=agora,
+            delegate__id__in=[i for i in delegate_ids + [new_id, voter_id]
+                if i is not None])])
+
+    old_ids = [delegate_id for delegate_id, dac in entries.iteritems()
+        if delegate_id != new_id and voter_id in (dac.delegator_ids or [])]
+    is_added = new_id is not None and (new_id not in entries or\
+        voter_id not in (entries[new_id].delegator_ids or []))
+    if not old_ids and not is_added:
+        return
+
+    def get_chain(delegate_id):
+        chain = []
+        while delegate_id is not None and delegate_id not in chain:
+            if delegate_id == voter_id:
+                return None
+            chain.append(delegate_id)
+            delegate_id = get_current_delegate_id(agora, delegate_id)
+        return chain
+
+    old_chains = [get_chain(delegate_id) for delegate_id in old_ids]
+    new_chain = is_added and get_chain(new_id) or []
+    if new_chain is None or None in old_chains:
+        update_delegate_agora_counts(agora)
+        return
+
+    weight = 1
+    if voter_id in entries:
+        weight += entries[voter_id].transitive_count
+
+    now = timezone.now()
+    for delegate_id in old_ids:
+        dac = entries[delegate_id]
+        dac.delegator_ids = [i for i in dac.delegator_ids if i != voter_id]
+        dac.count = len(dac.delegator_ids)
+        dac.updated_at_date = now
+        dac.save()
+
+    if is_added:
+        dac = entries.get(new_id)
+        if dac is None:
+            dac = DelegateAgoraCount(agora=agora, delegate_id=new_id,
+                transitive_count=0)
+        dac.delegator_ids = sorted((dac.delegator_ids or []) + [voter_id])
+        dac.count = len(dac.delegator_ids)
+        dac.updated_at_date = now
+        dac.save()
+
+    for chain in old_chains:
+        DelegateAgoraCount.objects.filter(agora=agora, delegate__id__in=chain)\
+            .update(transitive_count=F('transitive_count') - weight,
+                updated_at_date=now)
+    if new_chain:
+        DelegateAgoraCount.objects.filter(agora=agora,
+            delegate__id__in=new_chain)\
+            .update(transitive_count=F('transitive_count') + weight,
+                updated_at_date=now)
+
+    DelegateAgoraCount.objects.filter(agora=agora, delegate__id__in=old_ids,
+        count=0).delete()
+
+
+def update_delegation_index(sender, instance, **kwargs):
+    '''
+    Updates the reverse delegation index when a delegation is emitted,
+    cancelled or removed
+    '''
+    if instance.is_direct:
+        return
+
+    try:
+        election = instance.election
+    except Election.DoesNotExist:
+        return
+
+    if not election.is_delegated_election() or not instance.is_plaintext():
+        return
+
+    update_delegator(election.agora, instance.voter_id,
+        [instance.get_delegate_id()])
+
+post_save.connect(update_delegation_index, sender=CastVote)
+post_delete.connect(update_delegation_index, sender=CastVote)
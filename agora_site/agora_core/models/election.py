@@ -1,14 +1,21 @@
 import datetime
+import gzip
+import os
 import uuid
+import shutil
 import hashlib
+import json
 import simplejson
 
 import markdown
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db import transaction
 from django.db.models import Q
 from django.template.defaultfilters import slugify
 from django.template.defaultfilters import truncatewords_html
@@ -17,7 +24,8 @@ from django.utils import timezone
 
 from guardian.shortcuts import *
 
-from agora_site.misc.utils import JSONField, rest
+from agora_site.misc.utils import (JSONField, rest, object_cache_key,
+    IdentityMapManager, unmap_object)
 from agora_site.agora_core.models.agora import Agora
 from agora_site.agora_core.models.voting_systems.base import (
     parse_voting_methods, get_voting_system_by_id)
@@ -36,6 +44,8 @@ class Election(models.Model):
     # Prohibited because the urls would be a mess
     PROHIBITED_ELECTION_NAMES = ('new', 'delete', 'remove', 'election', 'admin', 'view', 'edit')
 
+    objects = IdentityMapManager()
+
     # cache the hash of the election. It will be null until frozen
     hash = models.CharField(max_length=100, unique=True, null=True)
 
@@ -402,11 +412,10 @@ class Election(models.Model):
         if isanon:
             return False
 
-        isadmin = self.agora.admins.filter(id=user.id).exists()
-        isadminorcreator = (self.creator == user or isadmin)
+        isadmin, _ismember = self.get_user_roles(user)
+        isadminorcreator = (self.creator_id == user.id or isadmin)
         isarchived = self.is_archived()
         isfrozen = self.is_frozen()
-        _ismember = user in self.agora.members.all()
         ismember = lambda: _ismember
 
         return [perm for perm in ('edit_details', 'approve_election',
@@ -416,6 +425,37 @@ class Election(models.Model):
                 user, isanon, isadmin, isadminorcreator, isarchived, isfrozen,
                 ismember)]
 
+    def get_user_roles(self, user):
+        '''
+        Returns whether the given user is (admin, member) of the agora of
+        this election, as preloaded by load_user_roles() if it was called.
+        '''
+        roles = getattr(self, '_user_roles_cache', None)
+        if roles is not None and roles[0] == user.id:
+            return roles[1:]
+
+        return (self.agora.admins.filter(id=user.id).exists(),
+            self.agora.members.filter(id=user.id).exists())
+
+    @staticmethod
+    def load_user_roles(elections, user):
+        '''
+        Preloads the get_user_roles() of a user for a list of elections,
+        typically a page of a listing, with a fixed number of queries.
+        '''
+        elections = list(elections)
+        if user.id is None or not elections:
+            return
+
+        agora_ids = set([election.agora_id for election in elections])
+        admin_ids = set(Agora.admins.through.objects.filter(user=user.id,
+            agora__in=agora_ids).values_list('agora_id', flat=True))
+        member_ids = set(Agora.members.through.objects.filter(user=user.id,
+            agora__in=agora_ids).values_list('agora_id', flat=True))
+        for election in elections:
+            election._user_roles_cache = (user.id, election.agora_id in admin_ids,
+                election.agora_id in member_ids)
+
     def ballot_is_open(self):
         '''
         Returns if the ballot is open, i.e. if one can vote. 
@@ -565,6 +605,78 @@ class Election(models.Model):
         else:
             return 0
 
+    @staticmethod
+    def vote_counts_cache_key(election_id):
+        '''
+        Key under which get_vote_counts() caches the counts of an election
+        '''
+        return 'election_vote_counts_%d' % election_id
+
+    def get_vote_counts_state(self):
+        '''
+        The vote counts are computed differently depending on whether the
+        ballot is open and whether the election has been tallied, which can
+        change just with time
+        '''
+        return [bool(self.ballot_is_open()), bool(self.is_tallied())]
+
+    def compute_vote_counts(self):
+        return dict(state=self.get_vote_counts_state(),
+            direct_votes_count=self.get_direct_votes().count(),
+            delegated_votes_count=self.get_delegated_votes().count(),
+            percentage_of_participation=self.percentage_of_participation())
+
+    def get_vote_counts(self):
+        '''
+        Returns the vote counts of the election which do not depend on the
+        user, in this format:
+
+        {
+            direct_votes_count: number,
+            delegated_votes_count: number,
+            percentage_of_participation: number (0 to 100)
+        }
+
+        The counts are kept in the election instance, and in the cache for
+        VOTE_CACHE_SECONDS until a vote is emitted or cancelled in the
+        election, a delegation changes in its agora, its agora gains or loses
+        members or the election is saved.
+        '''
+        key = Election.vote_counts_cache_key(self.id)
+        counts = getattr(self, '_vote_counts_cache', None)
+        if counts is None and settings.VOTE_CACHE_SECONDS:
+            counts = cache.get(key)
+        if counts is None or counts['state'] != self.get_vote_counts_state():
+            counts = self.compute_vote_counts()
+            if settings.VOTE_CACHE_SECONDS:
+                cache.set(key, counts, settings.VOTE_CACHE_SECONDS)
+        self._vote_counts_cache = counts
+        return counts
+
+    @staticmethod
+    def cache_vote_counts(elections):
+        '''
+        Loads the get_vote_counts() of a list of elections, typically a page
+        of a listing, from the cache at once, computing only the missing ones.
+        '''
+        if not settings.VOTE_CACHE_SECONDS:
+            return
+
+        elections = list(elections)
+        keys = dict([(Election.vote_counts_cache_key(election.id), election)
+            for election in elections])
+        found = cache.get_many(keys.keys())
+
+        values = dict()
+        for key, election in keys.items():
+            counts = found.get(key)
+            if counts is None or\
+                    counts['state'] != election.get_vote_counts_state():
+                counts = values[key] = election.compute_vote_counts()
+            election._vote_counts_cache = counts
+        if values:
+            cache.set_many(values, settings.VOTE_CACHE_SECONDS)
+
     def has_user_voted_via_a_delegate(self, voter):
         vote = self.get_vote_for_voter(voter)
         if not vote:
@@ -573,24 +685,255 @@ class Election(models.Model):
             return True
         return False
 
+    @staticmethod
+    def vote_for_voter_cache_key(election_id, voter_id):
+        '''
+        Key under which get_vote_for_voter() caches the vote of a voter
+        '''
+        return 'election_vote_for_voter_%d_%d' % (election_id, voter_id)
+
     def get_vote_for_voter(self, voter):
         '''
         Given a voter (an User), returns the vote of the vote of this voter
         on the election. It will be either a proxy or a direct vote
+
+        The result is kept in the election instance, and in the cache for
+        VOTE_CACHE_SECONDS until the voter emits or cancels a vote in this
+        election or a delegation in its agora.
         '''
-        # These are all the direct votes, even from those who are not elegible
-        # to vote in this election
-        nodes = self.cast_votes.filter(is_direct=True, invalidated_at_date=None)
+        if voter.id is None:
+            return None
 
-        # These are all the delegation votes, i.e. those that point to a delegate
-        edges = self.agora.delegation_election.cast_votes.filter(is_direct=False, invalidated_at_date=None)
+        votes = getattr(self, '_votes_for_voters_cache', None)
+        if votes is None:
+            votes = self._votes_for_voters_cache = dict()
+        if voter.id in votes:
+            return votes[voter.id]
+
+        key = Election.vote_for_voter_cache_key(self.id, voter.id)
+        vote = None
+        if settings.VOTE_CACHE_SECONDS:
+            vote = cache.get(key)
+
+        if vote is None:
+            # These are all the direct votes, even from those who are not
+            # elegible to vote in this election
+            nodes = list(self.cast_votes.filter(is_direct=True,
+                invalidated_at_date=None, voter=voter)[:2])
+
+            if len(nodes) == 1:
+                vote = nodes[0]
+            else:
+                # These are all the delegation votes, i.e. those that point to
+                # a delegate
+                edges = list(self.agora.delegation_election.cast_votes.filter(
+                    is_direct=False, invalidated_at_date=None, voter=voter)[:2])
+                vote = len(edges) == 1 and edges[0] or False
+
+            if settings.VOTE_CACHE_SECONDS:
+                cache.set(key, vote, settings.VOTE_CACHE_SECONDS)
+
+        votes[voter.id] = vote or None
+        return vote or None
+
+    @staticmethod
+    def cache_votes_for_voter(elections, voter):
+        '''
+        Loads the get_vote_for_voter() of a voter for a list of elections,
+        typically a page of a listing, with a fixed number of queries.
+        '''
+        from agora_site.agora_core.models import CastVote
+
+        elections = list(elections)
+        if voter.id is None or not elections:
+            return
+
+        def group_by_election(votes):
+            grouped = dict()
+            for vote in votes:
+                grouped.setdefault(vote.election_id, []).append(vote)
+            return grouped
+
+        nodes = group_by_election(CastVote.objects.filter(is_direct=True,
+            invalidated_at_date=None, voter=voter,
+            election__in=[e.id for e in elections]))
+
+        delegation_elections = dict(Agora.objects.filter(
+            id__in=set([e.agora_id for e in elections])).values_list('id',
+                'delegation_election'))
+        edges = group_by_election(CastVote.objects.filter(is_direct=False,
+            invalidated_at_date=None, voter=voter,
+            election__in=delegation_elections.values()))
+
+        values = dict()
+        for election in elections:
+            election_nodes = nodes.get(election.id, [])
+            election_edges = edges.get(
+                delegation_elections.get(election.agora_id), [])
+            if len(election_nodes) == 1:
+                vote = election_nodes[0]
+            elif len(election_edges) == 1:
+                vote = election_edges[0]
+            else:
+                vote = False
+            values[Election.vote_for_voter_cache_key(election.id, voter.id)] = vote
+
+            votes = getattr(election, '_votes_for_voters_cache', None)
+            if votes is None:
+                votes = election._votes_for_voters_cache = dict()
+            votes[voter.id] = vote or None
+
+        if settings.VOTE_CACHE_SECONDS:
+            cache.set_many(values, settings.VOTE_CACHE_SECONDS)
 
-        if nodes.filter(voter=voter).count() == 1:
-            return nodes.filter(voter=voter)[0]
-        elif edges.filter(voter=voter).count() == 1:
-            return edges.filter(voter=voter)[0]
+    @staticmethod
+    def delegation_graph_cache_key(election_id):
+        '''
+        Key under which get_delegation_graph() caches the graph of an election
+        '''
+        return 'election_delegation_graph_%d' % election_id
+
+    def get_delegation_graph(self):
+        '''
+        Returns the delegation graph of the election in a compact form that
+        allows to resolve delegation chains without any further query:
+
+        {
+            is_tallied: True|False,
+            nodes: {voter_id: dict(vote_id, is_public, answers, reason), ..},
+            edges: {voter_id: dict(vote_id, is_public, delegate_id), ..},
+            usernames: {user_id: username, ..}
+        }
+
+        Nodes are the direct votes in this election and edges the delegated
+        votes that apply to it: the frozen ones if the election has been
+        tallied, the current ones in the agora otherwise. As in the tally,
+        voters with more than one node or edge are ignored.
+
+        The graph is kept in the election instance, and in the cache for
+        VOTE_CACHE_SECONDS until a vote is emitted or cancelled in the
+        election or a delegation changes in its agora.
+        '''
+        from agora_site.agora_core.models import CastVote
+
+        key = Election.delegation_graph_cache_key(self.id)
+        graph = getattr(self, '_delegation_graph_cache', None)
+        if graph is None and settings.VOTE_CACHE_SECONDS:
+            graph = cache.get(key)
+        if graph is not None and graph['is_tallied'] == self.is_tallied():
+            self._delegation_graph_cache = graph
+            return graph
+
+        if self.is_tallied():
+            edges_query = self.delegated_votes.all()
         else:
-            return None
+            edges_query = self.agora.delegation_election.cast_votes.filter(
+                is_direct=False, is_counted=True, invalidated_at_date=None)
+
+        usernames = dict()
+        def group_by_voter(votes):
+            grouped = dict()
+            for vote in votes.select_related('voter'):
+                usernames[vote.voter_id] = vote.voter.username
+                grouped.setdefault(vote.voter_id, []).append(vote)
+            return dict([(voter_id, voter_votes[0])
+                for voter_id, voter_votes in grouped.iteritems()
+                if len(voter_votes) == 1])
+
+        nodes = dict()
+        direct_votes = self.cast_votes.filter(is_direct=True,
+            invalidated_at_date=None)
+        for voter_id, vote in group_by_voter(direct_votes).iteritems():
+            answers = None
+            if vote.is_plaintext():
+                answers = [answer['choices'] for answer in vote.data['answers']]
+            nodes[voter_id] = dict(vote_id=vote.id, is_public=vote.is_public,
+                answers=answers, reason=vote.reason)
+
+        edges = dict()
+        for voter_id, vote in group_by_voter(edges_query).iteritems():
+            edges[voter_id] = dict(vote_id=vote.id, is_public=vote.is_public,
+                delegate_id=vote.get_delegate_id())
+
+        # delegates that did not vote nor delegate are still part of chains
+        missing_ids = set([edge['delegate_id'] for edge in edges.values()])\
+            .difference(usernames.keys())
+        if missing_ids:
+            usernames.update(User.objects.filter(id__in=missing_ids)\
+                .values_list('id', 'username'))
+
+        graph = dict(is_tallied=self.is_tallied(), nodes=nodes, edges=edges,
+            usernames=usernames)
+        if settings.VOTE_CACHE_SECONDS:
+            cache.set(key, graph, settings.VOTE_CACHE_SECONDS)
+        self._delegation_graph_cache = graph
+        return graph
+
+    def resolve_delegation_chain(self, voter_id, graph=None):
+        '''
+        Follows the delegation chain of a voter in this election, using the
+        delegation graph. Returns a dict with this format:
+
+        {
+            voter_id: id,
+            username: username,
+            is_direct: True|False|None, # None if the voter did not vote
+            is_public: True|False|None, # whether the voter vote is public
+            delegates: [dict(id, username), ..], # the chain, in order
+            vote_id: id, # final direct vote, None if the chain is broken
+            answers: [[choice, ..], ..], # answers of the final vote
+            reason: reason, # reason of the final vote
+            is_broken: True|False
+        }
+
+        As in the tally, a chain is broken if it loops, if it goes through a
+        secret vote of a delegate or if it does not end in a direct vote.
+        '''
+        if graph is None:
+            graph = self.get_delegation_graph()
+        nodes = graph['nodes']
+        edges = graph['edges']
+
+        chain = dict(voter_id=voter_id,
+            username=graph['usernames'].get(voter_id),
+            is_direct=None, is_public=None, delegates=[], vote_id=None,
+            answers=None, reason=None, is_broken=True)
+
+        visited = set([voter_id])
+        current_id = voter_id
+        while True:
+            is_direct = current_id in nodes
+            vote = nodes.get(current_id) or edges.get(current_id)
+            if vote is None:
+                break
+
+            if current_id == voter_id:
+                chain.update(is_direct=is_direct, is_public=vote['is_public'])
+            elif not vote['is_public']:
+                break
+
+            if is_direct:
+                chain.update(vote_id=vote['vote_id'], answers=vote['answers'],
+                    reason=vote['reason'], is_broken=False)
+                break
+
+            current_id = vote['delegate_id']
+            if current_id in visited:
+                break
+            visited.add(current_id)
+            chain['delegates'].append(dict(id=current_id,
+                username=graph['usernames'].get(current_id)))
+
+        return chain
+
+    def get_delegation_chains(self, voter_ids):
+        '''
+        Resolves the delegation chains of a list of voters. See
+        resolve_delegation_chain().
+        '''
+        graph = self.get_delegation_graph()
+        return [self.resolve_delegation_chain(voter_id, graph)
+            for voter_id in voter_ids]
 
     def get_brief_description(self):
         '''
@@ -671,34 +1014,93 @@ class Election(models.Model):
             desc += tmp.__unicode__()
         return desc
 
-    def compute_result(self):
+    @transaction.commit_on_success
+    def freeze_voters(self):
         '''
-        Computes the result of the election
+        Snapshots the electorate of the election and the delegated votes that
+        apply to it, i.e. the current delegations of those members who did not
+        vote directly. It is done when voting starts and again when it ends,
+        so that tallies and post-election pages read the snapshot instead of
+        deriving it from the ever changing agora. The snapshot is replaced
+        in a single transaction.
         '''
         from agora_site.agora_core.models import CastVote
 
-        # Query with the direct votes in this election
-        q=self.cast_votes.filter(
-            is_counted=True,
-            invalidated_at_date=None
-        ).values('voter__id').query
+        Electorate = Election.electorate.through
+        Electorate.objects.filter(election=self).delete()
+        Electorate.objects.bulk_create([
+            Electorate(election_id=self.id, user_id=user_id)
+            for user_id in self.agora.members.values_list('id', flat=True)])
 
-        # Query with the delegated votes
+        DelegatedVotes = Election.delegated_votes.through
+        DelegatedVotes.objects.filter(election=self).delete()
         if self.agora.delegation_policy == Agora.DELEGATION_TYPE[0][0]:
-            self.delegated_votes = CastVote.objects.filter(
-                election=self.agora.delegation_election,
-                is_direct=False,
-                is_counted=True,
-                invalidated_at_date=None
-                # we exclude from this query the people who voted directly so that
-                # you cannot vote twice
-            ).exclude(
-                is_direct=False,
-                voter__id__in=q
-            )
-
-        # These are all the people that can vote in this election
-        self.electorate = self.agora.members.all()
+            # we exclude the people who voted directly so that you cannot
+            # vote twice
+            direct_voters = self.cast_votes.filter(is_counted=True,
+                invalidated_at_date=None).values('voter__id').query
+            vote_ids = CastVote.objects.filter(
+                election=self.agora.delegation_election, is_direct=False,
+                is_counted=True, invalidated_at_date=None
+            ).exclude(voter__id__in=direct_voters).values_list('id', flat=True)
+            DelegatedVotes.objects.bulk_create([
+                DelegatedVotes(election_id=self.id, castvote_id=vote_id)
+                for vote_id in vote_ids])
+
+        self.delegated_votes_frozen_at_date = self.voters_frozen_at_date =\
+            timezone.now()
+        Election.objects.filter(id=self.id).update(
+            delegated_votes_frozen_at_date=self.delegated_votes_frozen_at_date,
+            voters_frozen_at_date=self.voters_frozen_at_date)
+        # update() does not send post_save, and the delegated votes were
+        # replaced in bulk
+        cache.delete_many([object_cache_key(Election, self.id),
+            Election.vote_counts_cache_key(self.id)])
+        unmap_object(Election, self)
+
+    def get_tally_input_digest(self):
+        '''
+        Returns a digest of everything compute_result() reads: the questions,
+        the voting system, the electorate, the direct votes and the
+        delegations, taken from the snapshot if the voters are frozen. If the
+        digest did not change since the last tally, the result would not
+        change either.
+        '''
+        digest = hashlib.sha256()
+
+        def update(value):
+            digest.update(simplejson.dumps(value, sort_keys=True))
+            digest.update("\n")
+
+        if self.voters_frozen_at_date:
+            electorate = self.electorate.all()
+            edges = self.delegated_votes.all()
+        else:
+            electorate = self.agora.members.all()
+            edges = self.agora.delegation_election.cast_votes.filter(
+                is_direct=False, is_counted=True, invalidated_at_date=None)
+
+        update([self.election_type, self.agora.delegation_policy,
+            self.questions])
+        update(list(electorate.order_by('id').values_list('id', flat=True)))
+        update(list(self.cast_votes.filter(invalidated_at_date=None)\
+            .order_by('id').values_list('id', 'voter_id', 'is_counted',
+                'is_direct', 'is_public')))
+        update(list(edges.order_by('id').values_list('id', 'voter_id',
+            'is_public')))
+
+        return digest.hexdigest()
+
+    def compute_result(self):
+        '''
+        Computes the result of the election
+        '''
+        # The electorate and the delegated votes are read from the snapshot
+        # taken when voting ended, so that re-tallies give the same result
+        if not self.voters_frozen_at_date:
+            self.freeze_voters()
+
+        tally_input_digest = self.get_tally_input_digest()
 
         # These are all the direct votes, even from those who are not elegible 
         # to vote in this election
@@ -945,7 +1347,8 @@ class Election(models.Model):
         tally_log = []
         for tally in tallies:
             tally_log.append(tally.get_log())
-        self.extra_data['tally_log'] = tally_log
+        self.set_tally_log(tally_log)
+        self.extra_data['tally_input_digest'] = tally_input_digest
 
         def rank_delegate(delegate_count, delegation_counts):
             if delegate_count == 0:
@@ -967,8 +1370,158 @@ class Election(models.Model):
             dec.delegate_id = int(key)
             dec.save()
 
-        self.delegated_votes_frozen_at_date = self.voters_frozen_at_date =\
-            self.result_tallied_at_date = timezone.now()
+        self.result_tallied_at_date = timezone.now()
 
         # TODO: update result_hash
         self.save()
+
+        # the delegated votes of the election are now the frozen ones
+        cache.delete(Election.delegation_graph_cache_key(self.id))
+        self.__dict__.pop('_delegation_graph_cache', None)
+
+    def get_tally_log_json(self):
+        '''
+        Returns the tally log of the election as serialized JSON, or None if
+        the election has not been tallied
+        '''
+        from agora_site.agora_core.models import ElectionTallyLog
+
+        logs = ElectionTallyLog.objects.filter(election=self.id)\
+            .values_list('log', flat=True)[:1]
+        if logs:
+            return logs[0]
+        # logs of the tallies done before they were stored apart
+        if self.extra_data and 'tally_log' in self.extra_data:
+            return json.dumps(self.extra_data['tally_log'],
+                cls=DjangoJSONEncoder)
+        return None
+
+    def get_tally_log(self):
+        '''
+        Returns the tally log of the election: a list with the log of the
+        tally of each question, or None if the election has not been tallied.
+        '''
+        log = self.get_tally_log_json()
+        if log is None:
+            return None
+        return json.loads(log)
+
+    def set_tally_log(self, tally_log):
+        '''
+        Stores the tally log of the election, apart from extra_data
+        '''
+        from agora_site.agora_core.models import ElectionTallyLog
+
+        log = json.dumps(tally_log, cls=DjangoJSONEncoder)
+        if not ElectionTallyLog.objects.filter(election=self.id).update(log=log):
+            ElectionTallyLog.objects.create(election_id=self.id, log=log)
+        if self.extra_data:
+            self.extra_data.pop('tally_log', None)
+
+    def get_extra_data_json(self):
+        '''
+        Returns the extra data of the election as serialized JSON, including
+        the tally log, which is embedded as stored without parsing it.
+        '''
+        extra_data = dict(self.extra_data or {})
+        extra_data.pop('tally_log', None)
+        extra_data_json = json.dumps(extra_data, cls=DjangoJSONEncoder)
+
+        tally_log = self.get_tally_log_json()
+        if tally_log is None:
+            return self.extra_data is None and 'null' or extra_data_json
+
+        if extra_data:
+            return '%s, "tally_log": %s}' % (extra_data_json[:-1], tally_log)
+        return '{"tally_log": %s}' % tally_log
+
+    # public data of a tallied election that is rendered once after the tally
+    # by render_result_artifacts()
+    RESULT_ARTIFACTS = ('extra_data', 'results')
+
+    def result_artifact_path(self, name):
+        '''
+        Path of the gzip-compressed JSON file of a result artifact of the
+        election. The file name includes the tally date, so that the artifacts
+        of a previous tally are never taken for the current ones.
+        '''
+        return os.path.join(settings.RESULT_ARTIFACTS_PATH, str(self.id),
+            '%s-%s.json.gz' % (name,
+                self.result_tallied_at_date.strftime('%Y%m%d%H%M%S%f')))
+
+    def get_result_artifact(self, name):
+        '''
+        Returns the gzip-compressed content of a result artifact of the
+        election as rendered by its last tally, or None if the election is not
+        tallied or the artifact has not been rendered
+        '''
+        if not self.is_tallied():
+            return None
+
+        try:
+            with open(self.result_artifact_path(name), 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def get_results_data(self):
+        '''
+        Returns the result of the election together with its participation
+        and the ranking of its delegates
+        '''
+        delegates = self.delegate_election_counts.select_related('delegate')\
+            .order_by('-count', 'delegate__username')
+        return dict(
+            election_id=self.id,
+            result=self.result,
+            result_tallied_at_date=self.result_tallied_at_date,
+            participation=self.get_participation(),
+            delegates=[dict(
+                delegate_id=dec.delegate_id,
+                username=dec.delegate.username,
+                delegate_vote_id=dec.delegate_vote_id,
+                count=dec.count,
+                count_percentage=dec.count_percentage,
+                rank=dec.rank
+            ) for dec in delegates])
+
+    def render_result_artifacts(self):
+        '''
+        Renders the public result data of a tallied election once, as
+        gzip-compressed JSON files which can be served without loading nor
+        serializing the election again. Called as the last stage of the tally.
+        '''
+        if not self.is_tallied():
+            return
+
+        artifacts = dict(extra_data=self.get_extra_data_json(),
+            results=json.dumps(self.get_results_data(), cls=DjangoJSONEncoder))
+        for name, content in artifacts.items():
+            path = self.result_artifact_path(name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            # written aside and renamed, so that readers never see a half
+            # written file
+            tmp_path = '%s.%s.tmp' % (path, uuid.uuid4())
+            f = gzip.open(tmp_path, 'wb')
+            try:
+                f.write(unicode(content).encode('utf-8'))
+            finally:
+                f.close()
+            os.rename(tmp_path, path)
+
+        # remove the artifacts of previous tallies
+        current = set(os.path.basename(self.result_artifact_path(name))
+            for name in artifacts)
+        dirname = os.path.dirname(self.result_artifact_path('results'))
+        for filename in os.listdir(dirname):
+            if filename not in current and not filename.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(dirname, filename))
+                except OSError:
+                    pass
+
+    def delete_result_artifacts(self):
+        shutil.rmtree(os.path.join(settings.RESULT_ARTIFACTS_PATH,
+            str(self.id)), ignore_errors=True)
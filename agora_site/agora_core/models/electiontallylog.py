@@ -0,0 +1,18 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class ElectionTallyLog(models.Model):
+    '''
+    Log of the tally of an election, with the report of every iteration of
+    each question. It can be large, so it is kept apart from
+    Election.extra_data and only loaded when it is asked for, see
+    Election.get_tally_log().
+    '''
+    election = models.OneToOneField('Election', related_name='tally_log_entry')
+
+    # serialized JSON, so that the api can send it without parsing it
+    log = models.TextField(_('Tally log'))
+
+    class Meta:
+        app_label = 'agora_core'
@@ -0,0 +1,19 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class SearchIndexRun(models.Model):
+    '''
+    Start date of the last successful incremental update_index run for the
+    search index of a model on a haystack connection. The next incremental
+    run only reindexes the objects updated since then.
+    '''
+    content_type = models.ForeignKey(ContentType)
+
+    using = models.CharField(max_length=100)
+
+    started_at_date = models.DateTimeField()
+
+    class Meta:
+        app_label = 'agora_core'
+        unique_together = (('content_type', 'using'),)
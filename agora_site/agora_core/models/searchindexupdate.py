@@ -0,0 +1,16 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class SearchIndexUpdate(models.Model):
+    '''
+    Queue of objects whose search index entry is outdated: they were saved or
+    deleted since the last index update. Entries are processed in batches by
+    the update_search_index task, which writes them in a single commit.
+    '''
+    content_type = models.ForeignKey(ContentType)
+
+    object_id = models.IntegerField()
+
+    class Meta:
+        app_label = 'agora_core'
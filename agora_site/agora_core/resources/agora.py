@@ -5,6 +5,7 @@ from django.db.models import Q
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.views.decorators.cache import cache_control
+from django.conf import settings
 from django.forms import ModelForm
 from django.core.urlresolvers import reverse
 from django.conf.urls.defaults import url
@@ -39,9 +40,10 @@ from agora_site.agora_core.forms import PostCommentForm, CreateElectionForm
 from agora_site.agora_core.forms.agora import DelegateVoteForm
 from agora_site.agora_core.views import AgoraActionJoinView
 from agora_site.misc.generic_resource import GenericResource, GenericMeta
-from agora_site.misc.decorators import permission_required
+from agora_site.misc.decorators import permission_required, fragment_cache
 from agora_site.misc.utils import (geolocate_ip, get_base_email_context,
-                                   clean_html)
+                                   clean_html, get_cached_object,
+                                   get_cached_object_or_404)
 
 class TinyAgoraResource(GenericResource):
     '''
@@ -147,6 +149,11 @@ class AgoraResource(GenericResource):
 
     get_list = TinyAgoraResource().get_list
 
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=lambda pk, **kwargs: ['agora-%s' % pk])
+    def get_detail(self, request, **kwargs):
+        return super(AgoraResource, self).get_detail(request, **kwargs)
+
     def dehydrate_full_name(self, bundle):
         return bundle.obj.get_full_name()
 
@@ -234,6 +241,14 @@ class AgoraResource(GenericResource):
                 % (self._meta.resource_name, trailing_slash()),
                 self.wrap_view('get_active_delegates_list'), name="api_agora_active_delegate_list"),
 
+            url(r"^(?P<resource_name>%s)/(?P<agoraid>\d+)/delegates_leaderboard%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_delegates_leaderboard'), name="api_agora_delegates_leaderboard"),
+
+            url(r"^(?P<resource_name>%s)/(?P<agoraid>\d+)/delegators/(?P<userid>\d+)%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_delegators_list'), name="api_agora_delegators_list"),
+
             url(r"^(?P<resource_name>%s)/(?P<agoraid>\d+)/all_elections%s$" \
                 % (self._meta.resource_name, trailing_slash()),
                 self.wrap_view('get_all_elections_list'), name="api_agora_all_elections_list"),
@@ -323,6 +338,39 @@ class AgoraResource(GenericResource):
             queryfunc=lambda agora: self.filter_user(request, agora.active_delegates()),
             **kwargs)
 
+    def get_delegates_leaderboard(self, request, **kwargs):
+        '''
+        List the delegates of this agora ranked by the number of users
+        delegating into them, directly or not
+        '''
+        from agora_site.agora_core.resources.delegateagoracount import DelegateAgoraCountResource
+
+        def get_queryset(agora):
+            queryset = agora.delegates_leaderboard()
+            u_filter = request.GET.get('username', '')
+            if u_filter:
+                queryset = queryset.filter(
+                    Q(delegate__username__icontains=u_filter) |
+                    Q(delegate__first_name__icontains=u_filter) |
+                    Q(delegate__last_name__icontains=u_filter))
+            return queryset
+
+        return self.get_custom_resource_list(request,
+            resource=DelegateAgoraCountResource, queryfunc=get_queryset,
+            **kwargs)
+
+    def get_delegators_list(self, request, **kwargs):
+        '''
+        List the users currently delegating directly into the given user in
+        this agora
+        '''
+        delegate = get_cached_object_or_404(User, pk=kwargs.pop('userid'))
+        return self.get_custom_resource_list(request,
+            resource=TinyUserResource,
+            queryfunc=lambda agora: self.filter_user(request,
+                agora.get_delegators(delegate)),
+            **kwargs)
+
     def get_all_elections_list(self, request, **kwargs):
         '''
         List all elections in an agora
@@ -331,6 +379,8 @@ class AgoraResource(GenericResource):
         return self.get_custom_resource_list(request, resource=TinyElectionResource,
             queryfunc=lambda agora: agora.all_elections(), **kwargs)
 
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=lambda agoraid, **kwargs: ['agora-%s' % agoraid])
     def get_tallied_elections_list(self, request, **kwargs):
         '''
         List elections that have been already tallied in an agora
@@ -411,7 +461,7 @@ class AgoraResource(GenericResource):
         agora = None
         agoraid = kwargs.get('agoraid', -1)
         try:
-            agora = Agora.objects.get(id=agoraid)
+            agora = get_cached_object(Agora, id=agoraid)
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
@@ -495,7 +545,7 @@ class AgoraResource(GenericResource):
         agora = None
         agoraid = kwargs.get('agoraid', -1)
         try:
-            agora = Agora.objects.get(id=agoraid)
+            agora = get_cached_object(Agora, id=agoraid)
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
@@ -516,7 +566,7 @@ class AgoraResource(GenericResource):
             if not agora.has_perms('admin', request.user):
                 return self.create_response(request,
                     dict(permissions=[]))
-            user = get_object_or_404(User, id=kwargs['userid'])
+            user = get_cached_object_or_404(User, id=kwargs['userid'])
 
         return self.create_response(request,
             dict(permissions=agora.get_perms(user)))
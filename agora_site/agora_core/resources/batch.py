@@ -0,0 +1,75 @@
+from django.conf.urls import url
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import simplejson as json
+
+from tastypie.resources import Resource
+from tastypie.utils import trailing_slash
+
+from agora_site.misc.utils import rest_batch_get
+from agora_site.misc.generic_resource import GenericResourceMixin, GenericMeta
+
+# maximum number of calls in a batch request
+BATCH_MAX_CALLS = 20
+
+# GET params used by tastypie for authentication and serialization, which
+# are not calls
+BATCH_RESERVED_PARAMS = ('format', 'username', 'api_key', 'callback')
+
+
+class BatchResource(GenericResourceMixin, Resource):
+    '''
+    Runs several read calls to the API in a single request, sharing the
+    objects they load. Each GET param is the name of a call and its value
+    the path of the call, i.e.
+    /batch/?agora=/agora/1/&elections=/agora/1/tallied_elections/%3Flimit%3D3
+
+    The calls are run as the authenticated user, see BATCH_RESERVED_PARAMS.
+    '''
+
+    class Meta(GenericMeta):
+        resource_name = 'batch'
+        list_allowed_methods = ['get']
+        detail_allowed_methods = []
+
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_batch'), name="api_batch"),
+        ]
+
+    def get_batch(self, request, **kwargs):
+        '''
+        Returns an object with the response of each call under its name, or
+        null for the calls which failed
+        '''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        calls = dict()
+        for name, path in request.GET.items():
+            if name in BATCH_RESERVED_PARAMS:
+                continue
+            if path.startswith('/api/v1/'):
+                path = path[len('/api/v1'):]
+            if not path.startswith('/'):
+                return HttpResponseBadRequest("Sorry, you did not provide valid input data")
+            calls[name] = path
+        if not calls or len(calls) > BATCH_MAX_CALLS:
+            return HttpResponseBadRequest("Sorry, you did not provide valid input data")
+
+        results = rest_batch_get(calls, request=request)
+
+        # responses are already serialized, so they are not parsed again
+        content = []
+        for name, (status_code, container) in results.items():
+            if status_code >= 300:
+                data = 'null'
+            else:
+                data = container[0]
+            content.append('%s: %s' % (json.dumps(name), data))
+
+        self.log_throttled_access(request)
+        return HttpResponse('{%s}' % ', '.join(content),
+            content_type='application/json; charset=utf-8')
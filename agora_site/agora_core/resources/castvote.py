@@ -23,6 +23,8 @@ class CastVoteResource(GenericResource):
         list_allowed_methods = ['get', 'post']
         detail_allowed_methods = ['get']
         excludes = ['data']
+        # used by get_public_data
+        list_load_fields = ['data']
 
     def dehydrate_public_data(self, bundle):
         return bundle.obj.get_public_data()
@@ -0,0 +1,22 @@
+from agora_site.agora_core.models.delegateagoracount import DelegateAgoraCount
+from agora_site.misc.generic_resource import GenericResource, GenericMeta
+from agora_site.agora_core.resources.user import TinyUserResource
+
+from tastypie import fields
+from tastypie.constants import ALL, ALL_WITH_RELATIONS
+
+class DelegateAgoraCountResource(GenericResource):
+    delegate = fields.ForeignKey(TinyUserResource, 'delegate', full=True)
+    agora = fields.ForeignKey('agora_site.agora_core.resources.agora.TinyAgoraResource',
+                              'agora')
+    class Meta(GenericMeta):
+        queryset = DelegateAgoraCount.objects.select_related('delegate',
+            'delegate__profile').order_by('-transitive_count', '-count', 'id')
+        fields = ['count', 'transitive_count', 'updated_at_date']
+        list_allowed_methods = ['get']
+        detail_allowed_methods = ['get']
+        filtering = {
+            'delegate': ALL,
+            'agora': ALL_WITH_RELATIONS,
+            'transitive_count': ALL,
+        }
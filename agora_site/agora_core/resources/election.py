@@ -8,8 +8,9 @@ from agora_site.agora_core.resources.castvote import CastVoteResource
 from agora_site.agora_core.forms import PostCommentForm, election_questions_validator
 from agora_site.agora_core.forms.election import VoteForm as ElectionVoteForm
 from agora_site.misc.utils import (geolocate_ip, get_base_email_context,
-    JSONFormField, JSONApiField, ISODateTimeFormField, clean_html)
-from agora_site.misc.decorators import permission_required
+    JSONFormField, JSONApiField, ISODateTimeFormField, clean_html,
+    get_cached_object)
+from agora_site.misc.decorators import permission_required, fragment_cache
 
 from tastypie import fields, http
 from tastypie.authorization import Authorization
@@ -24,7 +25,6 @@ from actstream.models import object_stream
 from django.conf.urls.defaults import url
 from django.contrib.sites.models import Site
 from django.conf import settings
-from django.views.decorators.cache import cache_control
 from django.core.mail import EmailMultiAlternatives, EmailMessage, send_mass_mail
 from django.template.loader import render_to_string
 from django.forms import ModelForm
@@ -34,9 +34,13 @@ from django.utils import translation
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 from django import forms as django_forms
 
+from cStringIO import StringIO
 import datetime
+import gzip
 
 
 DELEGATION_URL = "http://example.com/delegation/has/no/url/"
@@ -214,6 +218,10 @@ class ElectionValidation(Validation):
         return form.is_valid(bundle, request)
 
 
+def election_surrogate_keys(electionid, **kwargs):
+    return ['election-%s' % electionid]
+
+
 class ElectionResource(GenericResource):
     '''
     Resource representing elections.
@@ -261,14 +269,24 @@ class ElectionResource(GenericResource):
 
     get_list = TinyElectionResource().get_list
 
+    # user_perms and user_has_delegated depend on the user
+    @fragment_cache(public=False)
+    def get_detail(self, request, **kwargs):
+        return super(ElectionResource, self).get_detail(request, **kwargs)
+
     def dehydrate_mugshot_url(self, bundle):
         return bundle.obj.get_mugshot_url()
 
+    def prefetch_list(self, request, object_list):
+        Election.cache_vote_counts(object_list)
+        Election.cache_votes_for_voter(object_list, request.user)
+        Election.load_user_roles(object_list, request.user)
+
     def dehydrate_direct_votes_count(self, bundle):
-        return bundle.obj.get_direct_votes().count()
+        return bundle.obj.get_vote_counts()['direct_votes_count']
 
     def dehydrate_delegated_votes_count(self, bundle):
-        return bundle.obj.get_delegated_votes().count()
+        return bundle.obj.get_vote_counts()['delegated_votes_count']
 
     def dehydrate_user_has_delegated(self, bundle):
         if bundle.request.user.is_anonymous():
@@ -285,6 +303,11 @@ class ElectionResource(GenericResource):
                 % (self._meta.resource_name, trailing_slash()),
                 self.wrap_view('get_extra_data'), name="api_election_extra_data"),
 
+            # election results, once tallied
+            url(r"^(?P<resource_name>%s)/(?P<electionid>\d+)/results%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_results'), name="api_election_results"),
+
             # all counting votes
             url(r"^(?P<resource_name>%s)/(?P<electionid>\d+)/all_votes%s$" \
                 % (self._meta.resource_name, trailing_slash()),
@@ -310,6 +333,11 @@ class ElectionResource(GenericResource):
                 % (self._meta.resource_name, trailing_slash()),
                 self.wrap_view('get_direct_votes'), name="api_election_direct_votes"),
 
+            # resolved delegation chains of the given voters
+            url(r"^(?P<resource_name>%s)/(?P<electionid>\d+)/delegation_chains%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_delegation_chains'), name="api_election_delegation_chains"),
+
             url(r"^(?P<resource_name>%s)/(?P<electionid>\d+)/comments%s$" \
                 % (self._meta.resource_name, trailing_slash()),
                 self.wrap_view('get_comments'), name="api_election_comments"),
@@ -323,19 +351,72 @@ class ElectionResource(GenericResource):
                 self.wrap_view('action'), name="api_election_action"),
         ]
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_extra_data(self, request, **kwargs):
         if request.method != "GET":
             raise ImmediateHttpResponse(response=http.HttpMethodNotAllowed())
 
         election = None
-        electionid = kwargs.get('electionid', -1)
         try:
-            election = Election.objects.get(id=electionid)
+            election = get_cached_object(Election, id=kwargs.get('electionid', -1))
+        except:
+            raise ImmediateHttpResponse(response=http.HttpNotFound())
+
+        response = self.result_artifact_response(request, election,
+            'extra_data')
+        if response is not None:
+            return response
+
+        # the tally log is sent as stored, without parsing it
+        return HttpResponse(election.get_extra_data_json(),
+            content_type='application/json')
+
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
+    def get_results(self, request, **kwargs):
+        '''
+        Returns the result of a tallied election, its participation and the
+        ranking of its delegates
+        '''
+        if request.method != "GET":
+            raise ImmediateHttpResponse(response=http.HttpMethodNotAllowed())
+
+        election = None
+        try:
+            election = get_cached_object(Election, id=kwargs.get('electionid', -1))
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
-        return self.create_response(request, election.extra_data)
+        if not election.is_tallied():
+            raise ImmediateHttpResponse(response=http.HttpNotFound())
+
+        response = self.result_artifact_response(request, election, 'results')
+        if response is not None:
+            return response
+
+        return self.create_response(request, election.get_results_data())
+
+    def result_artifact_response(self, request, election, name):
+        '''
+        Returns a response with a result artifact of the election as rendered
+        by its last tally, or None if there is none. The artifact is sent
+        compressed as is to the clients that accept gzip.
+        '''
+        content = election.get_result_artifact(name)
+        if content is None:
+            return None
+
+        compressed = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if not compressed:
+            content = gzip.GzipFile(fileobj=StringIO(content)).read()
+
+        # artifacts are always JSON, whatever format the client asked for
+        response = HttpResponse(content, content_type='application/json')
+        if compressed:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
     def get_comments(self, request, **kwargs):
         '''
@@ -385,7 +466,7 @@ class ElectionResource(GenericResource):
         election = None
         electionid = kwargs.get('electionid', -1)
         try:
-            election = Election.objects.get(id=electionid)
+            election = get_cached_object(Election, id=electionid)
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
@@ -598,7 +679,8 @@ class ElectionResource(GenericResource):
             return query.filter(q)
         return query
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_all_votes(self, request, **kwargs):
         '''
         List all the votes in this agora
@@ -607,7 +689,8 @@ class ElectionResource(GenericResource):
             queryfunc=lambda election: self.filter_user(request, election.get_all_votes()),
             **kwargs)
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_cast_votes(self, request, **kwargs):
         '''
         List votes in this agora
@@ -615,7 +698,8 @@ class ElectionResource(GenericResource):
         return self.get_custom_resource_list(request, resource=CastVoteResource,
             queryfunc=lambda election: election.cast_votes.all(), **kwargs)
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_delegated_votes(self, request, **kwargs):
         '''
         List votes in this agora
@@ -623,7 +707,8 @@ class ElectionResource(GenericResource):
         return self.get_custom_resource_list(request, resource=CastVoteResource,
             queryfunc=lambda election: election.get_delegated_votes(), **kwargs)
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_votes_from_delegates(self, request, **kwargs):
         '''
         List votes in this agora
@@ -632,7 +717,8 @@ class ElectionResource(GenericResource):
             queryfunc=lambda election: self.filter_user(request, election.get_votes_from_delegates()),
             **kwargs)
 
-    @cache_control(s_max_age=settings.MANY_CACHE_SECONDS)
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=election_surrogate_keys)
     def get_direct_votes(self, request, **kwargs):
         '''
         List votes in this agora
@@ -640,6 +726,41 @@ class ElectionResource(GenericResource):
         return self.get_custom_resource_list(request, resource=CastVoteResource, 
             queryfunc=lambda election: election.get_direct_votes(), **kwargs)
 
+    def get_delegation_chains(self, request, **kwargs):
+        '''
+        Resolves the delegation chains of the voters given as a comma
+        separated list of user ids in the "voters" GET parameter, i.e. who
+        they delegated into, through whom and what was finally voted.
+
+        The chain of a voter whose vote is secret is only shown to that voter.
+        '''
+        if request.method != "GET":
+            raise ImmediateHttpResponse(response=http.HttpMethodNotAllowed())
+
+        electionid = kwargs.get('electionid', -1)
+        try:
+            election = get_cached_object(Election, id=electionid)
+        except:
+            raise ImmediateHttpResponse(response=http.HttpNotFound())
+
+        try:
+            voter_ids = [int(voter_id)
+                for voter_id in request.GET.get('voters', '').split(',')]
+        except ValueError:
+            raise ImmediateHttpResponse(response=http.HttpBadRequest())
+        if len(voter_ids) > 1000:
+            raise ImmediateHttpResponse(response=http.HttpBadRequest())
+
+        chains = []
+        for chain in election.get_delegation_chains(voter_ids):
+            if chain['is_public'] == False and\
+                    chain['voter_id'] != request.user.id:
+                chain = dict(voter_id=chain['voter_id'],
+                    username=chain['username'], is_public=False)
+            chains.append(chain)
+
+        return self.create_response(request, dict(objects=chains))
+
     def get_custom_resource_list(self, request, queryfunc, resource, **kwargs):
         '''
         List custom resources (mostly used for votes)
@@ -647,7 +768,7 @@ class ElectionResource(GenericResource):
         election = None
         electionid = kwargs.get('electionid', -1)
         try:
-            election = Election.objects.get(id=electionid)
+            election = get_cached_object(Election, id=electionid)
         except:
             raise ImmediateHttpResponse(response=http.HttpNotFound())
 
@@ -656,4 +777,4 @@ class ElectionResource(GenericResource):
 
 
     def dehydrate_percentage_of_participation(self, bundle):
-        return bundle.obj.percentage_of_participation()
+        return bundle.obj.get_vote_counts()['percentage_of_participation']
@@ -1,14 +1,19 @@
+from django.conf.urls import url
 from django.contrib.auth.models import User
+from django.http import HttpResponseBadRequest
 
 from tastypie import http
 from tastypie import fields
 from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.resources import Resource
 from tastypie.bundle import Bundle
+from tastypie.utils import trailing_slash
 
+from haystack import connections
+from haystack.models import SearchResult
 from haystack.query import SearchQuerySet
 
-from agora_site.misc.utils import GenericForeignKeyField
+from agora_site.misc.utils import GenericForeignKeyField, LRUCache
 from agora_site.misc.generic_resource import (GenericResource,
     GenericResourceMixin, GenericMeta)
 from agora_site.agora_core.models.agora import Agora
@@ -19,6 +24,14 @@ from agora_site.agora_core.resources.agora import TinyAgoraResource
 from agora_site.agora_core.resources.election import TinyElectionResource
 from agora_site.agora_core.resources.user import TinyProfileResource
 
+# autocomplete queries shorter than this are not run, edge ngrams of the
+# autocomplete fields start at this size
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# hot autocomplete prefixes are answered without searching the index
+AUTOCOMPLETE_CACHE = LRUCache(size=1000, timeout=60)
+
 # NOTE that GenericResourceMixin must take precedence in inheritance so that
 # we can make sure its GenericResourceMixin.api_field_from_django_field is
 # used
@@ -42,6 +55,13 @@ class SearchResource(GenericResourceMixin, Resource):
         detail_allowed_methods = ['get']
 
 
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)/autocomplete%s$" \
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('get_autocomplete'), name="api_search_autocomplete"),
+        ]
+
     def detail_uri_kwargs(self, bundle_or_obj):
         '''
         processes kwargs for detail uris. TastyPie's Resource class requires
@@ -81,10 +101,88 @@ class SearchResource(GenericResourceMixin, Resource):
                   'castvote': CastVote,
                   'election': Election
                  }
+        # load_all() loads the objects of each page with one query per model
         if model and model in models:
-            return SearchQuerySet().models(models[model])
+            return SearchQuerySet().models(models[model]).load_all()
+
+        return SearchQuerySet().load_all()
+
+    def get_autocomplete(self, request, **kwargs):
+        '''
+        Lists the users, agoras and elections with words starting with the
+        words given in the GET param "q", for typeahead inputs. Results can
+        be restricted with the GET param "model" (user, agora or election).
+        '''
+        self.method_check(request, allowed=['get'])
+        self.throttle_check(request)
 
-        return SearchQuerySet()
+        models = {'user': Profile,
+                  'agora': Agora,
+                  'election': Election
+                 }
+        model = request.GET.get("model", None)
+        query = u' '.join(request.GET.get('q', '').lower().split())
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 10)),
+                AUTOCOMPLETE_MAX_LIMIT))
+        except ValueError:
+            return HttpResponseBadRequest("Sorry, you did not provide valid input data")
+        if model not in models:
+            model = None
+
+        hits = []
+        if len(query) >= AUTOCOMPLETE_MIN_LENGTH:
+            key = (model, query, limit)
+            hits = AUTOCOMPLETE_CACHE.get(key)
+            if hits is None:
+                sqs = SearchQuerySet()
+                if model:
+                    sqs = sqs.models(models[model])
+                hits = [(result.app_label, result.model_name, result.pk,
+                    result.score)
+                    for result in sqs.autocomplete(autocomplete=query)[:limit]]
+                AUTOCOMPLETE_CACHE.set(key, hits)
+
+        results = self.load_results([SearchResult(*hit) for hit in hits])
+
+        self.log_throttled_access(request)
+        return self.create_response(request, {
+            'meta': {'limit': limit},
+            'objects': self.full_dehydrate_list(request, results),
+        })
+
+    def load_results(self, results):
+        '''
+        Sets the object of the given search results, loading them with one
+        query per model. Returns the results whose object still exists.
+        '''
+        unified_index = connections['default'].get_unified_index()
+        pks = dict()
+        for result in results:
+            pks.setdefault(result.model, []).append(result.pk)
+
+        objects = dict()
+        for model, model_pks in pks.iteritems():
+            queryset = unified_index.get_index(model).read_queryset()
+            objects[model] = queryset.in_bulk(model_pks)
+
+        loaded = []
+        for result in results:
+            obj = objects[result.model].get(int(result.pk))
+            if obj is not None:
+                result.object = obj
+                loaded.append(result)
+        return loaded
+
+    def full_dehydrate_list(self, request, object_list):
+        # load_all() leaves None in place of the results whose object was
+        # deleted after being indexed
+        return super(SearchResource, self).full_dehydrate_list(request,
+            [result for result in object_list if result is not None])
+
+    def prefetch_list(self, request, object_list):
+        Profile.cache_counts([result.object for result in object_list
+            if isinstance(result.object, Profile)], request.user)
 
     def get_object_list(self, request):
         '''
@@ -30,12 +30,14 @@ from userena.models import UserenaSignup
 
 from agora_site.misc.utils import get_base_email_context
 from agora_site.misc.generic_resource import GenericResource, GenericMeta
-from agora_site.misc.utils import rest, validate_email
+from agora_site.misc.utils import (rest, validate_email,
+    get_cached_object_or_404)
 from agora_site.misc.decorators import permission_required
 from agora_site.agora_core.forms.user import (UsernameAvailableForm, LoginForm,
     SendMailForm, UserSettingsForm, CustomAvatarForm, APISignupForm)
 from agora_site.agora_core.models import Profile
 from agora_site.agora_core.models import Agora
+from agora_site.agora_core.models import Election
 
 
 class TinyUserResource(GenericResource):
@@ -125,7 +127,7 @@ class TinyProfileResource(GenericResource):
         return bundle.obj.user.get_full_name()
 
     def dehydrate_num_agoras(self, bundle):
-        return bundle.obj.user.agoras.count()
+        return bundle.obj.count_agoras()
 
     def dehydrate_num_votes(self, bundle):
         return bundle.obj.count_direct_votes()
@@ -397,7 +399,7 @@ class UserResource(GenericResource):
                 return bundle.obj.get_perms(bundle.request.user)
 
         if kwargs.has_key('userid'):
-            user = get_object_or_404(User, pk=kwargs['userid'])
+            user = get_cached_object_or_404(User, pk=kwargs['userid'])
         else:
             user = request.user
         if user.is_anonymous():
@@ -420,14 +422,18 @@ class UserResource(GenericResource):
             has_user_voted = fields.BooleanField(default=False)
             has_user_voted_via_a_delegate =fields.BooleanField(default=False) 
 
+            def prefetch_list(self, request, object_list):
+                Election.cache_votes_for_voter(object_list, request.user)
+
             def dehydrate_has_user_voted(self, bundle):
-                return bundle.obj.has_user_voted(request.user)
+                vote = bundle.obj.get_vote_for_voter(request.user)
+                return bool(vote and vote.is_direct and vote.is_counted)
 
             def dehydrate_has_user_voted_via_a_delegate(self, bundle):
                 return bundle.obj.has_user_voted_via_a_delegate(request.user)
 
         if kwargs.has_key('userid'):
-            user = get_object_or_404(User, pk=kwargs['userid'])
+            user = get_cached_object_or_404(User, pk=kwargs['userid'])
         else:
             user = request.user
 
@@ -444,7 +450,7 @@ class UserResource(GenericResource):
         or indirectly
         '''
         from .election import ResultsElectionResource
-        user = get_object_or_404(User, pk=userid)
+        user = get_cached_object_or_404(User, pk=userid)
         queryset = user.get_profile().get_participated_elections()
         return ResultsElectionResource().get_custom_list(request=request,
             queryset=queryset)
@@ -1,22 +1,96 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import signals
+
 from haystack import indexes
-from agora_site.agora_core.models import Profile, Agora, Election
+from haystack.constants import DEFAULT_ALIAS
+from agora_site.agora_core.models import (Profile, Agora, Election,
+    SearchIndexUpdate, SearchIndexRun)
+
+
+class QueuedSearchIndex(indexes.SearchIndex):
+    '''
+    Search index whose objects are queued to be reindexed when they are saved
+    or deleted. The queue is processed periodically by the
+    update_search_index task, so that the index is committed once for many
+    changes and never on the request path.
+    '''
+    def enqueue_object(self, instance, **kwargs):
+        SearchIndexUpdate.objects.create(object_id=instance.pk,
+            content_type=ContentType.objects.get_for_model(instance))
+
+    def get_journaled_pks(self, using=None):
+        '''
+        The queued objects not yet processed by update_search_index
+        '''
+        return list(SearchIndexUpdate.objects.filter(
+            content_type=ContentType.objects.get_for_model(self.get_model())
+        ).values_list('object_id', flat=True).distinct())
+
+    def get_last_update_date(self, using=None):
+        try:
+            return SearchIndexRun.objects.get(using=using or DEFAULT_ALIAS,
+                content_type=ContentType.objects.get_for_model(self.get_model())
+            ).started_at_date
+        except SearchIndexRun.DoesNotExist:
+            return None
+
+    def set_last_update_date(self, date, using=None):
+        run, created = SearchIndexRun.objects.get_or_create(
+            using=using or DEFAULT_ALIAS,
+            content_type=ContentType.objects.get_for_model(self.get_model()),
+            defaults=dict(started_at_date=date))
+        if not created:
+            run.started_at_date = date
+            run.save()
+
+    def _setup_save(self):
+        signals.post_save.connect(self.enqueue_object, sender=self.get_model())
+
+    def _setup_delete(self):
+        signals.post_delete.connect(self.enqueue_object, sender=self.get_model())
 
-class ProfileIndex(indexes.SearchIndex, indexes.Indexable):
+    def _teardown_save(self):
+        signals.post_save.disconnect(self.enqueue_object, sender=self.get_model())
+
+    def _teardown_delete(self):
+        signals.post_delete.disconnect(self.enqueue_object, sender=self.get_model())
+
+
+class ProfileIndex(QueuedSearchIndex, indexes.Indexable):
     text = indexes.CharField(document=True, use_template=True)
+    autocomplete = indexes.EdgeNgramField(use_template=True)
 
     def get_model(self):
         return Profile
 
+    def read_queryset(self):
+        return Profile.objects.select_related('user')
+
 
-class AgoraIndex(indexes.SearchIndex, indexes.Indexable):
+class AgoraIndex(QueuedSearchIndex, indexes.Indexable):
     text = indexes.CharField(document=True, use_template=True)
+    autocomplete = indexes.EdgeNgramField(use_template=True)
 
     def get_model(self):
         return Agora
 
+    def get_updated_field(self):
+        # auto_now: it is refreshed on every save
+        return 'created_at_date'
 
-class ElectionIndex(indexes.SearchIndex, indexes.Indexable):
+    def read_queryset(self):
+        return Agora.objects.select_related('creator')
+
+
+class ElectionIndex(QueuedSearchIndex, indexes.Indexable):
     text = indexes.CharField(document=True, use_template=True)
+    autocomplete = indexes.EdgeNgramField(use_template=True)
 
     def get_model(self):
         return Election
+
+    def get_updated_field(self):
+        return 'last_modified_at_date'
+
+    def read_queryset(self):
+        return Election.objects.select_related('agora', 'agora__creator')
@@ -1,2 +1,4 @@
 from .agora import *
-from .election import *
\ No newline at end of file
+from .election import *
+from .search import *
+from .esi import *
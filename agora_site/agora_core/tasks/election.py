@@ -43,6 +43,7 @@ def start_election(election_id, is_secure, site_id, remote_addr, user_id):
     else:
         election.extra_data["started"]=True
     election.save()
+    election.freeze_voters()
 
     context = get_base_email_context_task(is_secure, site_id)
 
@@ -61,9 +62,9 @@ def start_election(election_id, is_secure, site_id, remote_addr, user_id):
     # (subject, text, html, from_email, recipient)
     datatuples = []
 
-    # NOTE: for now, electorate is dynamic and just taken from the election's
-    # agora members' list
-    for voter in election.agora.members.all():
+    # NOTE: for now, electorate is dynamic: this is the snapshot of the
+    # election's agora members' list taken when voting started
+    for voter in election.electorate.all():
 
         if not voter.get_profile().has_perms('receive_email_updates'):
             continue
@@ -135,7 +136,9 @@ def end_election(election_id, is_secure, site_id, remote_addr, user_id):
     else:
         election.extra_data["ended"]=True
     election.save()
+    election.freeze_voters()
     election.compute_result()
+    election.render_result_artifacts()
 
     context = get_base_email_context_task(is_secure, site_id)
 
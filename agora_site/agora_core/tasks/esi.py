@@ -0,0 +1,15 @@
+from django.conf import settings
+
+from celery import task
+
+import requests
+
+@task(ignore_result=True)
+def purge_surrogate_keys(keys):
+    '''
+    Purges from the edge cache the API fragments tagged with any of the
+    given surrogate keys, see misc.decorators.fragment_cache
+    '''
+    requests.request('PURGE', settings.ESI_PURGE_URL,
+        headers={settings.ESI_PURGE_HEADER: ' '.join(keys)},
+        timeout=settings.ESI_PURGE_TIMEOUT)
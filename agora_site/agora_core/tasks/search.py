@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from haystack import connections
+from haystack.constants import ID
+
+from agora_site.agora_core.models import SearchIndexUpdate
+
+from celery import task
+
+import fcntl
+
+# maximum number of queued objects reindexed with a single commit
+UPDATE_BATCH_SIZE = 1000
+
+
+def write_index_changes(backend, updates, removals):
+    '''
+    Updates the given (index, object) pairs in the search backend and removes
+    the documents with the given identifiers. Whoosh backends get a single
+    commit for all the changes.
+    '''
+    from haystack.backends.whoosh_backend import WhooshSearchBackend
+
+    if not isinstance(backend, WhooshSearchBackend):
+        updated_objects = dict()
+        for index, obj in updates:
+            updated_objects.setdefault(index, []).append(obj)
+        for index, objects in updated_objects.iteritems():
+            backend.update(index, objects)
+        for identifier in removals:
+            backend.remove(identifier)
+        return
+
+    from whoosh.writing import AsyncWriter
+
+    if not backend.setup_complete:
+        backend.setup()
+
+    backend.index = backend.index.refresh()
+    writer = AsyncWriter(backend.index)
+    for index, obj in updates:
+        doc = index.full_prepare(obj)
+        for key in doc:
+            doc[key] = backend._from_python(doc[key])
+        writer.update_document(**doc)
+    for identifier in removals:
+        writer.delete_by_term(ID, identifier)
+    writer.commit()
+
+
+def process_search_index_queue(using='default'):
+    '''
+    Reindexes a batch of the objects queued in SearchIndexUpdate, coalescing
+    repeated entries. Objects which no longer exist, or are no longer
+    indexable, are removed from the index. Returns the number of processed
+    queue entries.
+    '''
+    queue = list(SearchIndexUpdate.objects.order_by('id').values_list('id',
+        'content_type_id', 'object_id')[:UPDATE_BATCH_SIZE])
+    if not queue:
+        return 0
+
+    object_ids = dict()
+    for entry_id, content_type_id, object_id in queue:
+        object_ids.setdefault(content_type_id, set()).add(object_id)
+
+    unified_index = connections[using].get_unified_index()
+    updates, removals = [], []
+    for content_type_id, ids in object_ids.iteritems():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        index = unified_index.get_index(model)
+        objects = index.index_queryset().in_bulk(list(ids))
+        for object_id in ids:
+            obj = objects.get(object_id)
+            if obj is None:
+                removals.append(u'%s.%s.%d' % (model._meta.app_label,
+                    model._meta.module_name, object_id))
+            elif index.should_update(obj):
+                updates.append((index, obj))
+
+    write_index_changes(connections[using].get_backend(), updates, removals)
+    # only the entries read, entries with lower ids might have been
+    # committed after the query
+    SearchIndexUpdate.objects.filter(id__in=[entry[0] for entry in queue])\
+        .delete()
+    return len(queue)
+
+
+@task(ignore_result=True)
+def update_search_index():
+    '''
+    Reindexes the objects saved or deleted since the last run. Executed
+    every few seconds, see CELERYBEAT_SCHEDULE in settings.
+    '''
+    # prevents concurrent runs in different workers from competing for the
+    # index lock. The file lock is released when the file is closed, also if
+    # the worker dies
+    lock = open(settings.SEARCH_INDEX_LOCK_FILE, 'a')
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return
+
+        while process_search_index_queue() == UPDATE_BATCH_SIZE:
+            pass
+    finally:
+        lock.close()
@@ -1,12 +1,14 @@
 
 from agora_site.agora_core.models import CastVote
-from agora_site.misc.utils import rest as rest_api
+from agora_site.misc.utils import (rest as rest_api, rest_cache_key,
+    is_rest_call_cached, rest_batch)
 
 import json
 from urlparse import urlparse, urlunparse
 from django.http import QueryDict
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import pgettext as _, gettext as _g
 from django.template.base import token_kwargs
 from django.contrib.contenttypes.models import ContentType
@@ -38,11 +40,10 @@ def vote_for_election(user, election):
     '''
     Returns the vote of the requested user in the requested election if any
     '''
-    try:
-        return user.cast_votes.get(is_direct=True, is_counted=True,
-            election=election, is_public=True)
-    except Exception:
-        return None
+    vote = election.get_vote_for_voter(user)
+    if vote and vote.is_direct and vote.is_counted and vote.is_public:
+        return vote
+    return None
 
 @register.filter
 def get_chained_first_pretty_answer(vote, election):
@@ -249,12 +250,24 @@ class RestNode(template.Node):
             query_dict = QueryDict(query)
             url = urlunparse((scheme, netloc, path, params, '', fragment))
 
+            # the serialized response of read calls is cached until any of
+            # the data served by the API changes, see bump_rest_cache_version
+            key = None
+            if settings.REST_CACHE_SECONDS and method == "GET" and\
+                    is_rest_call_cached(url):
+                key = rest_cache_key(url, query_dict, data, method, request)
+                content = cache.get(key)
+                if content is not None:
+                    return content
+
             status_code, container = rest_api(url, request=request,
                 query=query_dict, data=data, method=method)
             if status_code >= 300:
                 return ''
-            else:
-                return container[0]
+
+            if key is not None:
+                cache.set(key, container[0], settings.REST_CACHE_SECONDS)
+            return container[0]
         except template.VariableDoesNotExist:
             return ''
 
@@ -275,6 +288,24 @@ def custom_rest(parser, token):
     bits = token.split_contents()[4:]
     return RestNode(req, method, data, *bits)
 
+class RestBatchNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        with rest_batch():
+            return self.nodelist.render(context)
+
+@register.tag
+def restbatch(parser, token):
+    '''
+    The {% rest %} and {% custom_rest %} calls between {% restbatch %} and
+    {% endrestbatch %} share the agoras, elections and users they load
+    '''
+    nodelist = parser.parse(('endrestbatch',))
+    parser.delete_first_token()
+    return RestBatchNode(nodelist)
+
 @register.tag
 def activetab(parser, token):
     bits = token.contents.split()[1:]
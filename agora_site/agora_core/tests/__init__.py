@@ -8,6 +8,7 @@ from misc import MiscTest
 from action import ActionTest
 from search import SearchTest
 from delegateelectioncount import DelegateElectionCountTest
+from delegateagoracount import DelegateAgoraCountTest
 
 
 # FIXME better url treatment
@@ -28,6 +29,7 @@ def suite():
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(ActionTest))
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(SearchTest))
     suite.addTest(unittest.TestLoader().loadTestsFromTestCase(DelegateElectionCountTest))
+    suite.addTest(unittest.TestLoader().loadTestsFromTestCase(DelegateAgoraCountTest))
     return suite
 
 
@@ -9,7 +9,181 @@ from common import (HTTP_OK,
 from common import RootTestCase
 from agora_site.agora_core.tasks.agora import send_request_membership_mails
 from django.contrib.sites.models import Site
+from django.contrib.auth.models import User
+
+from actstream import settings as actstream_settings
+from actstream.models import (Action, ArchivedAction, InboxEntry,
+    object_stream)
+from agora_site.agora_core.models import Agora
+from actstream.tasks import rebuild_inbox, archive_actions
+from actstream.actions import buffer_actions, flush_actions, create_action
+from django.utils import timezone
+from datetime import timedelta
 
 class ActionTest(RootTestCase):
     def test_nothing_at_all(self):
-        pass
\ No newline at end of file
+        pass
+
+    def test_feed_inbox(self):
+        use_feed_inbox = actstream_settings.USE_FEED_INBOX
+        feed_inbox_size = actstream_settings.FEED_INBOX_SIZE
+        actstream_settings.USE_FEED_INBOX = True
+        try:
+            self._test_feed_inbox()
+        finally:
+            actstream_settings.USE_FEED_INBOX = use_feed_inbox
+            actstream_settings.FEED_INBOX_SIZE = feed_inbox_size
+
+    def _test_feed_inbox(self):
+        user1 = User.objects.get(username='user1')
+
+        # user1 joins agora 1, following it
+        self.login('user1', '123')
+        self.post('agora/1/action/', data={'action': "join"},
+            code=HTTP_OK, content_type='application/json')
+
+        # actions on agora 1 are now fanned out into the inbox of user1
+        for username in ['user2', 'user3', 'user4']:
+            self.login(username, '123')
+            self.post('agora/1/action/', data={'action': "join"},
+                code=HTTP_OK, content_type='application/json')
+
+        followed_ids = [a.id for a in Action.objects.followed_actions(user1)]
+        inbox_ids = [a.id for a in Action.objects.user(user1)]
+        self.assertTrue(len(inbox_ids) >= 3)
+        self.assertEqual(inbox_ids, followed_ids[:len(inbox_ids)])
+
+        # rebuilding the inbox from the follows gives the same stream
+        rebuild_inbox(user1)
+        self.assertEqual([a.id for a in Action.objects.user(user1)],
+            followed_ids)
+
+        # the actions saved during a request are fanned out when it ends,
+        # after its transaction commits
+        buffer_actions()
+        action = create_action(User.objects.get(username='user2'),
+            verb='foo', target=Agora.objects.get(pk=1), buffered=False)
+        self.assertFalse(InboxEntry.objects.filter(action=action).exists())
+        flush_actions()
+        self.assertTrue(InboxEntry.objects.filter(user=user1,
+            action=action).exists())
+
+        # inboxes are trimmed to their size, keeping the newest actions
+        actstream_settings.FEED_INBOX_SIZE = 2
+        self.login('user5', '123')
+        self.post('agora/1/action/', data={'action': "join"},
+            code=HTTP_OK, content_type='application/json')
+        followed_ids = [a.id for a in Action.objects.followed_actions(user1)]
+        self.assertEqual(InboxEntry.objects.filter(user=user1).count(), 2)
+        self.assertEqual([a.id for a in Action.objects.user(user1)],
+            followed_ids[:2])
+
+    def test_fetch_generic_relations(self):
+        for username in ['user1', 'user2', 'user3']:
+            self.login(username, '123')
+            self.post('agora/1/action/', data={'action': "join"},
+                code=HTTP_OK, content_type='application/json')
+
+        # generic relations are only fetched for the evaluated slice, with a
+        # query per content type
+        stream = object_stream(Agora.objects.get(pk=1))
+        self.assertTrue(stream.count() > 2)
+        actions = list(stream[:2])
+        self.assertEqual(len(actions), 2)
+
+        def access_relations():
+            for action in actions:
+                for field in ('actor', 'target', 'action_object'):
+                    getattr(action, field)
+                    getattr(action, '%s_content_type' % field)
+        self.assertNumQueries(0, access_relations)
+
+        data = self.getAndParse('action/agora/1/?limit=2')
+        self.assertEqual([obj['id'] for obj in data['objects']],
+            [action.id for action in actions])
+
+    def test_cursor_pagination(self):
+        for username in ['user1', 'user2', 'user3', 'user4']:
+            self.login(username, '123')
+            self.post('agora/1/action/', data={'action': "join"},
+                code=HTTP_OK, content_type='application/json')
+
+        # all the actions at the same time, so that the id breaks the ties
+        Action.objects.update(timestamp=timezone.now())
+        self.login('david', 'david')
+
+        data = self.getAndParse('action/agora/1/?limit=100')
+        all_ids = [obj['id'] for obj in data['objects']]
+        self.assertEqual(data['meta']['total_count'], len(all_ids))
+        self.assertTrue(len(all_ids) > 3)
+
+        data = self.getAndParse('action/agora/1/?limit=2&total_count=false')
+        self.assertFalse('total_count' in data['meta'])
+
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            data = self.getAndParse('action/agora/1/?limit=3&before=%s' % cursor)
+            self.assertTrue(len(data['objects']) <= 3)
+            self.assertFalse('total_count' in data['meta'])
+            ids += [obj['id'] for obj in data['objects']]
+            cursor = data['meta']['next_cursor']
+        self.assertEqual(sorted(ids, reverse=True), ids)
+        self.assertEqual(sorted(ids), sorted(all_ids))
+
+        data = self.getAndParse('action/agora/1/?before=&total_count=true')
+        self.assertEqual(data['meta']['total_count'], len(all_ids))
+
+        self.get('action/agora/1/?before=foo', code=HTTP_BAD_REQUEST)
+
+    def test_archive_actions(self):
+        self.login('user1', '123')
+        self.post('agora/1/action/', data={'action': "join"},
+            code=HTTP_OK, content_type='application/json')
+
+        agora = Agora.objects.get(pk=1)
+        old_ids = set(Action.objects.values_list('id', flat=True))
+        Action.objects.update(timestamp=timezone.now() - timedelta(days=10))
+
+        self.login('user2', '123')
+        self.post('agora/1/action/', data={'action': "join"},
+            code=HTTP_OK, content_type='application/json')
+        new_ids = set(Action.objects.values_list('id', flat=True)) - old_ids
+
+        self.assertEqual(archive_actions(timezone.now() - timedelta(days=5)),
+            len(old_ids))
+        self.assertEqual(set(Action.objects.values_list('id', flat=True)),
+            new_ids)
+        self.assertEqual(set(ArchivedAction.objects.values_list('id',
+            flat=True)), old_ids)
+        self.assertTrue(all([a.id in new_ids for a in object_stream(agora)]))
+
+    def test_buffered_actions(self):
+        buffer_actions_setting = actstream_settings.BUFFER_ACTIONS
+        actstream_settings.BUFFER_ACTIONS = True
+        try:
+            user1 = User.objects.get(username='user1')
+            agora = Agora.objects.get(pk=1)
+            count = Action.objects.count()
+
+            buffer_actions()
+            action = create_action(user1, verb='foo', target=agora)
+            self.assertEqual(action.id, None)
+            action = create_action(user1, verb='bar', target=agora,
+                buffered=False)
+            self.assertEqual(Action.objects.get(id=action.id).verb, 'bar')
+            self.assertEqual(Action.objects.count(), count + 1)
+
+            flush_actions()
+            self.assertEqual(Action.objects.count(), count + 2)
+            self.assertEqual(Action.objects.filter(verb='foo',
+                target_object_id=agora.id).count(), 1)
+
+            # actions of requests are buffered, and recorded at the end
+            self.login('user1', '123')
+            self.post('agora/1/action/', data={'action': "join"},
+                code=HTTP_OK, content_type='application/json')
+            self.assertEqual(Action.objects.filter(verb='joined',
+                actor_object_id=user1.id).count(), 1)
+        finally:
+            actstream_settings.BUFFER_ACTIONS = buffer_actions_setting
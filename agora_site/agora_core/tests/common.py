@@ -1,3 +1,5 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
 from django.utils import simplejson
 
@@ -17,6 +19,11 @@ class RootTestCase(TestCase):
                 'test_agoras.json',
                 'test_elections.json']
 
+    def setUp(self):
+        # the database is rolled back between tests but the cache is not, so
+        # start each test with an empty one
+        cache.clear()
+
     def login(self, user, passw):
         loggedIn = self.client.login(username=user, password=passw)
         self.assertTrue(loggedIn)
@@ -77,6 +84,18 @@ class RootTestCase(TestCase):
 
         return data
 
+    def countQueries(self, func, *args, **kwargs):
+        '''
+        Calls func and returns its result and the number of database queries
+        it ran
+        '''
+        connection.use_debug_cursor = True
+        connection.queries = []
+        try:
+            return func(*args, **kwargs), len(connection.queries)
+        finally:
+            connection.use_debug_cursor = None
+
     def assertDictContains(self, a, b):
         '''
         Assert true when a contains b and both are dicts
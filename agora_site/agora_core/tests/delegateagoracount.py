@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from common import (HTTP_OK,
+                    HTTP_NOT_FOUND)
+
+from common import RootTestCase
+
+
+class DelegateAgoraCountTest(RootTestCase):
+    def test_leaderboard(self):
+        # all users join the agora
+        for username in ['user1', 'user2', 'user3', 'user4']:
+            self.login(username, '123')
+            orig_data = {'action': "join"}
+            self.post('agora/1/action/', data=orig_data,
+                code=HTTP_OK, content_type='application/json')
+
+        def delegate(user, delegate_id):
+            self.login(user, '123')
+            orig_data = dict(action='delegate_vote', user_id=delegate_id)
+            self.postAndParse('agora/1/action/', data=orig_data,
+                code=HTTP_OK, content_type='application/json')
+
+        def cancel_delegation(user):
+            self.login(user, '123')
+            orig_data = dict(action='cancel_vote_delegation')
+            self.postAndParse('agora/1/action/', data=orig_data,
+                code=HTTP_OK, content_type='application/json')
+
+        # user2 --> user1 --> david
+        # user3 --> user1
+        # user4 --> user3
+        delegate('user2', 1)
+        delegate('user3', 1)
+        delegate('user1', 0)
+        delegate('user4', 3)
+        self.check_leaderboard([
+            ('david', 1, 4),
+            ('user1', 2, 3),
+            ('user3', 1, 1),
+        ])
+
+        data = self.getAndParse('agora/1/delegators/1/')
+        self.assertEqual(sorted([user['username'] for user in data['objects']]),
+            ['user2', 'user3'])
+
+        # user3 cancels its delegation
+        cancel_delegation('user3')
+        self.check_leaderboard([
+            ('david', 1, 2),
+            ('user1', 1, 1),
+            ('user3', 1, 1),
+        ])
+
+        # user4 changes its delegation from user3 to user2
+        delegate('user4', 2)
+        self.check_leaderboard([
+            ('david', 1, 3),
+            ('user1', 1, 2),
+            ('user2', 1, 1),
+        ])
+
+        # the leaderboard can be filtered by delegate
+        data = self.getAndParse('agora/1/delegates_leaderboard/?username=user')
+        self.assertEqual([item['delegate']['username'] for item in data['objects']],
+            ['user1', 'user2'])
+
+        # rebuilding the whole index gives the same result
+        from agora_site.agora_core.models import Agora
+        from agora_site.agora_core.models.delegateagoracount import update_delegate_agora_counts
+        update_delegate_agora_counts(Agora.objects.get(pk=1))
+        self.check_leaderboard([
+            ('david', 1, 3),
+            ('user1', 1, 2),
+            ('user2', 1, 1),
+        ])
+
+        data = self.getAndParse('agora/1/delegators/3/')
+        self.assertEqual(data['objects'], [])
+        self.get('agora/1/delegators/1000/', code=HTTP_NOT_FOUND)
+
+        # user1 changes its delegation from david to user4, which closes the
+        # loop user1 --> user4 --> user2 --> user1
+        delegate('user1', 4)
+        data = self.getAndParse('agora/1/delegates_leaderboard/')
+        self.assertEqual(sorted([(item['delegate']['username'], item['count'],
+            item['transitive_count']) for item in data['objects']]), [
+            ('user1', 1, 2),
+            ('user2', 1, 2),
+            ('user4', 1, 2),
+        ])
+
+        # user4 cancels its delegation, which opens the loop
+        cancel_delegation('user4')
+        self.check_leaderboard([
+            ('user4', 1, 2),
+            ('user1', 1, 1),
+        ])
+
+        # the active delegates are read from the index, ranked the same way
+        data = self.getAndParse('agora/1/active_delegates/')
+        self.assertEqual([user['username'] for user in data['objects']],
+            ['user4', 'user1'])
+
+    def check_leaderboard(self, leaderboard):
+        data = self.getAndParse('agora/1/delegates_leaderboard/')
+        self.assertEqual(data['meta']['total_count'], len(leaderboard))
+        self.assertEqual([(item['delegate']['username'], item['count'],
+            item['transitive_count']) for item in data['objects']], leaderboard)
@@ -219,6 +219,19 @@ class DelegateElectionCountTest(RootTestCase):
         data = self.getAndParse('delegateelectioncount/?election__agora=2')
         self.check_delegates_counts(data, {})
 
+        # re-tallying an unchanged election is skipped unless forced, and
+        # does not change the delegate counts
+        from agora_site.agora_core.management.commands.compute_results import (
+            update_election, SKIPPED, TALLIED)
+        self.assertEqual(update_election(election_id, verbosity=0), SKIPPED)
+        self.assertEqual(update_election(election_id, force=True, verbosity=0),
+            TALLIED)
+        data = self.getAndParse('delegateelectioncount/?election=%d' % election_id)
+        self.check_delegates_counts(data, {
+            '2': 2,
+            '1': 1
+        })
+
     def check_delegates_counts(self, query, data):
         self.assertEqual(len(data.keys()), query['meta']['total_count'])
         for item in query['objects']:
@@ -10,9 +10,11 @@ from common import (HTTP_OK,
 
 from common import RootTestCase
 from django.contrib.markup.templatetags.markup import textile
+from django.test.utils import override_settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 import copy
+import os
 
 class ElectionTest(RootTestCase):
     base_election_data = {
@@ -54,6 +56,36 @@ class ElectionTest(RootTestCase):
         elections = data['objects']
         self.assertEqual(len(elections), 3)
 
+    def test_election_list_deferred_fields(self):
+        '''
+        Test that election lists do not load the heavy columns they do not
+        serialize
+        '''
+        from agora_site.agora_core.models import Election, CastVote
+        from agora_site.agora_core.resources.election import (
+            TinyElectionResource, ResultsElectionResource)
+        from agora_site.agora_core.resources.castvote import CastVoteResource
+
+        deferred = TinyElectionResource().get_list_deferred_fields(Election,
+            {'agora': {'creator': {}}})
+        for name in ['description', 'questions', 'result', 'eligibility',
+                'extra_data', 'agora__biography', 'agora__extra_data']:
+            self.assertTrue(name in deferred)
+        self.assertFalse('result' in
+            ResultsElectionResource().get_list_deferred_fields(Election))
+
+        # opted in with list_load_fields
+        deferred = CastVoteResource().get_list_deferred_fields(CastVote,
+            {'election': {}})
+        self.assertFalse('data' in deferred)
+        self.assertTrue('election__questions' in deferred)
+
+        data = self.getAndParse('election/')
+        self.assertEqual(len(data['objects']), 3)
+        data = self.getAndParse('agora/1/all_elections/')
+        self.assertTrue(len(data['objects']) > 0)
+        self.assertTrue('description' not in data['objects'][0])
+
     def test_election_find(self):
         # find
         data = self.getAndParse('election/3/')
@@ -370,6 +402,71 @@ class ElectionTest(RootTestCase):
         self.assertTrue('end_election' not in data["permissions"])
         self.assertTrue('emit_direct_vote' not in data["permissions"])
 
+    def test_result_artifacts(self):
+        import shutil
+        import tempfile
+        from agora_site.agora_core.models import Election
+
+        artifacts_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, artifacts_path)
+
+        with self.settings(RESULT_ARTIFACTS_PATH=artifacts_path):
+            # create and start election as admin
+            self.login('david', 'david')
+            data = self.postAndParse('agora/1/action/',
+                data=self.base_election_data, code=HTTP_OK,
+                content_type='application/json')
+            election_id = data['id']
+            orig_data = dict(action='start')
+            data = self.post('election/%d/action/' % election_id,
+                data=orig_data, code=HTTP_OK, content_type='application/json')
+
+            # no results until the election is tallied
+            self.get('election/%d/results/' % election_id,
+                code=HTTP_NOT_FOUND)
+
+            vote_data = {
+                'is_vote_secret': False,
+                'question0': "bar",
+                'action': 'vote',
+                'reason': "becuase of .. yes"
+            }
+            data = self.post('election/%d/action/' % election_id,
+                data=vote_data, code=HTTP_OK, content_type='application/json')
+            orig_data = dict(action='stop')
+            data = self.post('election/%d/action/' % election_id,
+                data=orig_data, code=HTTP_OK, content_type='application/json')
+
+            # the results were rendered at tally time
+            election = Election.objects.get(id=election_id)
+            path = election.result_artifact_path('results')
+            self.assertTrue(path.startswith(artifacts_path))
+            self.assertTrue(os.path.exists(path))
+
+            data = self.getAndParse('election/%d/results/' % election_id)
+            self.assertEqual(data['election_id'], election_id)
+            self.assertEqual(data['result']['total_votes'], 1)
+            self.assertEqual(data['participation']['total_votes'], 1)
+
+            data = self.getAndParse('election/%d/extra_data/' % election_id)
+            self.assertTrue(data['ended'])
+            self.assertTrue('tally_log' in data)
+
+            # artifacts of another tally are not served
+            Election.objects.filter(id=election_id).update(
+                result_tallied_at_date=timezone.now())
+            self.assertEqual(Election.objects.get(id=election_id)\
+                .get_result_artifact('results'), None)
+            data = self.getAndParse('election/%d/results/' % election_id)
+            self.assertEqual(data['result']['total_votes'], 1)
+
+            # clients that accept gzip get the stored file as is
+            response = self.client.get(
+                '/api/v1/election/%d/results/' % election_id,
+                HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response.content, open(path, 'rb').read())
+
     def test_tally_election(self):
         # create election as admin
         self.login('david', 'david')
@@ -1139,6 +1236,268 @@ class ElectionTest(RootTestCase):
         data = self.post('election/%d/action/' % election_id, data=orig_data,
             code=HTTP_FORBIDDEN, content_type='application/json')
 
+    @override_settings(VOTE_CACHE_SECONDS=600)
+    def test_vote_for_voter_cache(self):
+        from django.contrib.auth.models import User
+        from agora_site.agora_core.models import Election
+
+        # create and start election as admin
+        self.login('david', 'david')
+        data = self.postAndParse('agora/1/action/', data=self.base_election_data,
+            code=HTTP_OK, content_type='application/json')
+        election_id = data['id']
+        orig_data = dict(action='start')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        # user1 joins the agora, it has no vote yet
+        self.login('user1', '123')
+        orig_data = dict(action='join')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        user1 = User.objects.get(username='user1')
+        get_vote = lambda: Election.objects.get(
+            pk=election_id).get_vote_for_voter(user1)
+        self.assertEqual(get_vote(), None)
+
+        # user1 delegates into david, the vote is now the delegation
+        orig_data = dict(action='delegate_vote', user_id=0)
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        vote = get_vote()
+        self.assertFalse(vote.is_direct)
+
+        # user1 votes directly
+        vote_data = {
+            'is_vote_secret': False,
+            'question0': "bar",
+            'action': 'vote',
+            'reason': "becuase of .. yes"
+        }
+        data = self.postAndParse('election/%d/action/' % election_id,
+            data=vote_data, code=HTTP_OK, content_type='application/json')
+        vote = get_vote()
+        self.assertEqual(vote.id, data['id'])
+        self.assertTrue(vote.is_direct)
+
+        # cancelling the direct vote brings back the delegation
+        orig_data = dict(action='cancel_vote')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        vote = get_vote()
+        self.assertFalse(vote.is_direct)
+
+    @override_settings(VOTE_CACHE_SECONDS=600)
+    def test_vote_counts_cache(self):
+        # create and start election as admin
+        self.login('david', 'david')
+        data = self.postAndParse('agora/1/action/', data=self.base_election_data,
+            code=HTTP_OK, content_type='application/json')
+        election_id = data['id']
+        orig_data = dict(action='start')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        data = self.getAndParse('election/%d/' % election_id)
+        self.assertEqual(data['direct_votes_count'], 0)
+        self.assertEqual(data['percentage_of_participation'], 0)
+
+        # user1 joins the agora and votes, the counts are updated
+        self.login('user1', '123')
+        orig_data = dict(action='join')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        vote_data = {
+            'is_vote_secret': False,
+            'question0': "bar",
+            'action': 'vote',
+            'reason': "becuase of .. yes"
+        }
+        data = self.postAndParse('election/%d/action/' % election_id,
+            data=vote_data, code=HTTP_OK, content_type='application/json')
+        data = self.getAndParse('election/%d/' % election_id)
+        self.assertEqual(data['direct_votes_count'], 1)
+        self.assertEqual(data['percentage_of_participation'], 50)
+        self.assertTrue('emit_direct_vote' in data['user_perms'])
+
+        # leaving the agora changes the percentage of participation
+        orig_data = dict(action='leave')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        data = self.getAndParse('election/%d/' % election_id)
+        self.assertEqual(data['percentage_of_participation'], 100)
+
+    def test_delegation_chains(self):
+        # create and start election as admin
+        self.login('david', 'david')
+        data = self.postAndParse('agora/1/action/', data=self.base_election_data,
+            code=HTTP_OK, content_type='application/json')
+        election_id = data['id']
+        orig_data = dict(action='start')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        # david votes publicly
+        vote_data = {
+            'is_vote_secret': False,
+            'question0': "bar",
+            'action': 'vote',
+            'reason': "becuase of .. yes"
+        }
+        data = self.postAndParse('election/%d/action/' % election_id,
+            data=vote_data, code=HTTP_OK, content_type='application/json')
+        vote_id = data['id']
+
+        def delegate(username, delegate_id):
+            self.login(username, '123')
+            orig_data = dict(action='join')
+            data = self.post('agora/1/action/', data=orig_data,
+                code=HTTP_OK, content_type='application/json')
+            orig_data = dict(action='delegate_vote', user_id=delegate_id)
+            data = self.post('agora/1/action/', data=orig_data,
+                code=HTTP_OK, content_type='application/json')
+
+        # user2 --> user1 --> david, and a loop user4 --> user5 --> user4
+        delegate('user1', 0)
+        delegate('user2', 1)
+        delegate('user4', 5)
+        delegate('user5', 4)
+
+        # user6 votes secretly
+        self.login('user6', '123')
+        orig_data = dict(action='join')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        vote_data['is_vote_secret'] = True
+        data = self.postAndParse('election/%d/action/' % election_id,
+            data=vote_data, code=HTTP_OK, content_type='application/json')
+
+        self.login('user1', '123')
+        data = self.getAndParse('election/%d/delegation_chains/?voters=2,0,4,3,6'
+            % election_id)
+        chains = data['objects']
+        self.assertEqual([chain['voter_id'] for chain in chains], [2, 0, 4, 3, 6])
+
+        self.assertEqual(chains[0]['is_direct'], False)
+        self.assertEqual([d['username'] for d in chains[0]['delegates']],
+            ['user1', 'david'])
+        self.assertEqual(chains[0]['vote_id'], vote_id)
+        self.assertEqual(chains[0]['answers'], [['bar']])
+        self.assertEqual(chains[0]['is_broken'], False)
+
+        self.assertEqual(chains[1]['is_direct'], True)
+        self.assertEqual(chains[1]['delegates'], [])
+        self.assertEqual(chains[1]['vote_id'], vote_id)
+
+        self.assertEqual([d['username'] for d in chains[2]['delegates']],
+            ['user5'])
+        self.assertEqual(chains[2]['vote_id'], None)
+        self.assertEqual(chains[2]['is_broken'], True)
+
+        self.assertEqual(chains[3]['is_direct'], None)
+        self.assertEqual(chains[3]['is_broken'], True)
+
+        # the secret vote of user6 is only shown to user6
+        self.assertEqual(chains[4], dict(voter_id=6, username='user6',
+            is_public=False))
+
+        # the answer shown for the delegated vote of user2 is the one of
+        # david, and the graph is loaded only once per election
+        from django.contrib.auth.models import User
+        from agora_site.agora_core.models import Election
+        from agora_site.agora_core.templatetags.agora_utils import\
+            get_chained_first_pretty_answer
+        election = Election.objects.get(pk=election_id)
+        votes = [election.get_vote_for_voter(User.objects.get(username=username))
+            for username in ('user2', 'user1')]
+        get_answers = lambda: [get_chained_first_pretty_answer(vote, election)
+            for vote in votes]
+        answers = get_answers()
+        self.assertEqual(self.countQueries(get_answers), (answers, 0))
+        self.assertEqual([answer['answer'] for answer in answers],
+            ['bar', 'bar'])
+        self.assertEqual(answers[0]['reason'], "becuase of .. yes")
+        self.login('user6', '123')
+        data = self.getAndParse('election/%d/delegation_chains/?voters=6'
+            % election_id)
+        self.assertEqual(data['objects'][0]['is_direct'], True)
+
+        # if david cancels his vote, the chain of user2 breaks
+        self.login('david', 'david')
+        orig_data = dict(action='cancel_vote')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        data = self.getAndParse('election/%d/delegation_chains/?voters=2'
+            % election_id)
+        self.assertEqual(data['objects'][0]['vote_id'], None)
+        self.assertEqual(data['objects'][0]['is_broken'], True)
+
+        # invalid voter ids
+        self.get('election/%d/delegation_chains/?voters=a,2' % election_id,
+            code=HTTP_BAD_REQUEST)
+
+    def test_voters_snapshot(self):
+        from agora_site.agora_core.models import Election
+        from agora_site.agora_core.management.commands.compute_results import (
+            update_election, TALLIED)
+
+        # create and start election as admin
+        self.login('david', 'david')
+        data = self.postAndParse('agora/1/action/', data=self.base_election_data,
+            code=HTTP_OK, content_type='application/json')
+        election_id = data['id']
+        orig_data = dict(action='start')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        # electorate is snapshotted when voting starts
+        election = Election.objects.get(pk=election_id)
+        self.assertTrue(election.voters_frozen_at_date is not None)
+        self.assertEqual(election.electorate.count(), 1)
+
+        # david votes, user1 joins and delegates into david
+        vote_data = {
+            'is_vote_secret': False,
+            'question0': "bar",
+            'action': 'vote'
+        }
+        data = self.postAndParse('election/%d/action/' % election_id,
+            data=vote_data, code=HTTP_OK, content_type='application/json')
+        self.login('user1', '123')
+        orig_data = dict(action='join')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        orig_data = dict(action='delegate_vote', user_id=0)
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        # and again when it ends
+        self.login('david', 'david')
+        orig_data = dict(action='stop')
+        data = self.post('election/%d/action/' % election_id, data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        election = Election.objects.get(pk=election_id)
+        self.assertEqual(election.electorate.count(), 2)
+        self.assertEqual(election.delegated_votes.count(), 1)
+        self.assertEqual(election.result['electorate_count'], 2)
+        self.assertEqual(election.result['total_delegated_votes'], 1)
+
+        # changes in the agora after the election do not affect re-tallies
+        self.login('user1', '123')
+        orig_data = dict(action='cancel_vote_delegation')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+        self.login('user2', '123')
+        orig_data = dict(action='join')
+        data = self.post('agora/1/action/', data=orig_data,
+            code=HTTP_OK, content_type='application/json')
+
+        self.assertEqual(update_election(election_id, force=True, verbosity=0),
+            TALLIED)
+        election = Election.objects.get(pk=election_id)
+        self.assertEqual(election.result['electorate_count'], 2)
+        self.assertEqual(election.result['total_delegated_votes'], 1)
+
     def test_meek_stv(self):
         election_data = {
             'action': "create_election",
@@ -1328,6 +1687,12 @@ class ElectionTest(RootTestCase):
         data = self.getAndParse('election/%d/extra_data/' % election_id)
         self.assertEqual(tally_log_should_be, data['tally_log'])
 
+        # the log is stored apart from the extra data of the election
+        from agora_site.agora_core.models import Election
+        election = Election.objects.get(pk=election_id)
+        self.assertTrue('tally_log' not in election.extra_data)
+        self.assertEqual(tally_log_should_be, election.get_tally_log())
+
     def test_broken_loop_delegation(self):
         '''
         tests that when A delegates in B and B in A, this doesn't brick the
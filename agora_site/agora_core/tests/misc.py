@@ -6,7 +6,16 @@ from common import (HTTP_OK,
                     HTTP_FORBIDDEN,
                     HTTP_NOT_FOUND)
 
-from common import RootTestCase
+from common import RootTestCase, API_ROOT
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import Http404
+from django.test.utils import override_settings
+from django.template import Context, Template
+from django.utils import simplejson
+from agora_site.agora_core.models import (Agora, Election,
+    get_agora_or_404, get_election_or_404, get_user_or_404)
+from agora_site.misc.utils import (JSONText, identity_map,
+    get_cached_object, defer_edge_purges, purge_edge_keys, _edge_purges)
 
 
 class MiscTest(RootTestCase):
@@ -17,3 +26,217 @@ class MiscTest(RootTestCase):
         self.login('david', 'david')
         data = self.getAndParse('user/settings/')
         self.assertEqual(data['username'], 'david')
+
+    @override_settings(REST_CACHE_SECONDS=3600)
+    def test_rest_tag_cache(self):
+        """
+        Test that the responses of the rest template tag are cached until the
+        data they serialize changes
+        """
+        class FakeRequest(object):
+            user = AnonymousUser()
+
+        template = Template("{% load agora_utils %}"
+            "{% rest request '/agora/' agora_id '/' %}")
+        context = Context(dict(request=FakeRequest(), agora_id=1))
+
+        def render():
+            data, num_queries = self.countQueries(template.render, context)
+            return simplejson.loads(data)['pretty_name'], num_queries
+
+        pretty_name, num_queries = render()
+        self.assertEqual(pretty_name, 'AgoraOne')
+        self.assertTrue(num_queries > 0)
+        self.assertEqual(render(), ('AgoraOne', 0))
+
+        # the agora embeds its creator, whose changes invalidate it too
+        creator = User.objects.get(username='david')
+        creator.first_name = 'Dave'
+        creator.save()
+        self.assertTrue(render()[1] > 0)
+
+        agora = Agora.objects.get(pk=1)
+        agora.pretty_name = 'AgoraUno'
+        agora.save()
+        self.assertEqual(render()[0], 'AgoraUno')
+
+    def test_batch(self):
+        """
+        Test that several API calls can be run with a single batch request,
+        loading the objects they share only once
+        """
+        data, num_queries1 = self.countQueries(self.getAndParse,
+            'batch/?members=/agora/1/members/')
+        self.assertEqual(data.keys(), ['members'])
+        self.assertEqual(data['members']['meta']['total_count'], 1)
+
+        data, num_queries2 = self.countQueries(self.getAndParse,
+            'batch/?members=/agora/1/members/&admins=/agora/1/admins/'
+            '&missing=/agora/1000/members/')
+        self.assertEqual(data['admins']['meta']['total_count'], 1)
+        self.assertEqual(data['missing'], None)
+        # the agora is loaded once
+        self.assertTrue(num_queries2 < 2 * num_queries1 + 1)
+
+        self.get('batch/', code=HTTP_BAD_REQUEST)
+        self.get('batch/?agora=agora/1/', code=HTTP_BAD_REQUEST)
+
+        # the calls are run as the user authenticated with its api key
+        from tastypie.models import ApiKey
+        api_key, created = ApiKey.objects.get_or_create(
+            user=User.objects.get(username='david'))
+        data = self.getAndParse('batch/?settings=/user/settings/')
+        self.assertEqual(data['settings']['id'], -1)
+        data = self.getAndParse('batch/?settings=/user/settings/'
+            '&username=david&api_key=%s&format=json' % api_key.key)
+        self.assertEqual(data.keys(), ['settings'])
+        self.assertEqual(data['settings']['username'], 'david')
+
+    def test_esi_fragment_headers(self):
+        """
+        Test that API fragments tell the edge cache whether they are public
+        or per-user
+        """
+        with self.settings(USE_ESI=True):
+            self.login('david', 'david')
+
+            response = self.client.get(API_ROOT + 'agora/1/')
+            self.assertTrue('public' in response['Cache-Control'])
+            self.assertEqual(response['Surrogate-Key'], 'agora-1')
+            self.assertFalse('Cookie' in response.get('Vary', ''))
+
+            response = self.client.get(API_ROOT + 'election/3/extra_data/')
+            self.assertTrue('public' in response['Cache-Control'])
+            self.assertEqual(response['Surrogate-Key'], 'election-3')
+
+            response = self.client.get(API_ROOT + 'election/3/')
+            self.assertTrue('private' in response['Cache-Control'])
+            self.assertTrue('Cookie' in response['Vary'])
+
+            response = self.client.get('/david/agoraone')
+            self.assertTrue('<esi:include' in response.content)
+            self.assertEqual(response['Surrogate-Control'], 'content="ESI/1.0"')
+
+    def test_deferred_edge_purges(self):
+        """
+        Test that the edge cache purges done during a request are collected
+        to be sent once, after the request transaction commits
+        """
+        defer_edge_purges()
+        try:
+            purge_edge_keys(['agora-1'])
+            purge_edge_keys(['election-3', 'agora-1'])
+            self.assertEqual(_edge_purges.keys, set(['agora-1', 'election-3']))
+        finally:
+            _edge_purges.keys = None
+
+    @override_settings(OBJECT_CACHE_SECONDS=600)
+    def test_object_cache(self):
+        """
+        Test that agoras and elections looked up by name come from the object
+        cache until they are saved or deleted
+        """
+        election, num_queries = self.countQueries(get_election_or_404, 'david',
+            'agoraone', 'electionone')
+        self.assertEqual(election.id, 3)
+        self.assertTrue(num_queries > 0)
+
+        election, num_queries = self.countQueries(get_election_or_404, 'david',
+            'agoraone', 'electionone')
+        self.assertEqual(num_queries, 0)
+        # relations come attached
+        agora, num_queries = self.countQueries(lambda: election.agora)
+        self.assertEqual(num_queries, 0)
+        creator, num_queries = self.countQueries(lambda: agora.creator)
+        self.assertEqual((creator.username, num_queries), ('david', 0))
+
+        agora, num_queries = self.countQueries(get_agora_or_404, 'david',
+            'agoraone')
+        self.assertTrue(num_queries > 0)
+        agora, num_queries = self.countQueries(get_agora_or_404, 'david',
+            'agoraone')
+        self.assertEqual((agora.id, num_queries), (1, 0))
+
+        agora = Agora.objects.get(pk=1)
+        agora.pretty_name = 'AgoraUno'
+        agora.save()
+        election, num_queries = self.countQueries(get_election_or_404, 'david',
+            'agoraone', 'electionone')
+        self.assertEqual(election.agora.pretty_name, 'AgoraUno')
+        self.assertTrue(num_queries > 0)
+
+        # renamed objects are not found by their old name
+        election.name = 'electionuno'
+        election.save()
+        self.assertRaises(Http404, get_election_or_404, 'david', 'agoraone',
+            'electionone')
+        self.assertEqual(get_election_or_404('david', 'agoraone',
+            'electionuno').id, 3)
+
+        user, num_queries = self.countQueries(get_user_or_404, 'david')
+        user, num_queries = self.countQueries(get_user_or_404, 'david')
+        self.assertEqual((user.username, num_queries), ('david', 0))
+        self.assertRaises(Http404, get_user_or_404, 'nobody')
+
+    def test_json_field(self):
+        '''
+        Test that JSONField values are parsed on first access, and saved with
+        their original text when they were not accessed
+        '''
+        election = Election.objects.get(pk=3)
+        raw_questions = election.__dict__['questions']
+        self.assertTrue(isinstance(raw_questions, JSONText))
+
+        questions = election.questions
+        self.assertTrue(isinstance(questions, list))
+        self.assertTrue(election.questions is questions)
+
+        election = Election.objects.get(pk=3)
+        election.pretty_name = 'Election Uno'
+        election.save()
+        self.assertTrue(isinstance(election.__dict__['questions'], JSONText))
+        self.assertEqual(Election.objects.filter(pk=3).values_list('questions',
+            flat=True)[0], raw_questions.text)
+
+        election.extra_data = {'foo': 'bar'}
+        election.save()
+        self.assertEqual(Election.objects.get(pk=3).extra_data, {'foo': 'bar'})
+
+        election.extra_data = ' '
+        self.assertEqual(election.extra_data, None)
+
+    def test_identity_map(self):
+        '''
+        Test that within an identity map the same user, profile, agora or
+        election is loaded only once
+        '''
+        with identity_map():
+            election = Election.objects.get(pk=3)
+            self.assertNumQueries(0, Election.objects.get, pk=3)
+            self.assertTrue(Election.objects.get(id=3) is election)
+
+            agora = election.agora
+            self.assertTrue(Agora.objects.get(pk=agora.id) is agora)
+            self.assertTrue(get_cached_object(Agora, id=agora.id) is agora)
+
+            user = agora.creator
+            profile = user.get_profile()
+            # other instances of the same user get the loaded profile
+            other = User.objects.get(username=user.username)
+            self.assertNumQueries(0, other.get_profile)
+            self.assertTrue(other.get_profile() is profile)
+
+            # filtered lookups are not resolved by the identity map
+            self.assertRaises(Election.DoesNotExist, Election.objects.filter(
+                agora__id=agora.id + 1000).get, pk=3)
+
+            # saved instances are loaded again
+            election.save()
+            self.assertFalse(Election.objects.get(pk=3) is election)
+
+            # instances just built are not mapped
+            Agora(id=2)
+            self.assertEqual(Agora.objects.get(pk=2).name,
+                Agora.objects.filter(pk=2).values_list('name', flat=True)[0])
+
+        self.assertFalse(Election.objects.get(pk=3) is election)
@@ -8,13 +8,23 @@ from common import (HTTP_OK,
                     HTTP_METHOD_NOT_ALLOWED)
 
 from common import RootTestCase
+from django.conf import settings
 from django.core import management
+from django.utils import timezone
+from haystack import connections
+from agora_site.agora_core.models import (Agora, SearchIndexUpdate,
+    SearchIndexRun)
+from agora_site.agora_core.tasks.search import update_search_index
+from agora_site.agora_core.resources.search import AUTOCOMPLETE_CACHE
+
+import fcntl
 
 
 class SearchTest(RootTestCase):
 
     def setUp(self):
         management.call_command('rebuild_index', verbosity=0, interactive=False)
+        AUTOCOMPLETE_CACHE.clear()
 
     def test_search(self):
         # all
@@ -30,3 +40,110 @@ class SearchTest(RootTestCase):
 
         data = self.getAndParse('search/?model=agora&q=agoraone')
         self.assertEquals(data['meta']['total_count'], 1)
+
+    def test_search_queries(self):
+        def count_queries(url):
+            data, num_queries = self.countQueries(self.getAndParse, url)
+            return len(data['objects']), num_queries
+
+        # the number of queries does not depend on the number of results
+        self.login('david', 'david')
+        count_queries('search/?limit=1')
+        num_results1, num_queries1 = count_queries('search/?limit=1')
+        num_results2, num_queries2 = count_queries('search/?limit=15')
+        self.assertEquals((num_results1, num_results2), (1, 15))
+        self.assertEquals(num_queries1 + 2, num_queries2)
+
+    def test_search_index_queue(self):
+        # saved objects are queued, not reindexed right away
+        queued = SearchIndexUpdate.objects.count()
+        agora = Agora.objects.get(pk=1)
+        agora.pretty_name = 'quuxfoo'
+        agora.save()
+        agora.short_description = 'quuxbar'
+        agora.save()
+        self.assertEquals(SearchIndexUpdate.objects.count(), queued + 2)
+        data = self.getAndParse('search/?q=quuxfoo')
+        self.assertEquals(data['meta']['total_count'], 0)
+
+        # runs are skipped while another worker holds the lock
+        lock = open(settings.SEARCH_INDEX_LOCK_FILE, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        update_search_index()
+        lock.close()
+        self.assertEquals(SearchIndexUpdate.objects.count(), queued + 2)
+
+        # the queue is processed by a periodic task
+        update_search_index()
+        self.assertEquals(SearchIndexUpdate.objects.count(), 0)
+        data = self.getAndParse('search/?q=quuxfoo')
+        self.assertEquals(data['meta']['total_count'], 1)
+        data = self.getAndParse('search/?q=quuxbar')
+        self.assertEquals(data['meta']['total_count'], 1)
+
+        # deleted objects are removed from the index
+        Agora.objects.get(pk=2).delete()
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 2)
+        update_search_index()
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 1)
+
+    def test_searcher_reuse(self):
+        backend = connections['default'].get_backend()
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 2)
+
+        # the searcher and the model filter are reused between searches
+        searcher = backend.get_searcher()
+        filters = backend._searchers.filters
+        self.assertTrue(filters)
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 2)
+        self.assertTrue(backend.get_searcher() is searcher)
+        self.assertTrue(backend._searchers.filters is filters)
+
+        # and refreshed when the index changes
+        Agora.objects.get(pk=2).delete()
+        update_search_index()
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 1)
+        self.assertFalse(backend.get_searcher() is searcher)
+
+    def test_incremental_update_index(self):
+        # the first incremental run is a full one
+        management.call_command('update_index', verbosity=0, incremental=True)
+        self.assertEquals(SearchIndexRun.objects.count(), 3)
+
+        # updates without signals are found by their updated field
+        Agora.objects.filter(pk=1).update(pretty_name='quuxfoo',
+            created_at_date=timezone.now())
+        # journaled changes are picked up without waiting for the queue task
+        agora = Agora.objects.get(pk=2)
+        agora.pretty_name = 'quuxbar'
+        agora.save()
+        management.call_command('update_index', verbosity=0, incremental=True)
+        data = self.getAndParse('search/?q=quuxfoo')
+        self.assertEquals(data['meta']['total_count'], 1)
+        data = self.getAndParse('search/?q=quuxbar')
+        self.assertEquals(data['meta']['total_count'], 1)
+
+        # journaled deletions are removed from the index
+        Agora.objects.get(pk=2).delete()
+        management.call_command('update_index', verbosity=0, incremental=True)
+        data = self.getAndParse('search/?model=agora')
+        self.assertEquals(data['meta']['total_count'], 1)
+
+    def test_autocomplete(self):
+        data = self.getAndParse('search/autocomplete/?q=agorao')
+        self.assertEquals(len(data['objects']), 1)
+
+        data = self.getAndParse('search/autocomplete/?q=agora&model=agora')
+        self.assertEquals(len(data['objects']), 2)
+
+        data = self.getAndParse('search/autocomplete/?q=dav&model=user')
+        self.assertEquals(len(data['objects']), 1)
+
+        # too short
+        data = self.getAndParse('search/autocomplete/?q=d&model=user')
+        self.assertEquals(len(data['objects']), 0)
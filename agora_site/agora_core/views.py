@@ -36,8 +36,8 @@ from django.views.i18n import set_language as django_set_language
 from django import http
 from django.db import transaction
 
-from actstream.actions import follow, unfollow, is_following
-from actstream.models import (object_stream, election_stream, Action,
+from actstream.actions import follow, unfollow, is_following, create_action
+from actstream.models import (object_stream, election_stream,
     user_stream, actor_stream)
 from actstream.signals import action
 
@@ -49,7 +49,8 @@ from haystack.query import SearchQuerySet
 from haystack.views import SearchView as HaystackSearchView
 
 from agora_site.agora_core.templatetags.agora_utils import get_delegate_in_agora
-from agora_site.agora_core.models import Agora, Election, Profile, CastVote
+from agora_site.agora_core.models import (Agora, Election, Profile, CastVote,
+    get_agora_or_404, get_election_or_404, get_user_or_404)
 
 from agora_site.agora_core.backends.fnmt import fnmt_data_from_pem
 from agora_site.agora_core.forms import *
@@ -138,8 +139,7 @@ class AgoraView(TemplateView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
 
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_agora_or_404(username, agoraname)
         return super(AgoraView, self).dispatch(*args, **kwargs)
 
 class AgoraBiographyView(TemplateView):
@@ -150,8 +150,7 @@ class AgoraBiographyView(TemplateView):
 
     def get_context_data(self, username, agoraname, **kwargs):
         context = super(AgoraBiographyView, self).get_context_data(**kwargs)
-        context['agora'] = agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        context['agora'] = agora = get_agora_or_404(username, agoraname)
         return context
 
 
@@ -168,8 +167,7 @@ class AgoraElectionsView(TemplateView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
 
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_agora_or_404(username, agoraname)
 
         context['agora'] = self.agora
         context['filter'] = self.kwargs["election_filter"]
@@ -189,8 +187,7 @@ class AgoraMembersView(TemplateView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
 
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_agora_or_404(username, agoraname)
         context['agora'] = self.agora
         context['filter'] = self.kwargs["members_filter"]
 
@@ -212,9 +209,7 @@ class ElectionDelegatesView(TemplateView):
         username = kwargs["username"]
         agoraname = kwargs["agoraname"]
         electionname = kwargs["electionname"]
-        self.election = get_object_or_404(Election,
-            name=electionname, agora__name=agoraname,
-            agora__creator__username=username)
+        self.election = get_election_or_404(username, agoraname, electionname)
 
         context['election'] = self.election
         context['vote_form'] = VoteForm(self.request, self.election)
@@ -233,9 +228,7 @@ class  ElectionVotesView(ElectionDelegatesView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
         electionname = self.kwargs["electionname"]
-        self.election = get_object_or_404(Election,
-            name=electionname, agora__name=agoraname,
-            agora__creator__username=username)
+        self.election = get_election_or_404(username, agoraname, electionname)
         return self.election.get_all_votes().all()
 
 class CreateAgoraView(RequestCreateView):
@@ -293,8 +286,8 @@ class CreateElectionView(RequestCreateView):
         form_kwargs = super(CreateElectionView, self).get_form_kwargs()
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
-        form_kwargs["agora"] = self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        form_kwargs["agora"] = self.agora = get_object_or_404(Agora,
+            name=agoraname, creator__username=username)
         return form_kwargs
 
     def get_success_url(self):
@@ -327,8 +320,7 @@ class CreateElectionView(RequestCreateView):
 
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
-        context['agora'] = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        context['agora'] = get_agora_or_404(username, agoraname)
         return context
 
     @method_decorator(login_required)
@@ -351,8 +343,7 @@ class AgoraView(TemplateView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
 
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_agora_or_404(username, agoraname)
         return super(AgoraView, self).dispatch(*args, **kwargs)
 
 class ElectionView(TemplateView):
@@ -378,9 +369,7 @@ class ElectionView(TemplateView):
         username = kwargs['username']
         agoraname = kwargs['agoraname']
         electionname = kwargs['electionname']
-        self.election = get_object_or_404(Election,
-            name=electionname, agora__name=agoraname,
-            agora__creator__username=username)
+        self.election = get_election_or_404(username, agoraname, electionname)
         return super(ElectionView, self).dispatch(*args, **kwargs)
 
 
@@ -410,9 +399,7 @@ class VotingBoothView(TemplateView):
         username = kwargs['username']
         agoraname = kwargs['agoraname']
         electionname = kwargs['electionname']
-        self.election = get_object_or_404(Election,
-            name=electionname, agora__name=agoraname,
-            agora__creator__username=username)
+        self.election = get_election_or_404(username, agoraname, electionname)
         return super(VotingBoothView, self).dispatch(*args, **kwargs)
 
 class EditElectionView(UpdateView):
@@ -483,8 +470,9 @@ class EditElectionView(UpdateView):
         username = kwargs['username']
         agoraname = kwargs['agoraname']
         electionname = kwargs['electionname']
-        self.election = get_object_or_404(Election, name=electionname,
-            agora__name=agoraname, agora__creator__username=username)
+        self.election = get_object_or_404(Election,
+            name=electionname, agora__name=agoraname,
+            agora__creator__username=username)
 
         return super(EditElectionView, self).dispatch(*args, **kwargs)
 
@@ -746,8 +734,9 @@ class VoteView(CreateView):
         username = kwargs["username"]
         agoraname = kwargs["agoraname"]
         electionname = kwargs["electionname"]
-        self.election = get_object_or_404(Election, name=electionname,
-            agora__name=agoraname, agora__creator__username=username)
+        self.election = get_object_or_404(Election,
+            name=electionname, agora__name=agoraname,
+            agora__creator__username=username)
 
         # check if ballot is open
         if not self.election.ballot_is_open():
@@ -817,13 +806,10 @@ class AgoraActionChooseDelegateView(FormActionView):
         vote.save()
 
         # Create the delegation action
-        action.send(self.request.user, verb='delegated', action_object=vote,
-            target=agora, ipaddr=request.META.get('REMOTE_ADDR'),
-            geolocation=json.dumps(geolocate_ip(request.META.get('REMOTE_ADDR'))))
-
-        vote.action_id = Action.objects.filter(actor_object_id=self.request.user.id,
-            verb='delegated', action_object_object_id=vote.id,
-            target_object_id=agora.id).order_by('-timestamp').all()[0].id
+        vote.action_id = create_action(self.request.user, verb='delegated',
+            action_object=vote, target=agora, buffered=False,
+            ipaddr=request.META.get('REMOTE_ADDR'),
+            geolocation=json.dumps(geolocate_ip(request.META.get('REMOTE_ADDR')))).id
 
 
         # Send the email to the voter (and maybe to the delegate too!)
@@ -1678,9 +1664,7 @@ class  ElectionVotesGraphView(ElectionDelegatesView):
         username = self.kwargs["username"]
         agoraname = self.kwargs["agoraname"]
         electionname = self.kwargs["electionname"]
-        self.election = get_object_or_404(Election,
-            name=electionname, agora__name=agoraname,
-            agora__creator__username=username)
+        self.election = get_election_or_404(username, agoraname, electionname)
         return self.election.get_all_votes().all()
 
 class ElectionPostCommentView(RequestCreateView):
@@ -1811,8 +1795,8 @@ class AgoraPostCommentView(RequestCreateView):
 
         username = kwargs['username']
         agoraname = kwargs['agoraname']
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_object_or_404(Agora,
+            name=agoraname, creator__username=username)
         return super(AgoraPostCommentView, self).dispatch(*args, **kwargs)
 
 class CancelVoteView(FormActionView):
@@ -1893,7 +1877,7 @@ class UserView(TemplateView):
         self.kwargs = kwargs
 
         username = kwargs['username']
-        self.user_shown = get_object_or_404(User, username=username)
+        self.user_shown = get_user_or_404(username)
         return super(UserView, self).dispatch(*args, **kwargs)
 
 class UserBiographyView(UserView):
@@ -1908,7 +1892,7 @@ class UserBiographyView(UserView):
         self.kwargs = kwargs
 
         username = kwargs['username']
-        self.user_shown = get_object_or_404(User, username=username)
+        self.user_shown = get_user_or_404(username)
         return super(UserView, self).dispatch(*args, **kwargs)
 
 class UserSettingsView(UpdateView):
@@ -1964,7 +1948,7 @@ class UserElectionsView(TemplateView):
     def get_context_data(self, *args, **kwargs):
         context = super(UserElectionsView, self).get_context_data(**kwargs)
         username = kwargs["username"]
-        self.user_shown = get_object_or_404(User, username=username)
+        self.user_shown = get_user_or_404(username)
 
         context['user_shown'] = self.user_shown
         context['filter'] = self.kwargs["election_filter"]
@@ -2030,8 +2014,8 @@ class AgoraAdminView(UpdateView):
     def dispatch(self, *args, **kwargs):
         username = kwargs['username']
         agoraname = kwargs['agoraname']
-        self.agora = get_object_or_404(Agora, name=agoraname,
-            creator__username=username)
+        self.agora = get_object_or_404(Agora,
+            name=agoraname, creator__username=username)
 
         return super(AgoraAdminView, self).dispatch(*args, **kwargs)
 
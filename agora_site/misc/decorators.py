@@ -4,6 +4,7 @@ from django.db.models.base import ModelBase
 from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
 from django.http import Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
 from guardian.exceptions import GuardianError
 
@@ -113,4 +114,46 @@ def permission_required(perm, lookup_variables=None, **kwargs):
 
             return view_func(*args, **kwargs)
         return wraps(view_func)(wrapped)
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def fragment_cache(public=False, max_age=0, surrogate_keys=None):
+    """
+    Decorator for resource views declaring how an edge cache can store their
+    GET responses when they are embedded as ESI fragments, see USE_ESI.
+
+    Public responses are the same for every user. The edge cache can keep
+    them for ``max_age`` seconds, and they do not vary by cookie (see
+    ESIMiddleware). Other responses are per-user: they are private and vary
+    by cookie.
+
+    :param surrogate_keys: function called with the view kwargs, returning
+    the surrogate keys of the response. Changes in the objects named by them
+    purge the response from the edge cache.
+
+    Examples::
+
+    @fragment_cache(public=True, max_age=settings.MANY_CACHE_SECONDS,
+        surrogate_keys=lambda electionid, **kwargs: ['election-%s' % electionid])
+    def get_extra_data(self, request, **kwargs):
+    """
+    def decorator(view_func):
+        def wrapped(self, request, *args, **kwargs):
+            response = view_func(self, request, *args, **kwargs)
+            if request.method != 'GET' or response.status_code != 200:
+                return response
+
+            if public:
+                # browsers revalidate, only the edge keeps the response
+                patch_cache_control(response, public=True, max_age=0,
+                    s_maxage=max_age)
+                response.public_fragment = True
+            else:
+                patch_cache_control(response, private=True, max_age=0)
+                patch_vary_headers(response, ('Cookie',))
+
+            if surrogate_keys:
+                response['Surrogate-Key'] = ' '.join(surrogate_keys(**kwargs))
+            return response
+        return wraps(view_func)(wrapped)
+    return decorator
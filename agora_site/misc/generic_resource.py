@@ -4,6 +4,9 @@ from simplejson.decoder import JSONDecodeError
 
 from django.conf import settings
 from django.core.paginator import InvalidPage
+from django.db import models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import QuerySet, ValuesQuerySet
 from django.http import Http404, HttpResponseBadRequest
 
 from django.template import RequestContext
@@ -151,32 +154,130 @@ class GenericResourceMixin:
             limit = max(1, min(int(request.GET.get('limit', 20)), 1000))
         except:
             return HttpResponseBadRequest("Sorry, you did not provide valid input data")
-        paginator = Paginator(request.GET, queryset)
+        paginator = Paginator(request.GET, self.defer_list_fields(queryset))
 
         try:
-            object_list = paginator.get_slice(limit, offset)
+            object_list = list(paginator.get_slice(limit, offset))
         except InvalidPage:
             raise Http404("Sorry, no results on that page.")
 
-        objects = []
-
-        for result in object_list:
-            bundle = self.build_bundle(obj=result, request=request)
-            bundle = self.full_dehydrate(bundle)
-            objects.append(bundle)
-
         page = {
             "meta": {
                 "limit": limit,
                 "offset": offset,
-                "total_count": queryset.count()
             },
-            'objects': objects,
+            'objects': self.full_dehydrate_list(request, object_list),
         }
 
+        # counting can be expensive on big tables, clients which do not need
+        # the total can skip it with total_count=false
+        if request.GET.get('total_count') != 'false':
+            page['meta']['total_count'] = queryset.count()
+
         self.log_throttled_access(request)
         return self.create_response(request, page)
 
+    def full_dehydrate_list(self, request, object_list):
+        '''
+        Returns the dehydrated bundles of a page of objects
+        '''
+        self.prefetch_list(request, object_list)
+        objects = []
+
+        for result in object_list:
+            bundle = self.build_bundle(obj=result, request=request)
+            bundle = self.full_dehydrate(bundle)
+            objects.append(bundle)
+        return objects
+
+    def get_list(self, request, **kwargs):
+        '''
+        Same as tastypie's get_list, but calls prefetch_list() with the
+        objects of the page before dehydrating them.
+        '''
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle,
+            **self.remove_api_resource_names(kwargs))
+        sorted_objects = self.defer_list_fields(self.apply_sorting(objects,
+            options=request.GET))
+
+        paginator = self._meta.paginator_class(request.GET, sorted_objects,
+            resource_uri=self.get_resource_uri(), limit=self._meta.limit,
+            max_limit=self._meta.max_limit,
+            collection_name=self._meta.collection_name)
+        to_be_serialized = paginator.page()
+
+        to_be_serialized[self._meta.collection_name] = self.full_dehydrate_list(
+            request, list(to_be_serialized[self._meta.collection_name]))
+        to_be_serialized = self.alter_list_data_to_serialize(request,
+            to_be_serialized)
+        return self.create_response(request, to_be_serialized)
+
+    def prefetch_list(self, request, object_list):
+        '''
+        Called with the objects of a page before they are dehydrated, so that
+        resources can load in bulk what they would otherwise query per object.
+        '''
+        pass
+
+    def defer_list_fields(self, queryset):
+        '''
+        Defers loading the heavy columns of the objects of a queryset that is
+        going to be listed, see get_list_deferred_fields()
+        '''
+        if not isinstance(queryset, QuerySet) or\
+                isinstance(queryset, ValuesQuerySet):
+            return queryset
+
+        select_related = queryset.query.select_related
+        if not isinstance(select_related, dict):
+            select_related = dict()
+
+        deferred = self.get_list_deferred_fields(queryset.model, select_related)
+        if not deferred:
+            return queryset
+        return queryset.defer(*deferred)
+
+    def get_list_deferred_fields(self, model, select_related=None):
+        '''
+        Returns the names of the text and JSON columns of the model that this
+        resource does not serialize, so that lists do not load them. Columns
+        used by dehydrate methods can be loaded anyway listing them in
+        Meta.list_load_fields.
+
+        The related objects loaded with select_related are also covered.
+        '''
+        load_fields = set(getattr(self._meta, 'list_load_fields', None) or [])
+        load_fields.update(field.attribute for field in self.fields.values()
+            if isinstance(field.attribute, basestring))
+
+        deferred = [f.name for f in model._meta.fields
+            if isinstance(f, models.TextField) and f.name not in load_fields]
+
+        for field in self.fields.values():
+            if not isinstance(field, fields.ToOneField) or\
+                    field.attribute not in (select_related or {}):
+                continue
+
+            try:
+                rel = model._meta.get_field(field.attribute).rel
+            except FieldDoesNotExist:
+                continue
+            if rel is None:
+                continue
+
+            # only the uri of not full related objects is serialized
+            if field.full:
+                rel_deferred = field.to_class().get_list_deferred_fields(
+                    rel.to, select_related[field.attribute])
+            else:
+                rel_deferred = [f.name for f in rel.to._meta.fields
+                    if isinstance(f, models.TextField)]
+            deferred.extend('%s__%s' % (field.attribute, name)
+                for name in rel_deferred)
+
+        return deferred
+
     @classmethod
     def api_field_from_django_field(cls, f, default=fields.CharField):
         """
@@ -248,3 +349,6 @@ class GenericMeta:
     always_return_data = True
     include_resource_uri = False
     cache = GenericCache(timeout = settings.CACHE_MIDDLEWARE_SECONDS)
+    # text and JSON columns that lists load even if they are not serialized,
+    # see GenericResourceMixin.get_list_deferred_fields
+    list_load_fields = []
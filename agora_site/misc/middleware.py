@@ -0,0 +1,62 @@
+from django.conf import settings
+
+from agora_site.misc.utils import (open_identity_map, close_identity_map,
+    defer_edge_purges, flush_edge_purges)
+
+
+class ESIMiddleware(object):
+    """
+    Prepares the responses for an edge cache which processes ESI includes,
+    if USE_ESI is enabled:
+
+     * Pages including ESI fragments ask the edge to process them.
+     * Public fragments (see misc.decorators.fragment_cache) do not vary by
+       cookie, even if the session was used to generate them.
+     * The edge cache purges of the changes done by a request are sent
+       once its response is ready, see misc.utils.defer_edge_purges.
+
+    Must be placed before SessionMiddleware, so that it processes the
+    response after the session sets its Vary header, and before
+    TransactionMiddleware, so that purges are sent after the commit.
+    """
+    def process_request(self, request):
+        if settings.USE_ESI and settings.ESI_PURGE_URL:
+            defer_edge_purges()
+
+    def process_response(self, request, response):
+        flush_edge_purges()
+        if not settings.USE_ESI:
+            return response
+
+        if getattr(response, 'public_fragment', False):
+            if response.has_header('Vary'):
+                vary = [header.strip() for header in response['Vary'].split(',')
+                    if header.strip().lower() != 'cookie']
+                if vary:
+                    response['Vary'] = ', '.join(vary)
+                else:
+                    del response['Vary']
+        elif response.get('Content-Type', '').startswith('text/html') and\
+                not getattr(response, 'streaming', False) and\
+                '<esi:include' in response.content:
+            response['Surrogate-Control'] = 'content="ESI/1.0"'
+
+        return response
+
+
+class IdentityMapMiddleware(object):
+    """
+    Opens an identity map for each request, so that the users, profiles,
+    agoras and elections looked up several times while processing it are
+    loaded only once. See misc.utils.identity_map.
+
+    The map is discarded when the response is returned, and also when the
+    next request starts in case the previous one did not return normally.
+    """
+    def process_request(self, request):
+        close_identity_map()
+        open_identity_map()
+
+    def process_response(self, request, response):
+        close_identity_map()
+        return response
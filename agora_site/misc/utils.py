@@ -5,16 +5,17 @@ http://www.djangosnippets.org/snippets/377/
 """
 
 from django.core.urlresolvers import resolve, Resolver404
-from django.http import HttpRequest
+from django.http import HttpRequest, Http404, QueryDict
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.contrib.sites.models import Site
-from django.utils.datastructures import DictWrapper
+from django.utils.datastructures import DictWrapper, SortedDict
 from django.utils import datetime_safe
 from django.core import mail as django_mail
 from django.core.mail import (EmailMultiAlternatives, EmailMessage, send_mail,
     send_mass_mail, get_connection)
 from django.core.serializers.json import DjangoJSONEncoder
+from django.core.cache import cache
 from django.db import models
 from django.db.models import signals
 import json
@@ -22,12 +23,19 @@ from django.views.generic import CreateView
 from django.contrib.auth.models import Permission, User
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
+from django.db.models.query import QuerySet
 from django.shortcuts import _get_queryset
 from django.forms.fields import Field, DateTimeField
 from django.forms.util import ValidationError
 
 
+import copy
 import datetime
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urlparse import urlparse, urlunparse
 import pygeoip
 
 from actstream.signals import action
@@ -90,37 +98,81 @@ class ISODateTimeFormField(DateTimeField):
         from dateutil.parser import parse
         return parse(value)
 
+try:
+    # faster parser, used when available
+    import ujson as fast_json
+except ImportError:
+    fast_json = None
+
+logger = logging.getLogger(__name__)
+
+def json_loads(text):
+    '''
+    Parses JSON text, using ujson when it is installed
+    '''
+    if fast_json is not None:
+        return fast_json.loads(text)
+    return json.loads(text)
+
+class JSONText(object):
+    '''
+    JSON text of a JSONField as loaded from the database, not parsed yet
+    '''
+    def __init__(self, text):
+        self.text = text
+
+class JSONFieldDescriptor(object):
+    '''
+    Stores the text of a JSONField as it is assigned or loaded from the
+    database, and parses it on first access only. Until then, saving the
+    object sends the original text back without serializing it again.
+    '''
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+
+        value = obj.__dict__[self.field.attname]
+        if isinstance(value, JSONText):
+            value = obj.__dict__[self.field.attname] = self.field.parse(
+                value.text)
+        return value
+
+    def __set__(self, obj, value):
+        if isinstance(value, basestring):
+            value = (value and not value.isspace()) and JSONText(value) or None
+        obj.__dict__[self.field.attname] = value
+
 class JSONField(models.TextField):
     """
     JSONField is a generic textfield that neatly serializes/unserializes
     JSON objects seamlessly.
 
     deserialization_params added on 2011-01-09 to provide additional hints at deserialization time
-    """
 
-    # Used so to_python() is called
-    __metaclass__ = models.SubfieldBase
+    The JSON text is parsed lazily on first access, see JSONFieldDescriptor.
+    On PostgreSQL the column can be a native json column, see
+    JSONFIELD_NATIVE_POSTGRESQL.
+    """
 
     def __init__(self, name=None, json_type=None, deserialization_params=None, **kwargs):
         self.json_type = json_type
         self.deserialization_params = deserialization_params
         super(JSONField, self).__init__(name, **kwargs)
 
-    def to_python(self, value):
-        """Convert our string value to JSON after we load it from the DB"""
-        if self.json_type:
-            if isinstance(value, self.json_type):
-                return value
-
-        if isinstance(value, dict) or isinstance(value, list):
-            return value
-
-        if (type(value)==unicode and len(value.strip()) == 0) or value == None:
-            return None
+    def contribute_to_class(self, cls, name):
+        super(JSONField, self).contribute_to_class(cls, name)
+        setattr(cls, self.name, JSONFieldDescriptor(self))
 
+    def parse(self, text):
+        """Convert JSON text to python"""
         try:
-            parsed_value = json.loads(value)
-        except:
+            parsed_value = json_loads(text)
+        except ValueError, e:
+            logger.warning('Invalid JSON in %s.%s: %s', self.model.__name__,
+                self.name, e)
             return None
 
         if self.json_type and parsed_value:
@@ -128,11 +180,31 @@ class JSONField(models.TextField):
 
         return parsed_value
 
+    def to_python(self, value):
+        """Convert our string value to JSON after we load it from the DB"""
+        if isinstance(value, JSONText):
+            value = value.text
+
+        if not isinstance(value, basestring):
+            return value
+
+        if len(value.strip()) == 0:
+            return None
+
+        return self.parse(value)
+
     # we should never look up by JSON field anyways.
     # def get_prep_lookup(self, lookup_type, value)
 
+    def pre_save(self, model_instance, add):
+        # read the value without parsing it, if it was not accessed
+        return model_instance.__dict__.get(self.attname)
+
     def get_prep_value(self, value):
         """Convert our JSON object to a string before we save"""
+        if isinstance(value, JSONText):
+            return value.text
+
         if isinstance(value, basestring):
             return value
 
@@ -169,6 +241,10 @@ class JSONField(models.TextField):
         # mapped to one of the built-in Django field types. In this case, you
         # can implement db_type() instead of get_internal_type() to specify
         # exactly which wacky database column type you want to use.
+        if connection.vendor == 'postgresql' and\
+                settings.JSONFIELD_NATIVE_POSTGRESQL:
+            return 'json'
+
         data = DictWrapper(self.__dict__, connection.ops.quote_name, "qn_")
         real_internal_type = super(JSONField, self).get_internal_type()
         try:
@@ -414,6 +490,398 @@ def rest(path, query={}, data={}, headers={}, method="GET", request=None):
      #container is the untouched content before HttpResponse mangles it
     return (res.status_code, res._container)
 
+class RestBatch(threading.local):
+    objects = None
+
+_rest_batch = RestBatch()
+
+@contextmanager
+def rest_batch():
+    '''
+    Within this context, the objects looked up with get_cached_object() are
+    loaded only once and shared by all the API calls done with rest(), so
+    that several calls embedded in the same page or batch request do not
+    load the same agoras, elections or users again. Only meant for read
+    calls.
+    '''
+    if _rest_batch.objects is not None:
+        # nested batches share the outer one
+        yield
+        return
+
+    _rest_batch.objects = dict()
+    try:
+        yield
+    finally:
+        _rest_batch.objects = None
+
+def get_cached_object(model, **kwargs):
+    '''
+    Same as model.objects.get(**kwargs), but within a rest_batch() objects
+    are loaded only once per batch.
+    '''
+    if len(kwargs) == 1:
+        obj = get_mapped_object(model, *kwargs.items()[0])
+        if obj is not None:
+            return obj
+
+    objects = _rest_batch.objects
+    if objects is None:
+        return model._default_manager.get(**kwargs)
+
+    lookup = tuple(sorted([(key == 'id' and 'pk' or key, unicode(value))
+        for key, value in kwargs.items()]))
+    key = (model, lookup)
+    if key not in objects:
+        objects[key] = model._default_manager.get(**kwargs)
+    return objects[key]
+
+def get_cached_object_or_404(model, **kwargs):
+    '''
+    Same as get_object_or_404(), using get_cached_object()
+    '''
+    try:
+        return get_cached_object(model, **kwargs)
+    except model.DoesNotExist:
+        raise Http404('No %s matches the given query.' % model._meta.object_name)
+
+def rest_batch_get(calls, request=None):
+    '''
+    Runs several GET calls to the API within a rest_batch(). Calls are given
+    as a dict of name -> path, which may include a query string. Returns a
+    dict of name -> (status, content), like rest().
+    '''
+    results = dict()
+    with rest_batch():
+        for name, url in calls.items():
+            (scheme, netloc, path, params, query, fragment) = urlparse(url)
+            results[name] = rest(path, query=QueryDict(query), request=request)
+    return results
+
+class IdentityMap(threading.local):
+    objects = None
+
+_identity_map = IdentityMap()
+
+_identity_lookups = dict()
+
+@contextmanager
+def identity_map():
+    '''
+    Within this context, the instances of the models registered with
+    register_identity_map() are loaded only once: get() lookups by primary
+    key or by a one to one field return the instance already loaded, if any,
+    and the relations between the loaded instances are attached to them, so
+    that for example user.get_profile() or election.agora do not query the
+    database again. IdentityMapMiddleware opens one for each request.
+    '''
+    if not open_identity_map():
+        # nested contexts share the outer one
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        close_identity_map()
+
+def open_identity_map():
+    '''
+    Opens an identity map for the current thread. Returns False if there was
+    one open already, which is kept.
+    '''
+    if _identity_map.objects is not None:
+        return False
+    _identity_map.objects = dict()
+    return True
+
+def close_identity_map():
+    _identity_map.objects = None
+
+def identity_lookups(model):
+    '''
+    Returns a dict lookup -> attname with the get() lookups of the model
+    resolved by the identity map, i.e. those by primary key or by a one to one
+    field
+    '''
+    if model in _identity_lookups:
+        return _identity_lookups[model]
+
+    opts = model._meta
+    lookups = {'pk': opts.pk.attname}
+    for field in opts.fields:
+        if not field.primary_key and\
+                not isinstance(field, models.OneToOneField):
+            continue
+        names = [field.name, field.attname]
+        if field.rel is not None:
+            names += ['%s__pk' % field.name,
+                '%s__%s' % (field.name, field.rel.field_name)]
+        for name in names:
+            lookups[name] = field.attname
+    for name in lookups.keys():
+        lookups['%s__exact' % name] = lookups[name]
+
+    _identity_lookups[model] = lookups
+    return lookups
+
+def get_mapped_object(model, lookup, value):
+    '''
+    Returns the instance of the model loaded in the current identity map for
+    the given get() lookup and value, or None
+    '''
+    objects = _identity_map.objects
+    if objects is None or model not in _identity_lookups:
+        return None
+
+    attname = _identity_lookups[model].get(lookup)
+    if attname is None:
+        return None
+    if isinstance(value, models.Model):
+        value = value.pk
+    obj = objects.get((model, attname, unicode(value)))
+    # instances built in memory and never saved are not mapped
+    if obj is None or obj._state.adding:
+        return None
+    return obj
+
+def map_objects(*objects):
+    '''
+    Adds the given instances to the current identity map, if any. Instances
+    already in it are kept.
+    '''
+    for obj in objects:
+        if obj is not None:
+            map_object(obj.__class__, obj)
+
+def map_object(sender, instance, **kwargs):
+    '''
+    Adds an instance of a model registered with register_identity_map() to
+    the current identity map, and attaches to it the related instances
+    already loaded. Connected to post_init.
+
+    At post_init it is not known yet whether the instance was loaded from the
+    database or just built in memory, like Agora(id=agora_id). The latter
+    ones are left with _state.adding set, so get_mapped_object() skips them
+    and they are replaced by the next instance loaded.
+    '''
+    objects = _identity_map.objects
+    if objects is None or sender not in _identity_lookups or\
+            instance._deferred or instance.pk is None:
+        return
+
+    for attname in set(_identity_lookups[sender].values()):
+        value = getattr(instance, attname)
+        if value is None:
+            continue
+        key = (sender, attname, unicode(value))
+        if key not in objects or objects[key]._state.adding:
+            objects[key] = instance
+
+    # forward relations from this instance
+    for field in sender._meta.fields:
+        if field.rel is None or field.rel.to not in _identity_lookups:
+            continue
+        related = get_mapped_object(field.rel.to, field.rel.field_name,
+            getattr(instance, field.attname))
+        if related is not None:
+            instance.__dict__.setdefault(field.get_cache_name(), related)
+
+    # one to one relations to this instance
+    for related in sender._meta.get_all_related_objects():
+        field = related.field
+        if not isinstance(field, models.OneToOneField) or\
+                related.model not in _identity_lookups:
+            continue
+        obj = get_mapped_object(related.model, field.attname,
+            getattr(instance, field.rel.field_name))
+        if obj is not None:
+            instance.__dict__.setdefault(related.get_cache_name(), obj)
+
+def unmap_object(sender, instance, **kwargs):
+    '''
+    Removes a saved or deleted instance from the current identity map, so
+    that other copies of it are not returned any more. Connected to post_save
+    and post_delete.
+    '''
+    objects = _identity_map.objects
+    if objects is None:
+        return
+
+    for key, obj in objects.items():
+        if key[0] is sender and obj.pk == instance.pk:
+            del objects[key]
+
+def register_identity_map(*models):
+    '''
+    Enables the identity map for the instances of the given models. Lookups
+    go through it only with IdentityMapManager, other managers just feed it.
+    '''
+    for model in models:
+        identity_lookups(model)
+        signals.post_init.connect(map_object, sender=model)
+        signals.post_save.connect(unmap_object, sender=model)
+        signals.post_delete.connect(unmap_object, sender=model)
+
+class IdentityMapQuerySet(QuerySet):
+    '''
+    QuerySet whose get() returns the instance loaded in the current identity
+    map, if any, see identity_map()
+    '''
+    def get(self, *args, **kwargs):
+        query = self.query
+        if not args and len(kwargs) == 1 and not query.where.children and\
+                not query.select_for_update and not query.extra and\
+                not query.deferred_loading[0]:
+            obj = get_mapped_object(self.model, *kwargs.items()[0])
+            if obj is not None:
+                return obj
+        return super(IdentityMapQuerySet, self).get(*args, **kwargs)
+
+class IdentityMapManagerMixin(object):
+    '''
+    Manager mixin that looks up by primary key and one to one fields through
+    the identity map, also when following relations
+    '''
+    use_for_related_fields = True
+
+    def get_query_set(self):
+        return IdentityMapQuerySet(self.model, using=self._db)
+
+class IdentityMapManager(IdentityMapManagerMixin, models.Manager):
+    pass
+
+def object_cache_key(model, pk):
+    '''
+    Key under which an instance of the given model is kept in the object
+    cache, see cache_objects()
+    '''
+    opts = model._meta
+    return 'object_%s_%s_%s' % (opts.app_label, opts.module_name, pk)
+
+def cache_objects(*objects):
+    '''
+    Stores the given model instances in the object cache for
+    OBJECT_CACHE_SECONDS. The related objects attached to them are not
+    stored along, as they are cached and invalidated on their own.
+    '''
+    values = dict()
+    for obj in objects:
+        if obj is None:
+            continue
+        copied = copy.copy(obj)
+        for key in obj.__dict__.keys():
+            if key.startswith('_') and key.endswith('_cache'):
+                del copied.__dict__[key]
+        values[object_cache_key(obj.__class__, obj.pk)] = copied
+    cache.set_many(values, settings.OBJECT_CACHE_SECONDS)
+
+def get_cached_objects(*lookups):
+    '''
+    Given some (model, pk) pairs, returns a dict (model, pk) -> instance
+    with the ones found in the object cache
+    '''
+    keys = dict([(object_cache_key(model, pk), (model, pk))
+        for model, pk in lookups if pk is not None])
+    found = cache.get_many(keys.keys())
+    return dict([(keys[key], obj) for key, obj in found.items()])
+
+def invalidate_cached_object(sender, instance, **kwargs):
+    '''
+    Removes a saved or deleted instance from the object cache
+    '''
+    cache.delete(object_cache_key(sender, instance.pk))
+
+class EdgePurges(threading.local):
+    keys = None
+
+_edge_purges = EdgePurges()
+
+def defer_edge_purges():
+    '''
+    Starts collecting the surrogate keys purged in the current thread, so
+    that they are purged by flush_edge_purges() once the request transaction
+    has committed. Otherwise the edge could fetch and keep the old fragments
+    again before the changes are visible. Used by misc.middleware.ESIMiddleware
+    '''
+    _edge_purges.keys = set()
+
+def purge_edge_keys(keys):
+    '''
+    Purges from the edge cache the API fragments tagged with any of the given
+    surrogate keys, see misc.decorators.fragment_cache
+    '''
+    if _edge_purges.keys is not None:
+        _edge_purges.keys.update(keys)
+        return
+
+    from agora_site.agora_core.tasks.esi import purge_surrogate_keys
+    purge_surrogate_keys.delay(sorted(keys))
+
+def flush_edge_purges():
+    '''
+    Stops collecting the purged surrogate keys in the current thread, and
+    purges the collected ones
+    '''
+    keys, _edge_purges.keys = _edge_purges.keys, None
+    if keys:
+        purge_edge_keys(keys)
+
+REST_CACHE_VERSION_KEY = 'rest_cache_version'
+
+# API calls whose responses depend on the current time, like the elections
+# that are open now, and which are never cached
+REST_CACHE_EXCLUDED_CALLS = ('open_elections',)
+
+def is_rest_call_cached(path):
+    '''
+    Returns whether the response of an API call can be cached, see
+    REST_CACHE_EXCLUDED_CALLS
+    '''
+    bits = path.strip('/').split('/')
+    return not set(bits).intersection(REST_CACHE_EXCLUDED_CALLS)
+
+def get_rest_cache_version():
+    '''
+    Returns the current version of the data served by the API. Responses
+    cached under an older version are never used again.
+    '''
+    version = cache.get(REST_CACHE_VERSION_KEY)
+    if version is None:
+        # start from a value no evicted version can have reached
+        cache.add(REST_CACHE_VERSION_KEY, int(time.time() * 1000000))
+        version = cache.get(REST_CACHE_VERSION_KEY)
+    return version
+
+def bump_rest_cache_version():
+    '''
+    Invalidates all the cached API responses. Responses embed related
+    objects, like the creator of an agora, so any change can affect calls
+    about other objects.
+    '''
+    try:
+        cache.incr(REST_CACHE_VERSION_KEY)
+    except ValueError:
+        get_rest_cache_version()
+
+def rest_cache_key(path, query, data, method, request=None, version=None):
+    '''
+    Key under which the response of an in-process API call done with rest()
+    is cached. Responses depend on the data version, the user and the
+    language.
+    '''
+    from django.utils import translation
+    import hashlib
+
+    user_id = 0
+    if request and request.user.is_authenticated():
+        user_id = request.user.id
+    if version is None:
+        version = get_rest_cache_version()
+    call = u'%s %s?%s %s' % (method, path, query.urlencode(), data)
+    return 'rest_%s_%d_%s_%s' % (version, user_id, translation.get_language(),
+        hashlib.md5(call.encode('utf-8')).hexdigest())
+
 class CustomNoneSerializer(Serializer):
     """
     A custom serializer for TastyPie allowing "none" as an encoding type.
@@ -469,6 +937,39 @@ class FakeHttpRequest(HttpRequest):
         return 'none/none'
 
 
+class LRUCache(object):
+    '''
+    Small, process local and thread safe LRU cache. Entries expire after
+    timeout seconds, so that stale values are not served for long.
+    '''
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # entries in least recently used order
+        self.entries = SortedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                return default
+            # reinserting marks it as the most recently used
+            self.entries[key] = entry
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.timeout, value)
+            while len(self.entries) > self.size:
+                del self.entries[self.entries.keys()[0]]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 def clean_html(text, to_plaintext=False):
     if isinstance(text, str):
         text = unicode(text, 'utf-8')
@@ -24,3 +24,7 @@ HAYSTACK_CONNECTIONS = {
         'PATH': os.path.join(ROOT_PATH, 'whoosh_test_index'),
     },
 }
+
+SEARCH_INDEX_LOCK_FILE = os.path.join(ROOT_PATH, 'whoosh_test_index.lock')
+
+RESULT_ARTIFACTS_PATH = os.path.join(ROOT_PATH, 'test_media', 'elections', 'results')
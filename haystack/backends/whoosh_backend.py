@@ -53,6 +53,9 @@ DATETIME_REGEX = re.compile('^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})T(?
 LOCALS = threading.local()
 LOCALS.RAM_STORE = None
 
+# Maximum number of narrow query filters cached per searcher.
+NARROW_FILTER_CACHE_SIZE = 100
+
 
 class WhooshSearchBackend(BaseSearchBackend):
     # Word reserved by Whoosh for special use.
@@ -85,6 +88,9 @@ class WhooshSearchBackend(BaseSearchBackend):
 
         self.log = logging.getLogger('haystack')
 
+        # Searchers are not shared between threads.
+        self._searchers = threading.local()
+
     def setup(self):
         """
         Defers loading until needed.
@@ -166,6 +172,56 @@ class WhooshSearchBackend(BaseSearchBackend):
 
         return (content_field_name, Schema(**schema_fields))
 
+    def get_searcher(self):
+        """
+        Returns the searcher of the current thread, which is kept open between
+        queries. It is refreshed when the index generation changes, reusing
+        the readers of the segments which did not change.
+        """
+        local = self._searchers
+        searcher = getattr(local, 'searcher', None)
+
+        if searcher is None or local.index is not self.index:
+            # The index was recreated by setup().
+            if searcher is not None:
+                searcher.close()
+
+            searcher = self.index.searcher()
+            local.index = self.index
+            local.filters = {}
+        elif not searcher.up_to_date():
+            searcher = searcher.refresh()
+            local.filters = {}
+
+        local.searcher = searcher
+        return searcher
+
+    def get_narrow_filter(self, searcher, narrow_queries):
+        """
+        Returns the set of document numbers matching all the narrow queries,
+        to be used as a search filter. The documents matching each query are
+        cached until the searcher is refreshed, so that the model restriction
+        of every search is not searched again.
+        """
+        filters = self._searchers.filters
+        narrowed = None
+
+        for nq in sorted(narrow_queries):
+            docs = filters.get(nq)
+
+            if docs is None:
+                if len(filters) >= NARROW_FILTER_CACHE_SIZE:
+                    filters.clear()
+
+                docs = filters[nq] = set(searcher.docs_for_query(self.parser.parse(force_unicode(nq))))
+
+            if narrowed is None:
+                narrowed = docs
+            else:
+                narrowed = narrowed & docs
+
+        return narrowed
+
     def update(self, index, iterable, commit=True):
         if not self.setup_complete:
             self.setup()
@@ -319,7 +375,6 @@ class WhooshSearchBackend(BaseSearchBackend):
             warnings.warn("Whoosh does not handle query faceting.", Warning, stacklevel=2)
 
         narrowed_results = None
-        self.index = self.index.refresh()
 
         if limit_to_registered_models is None:
             limit_to_registered_models = getattr(settings, 'HAYSTACK_LIMIT_TO_REGISTERED_MODELS', True)
@@ -339,30 +394,18 @@ class WhooshSearchBackend(BaseSearchBackend):
 
             narrow_queries.add(' OR '.join(['%s:%s' % (DJANGO_CT, rm) for rm in model_choices]))
 
-        narrow_searcher = None
+        searcher = self.get_searcher()
 
         if narrow_queries is not None:
-            # Potentially expensive? I don't see another way to do it in Whoosh...
-            narrow_searcher = self.index.searcher()
-
-            for nq in narrow_queries:
-                recent_narrowed_results = narrow_searcher.search(self.parser.parse(force_unicode(nq)))
-
-                if len(recent_narrowed_results) <= 0:
-                    return {
-                        'results': [],
-                        'hits': 0,
-                    }
-
-                if narrowed_results:
-                    narrowed_results.filter(recent_narrowed_results)
-                else:
-                   narrowed_results = recent_narrowed_results
+            narrowed_results = self.get_narrow_filter(searcher, narrow_queries)
 
-        self.index = self.index.refresh()
+            if not narrowed_results:
+                return {
+                    'results': [],
+                    'hits': 0,
+                }
 
-        if self.index.doc_count():
-            searcher = self.index.searcher()
+        if searcher.doc_count():
             parsed_query = self.parser.parse(query_string)
 
             # In the event of an invalid/stopworded query, recover gracefully.
@@ -377,11 +420,10 @@ class WhooshSearchBackend(BaseSearchBackend):
             if not end_offset is None and end_offset <= 0:
                 end_offset = 1
 
-            raw_results = searcher.search(parsed_query, limit=end_offset, sortedby=sort_by, reverse=reverse)
-
-            # Handle the case where the results have been narrowed.
-            if narrowed_results is not None:
-                raw_results.filter(narrowed_results)
+            # Narrowed results are filtered before applying the limit. The
+            # empty mask works around Whoosh failing to count filtered results
+            # when no mask is given.
+            raw_results = searcher.search(parsed_query, limit=end_offset, sortedby=sort_by, reverse=reverse, filter=narrowed_results, mask=set())
 
             # Determine the page.
             page_num = 0
@@ -412,13 +454,7 @@ class WhooshSearchBackend(BaseSearchBackend):
                     'spelling_suggestion': None,
                 }
 
-            results = self._process_results(raw_page, highlight=highlight, query_string=query_string, spelling_query=spelling_query, result_class=result_class)
-            searcher.close()
-
-            if hasattr(narrow_searcher, 'close'):
-                narrow_searcher.close()
-
-            return results
+            return self._process_results(raw_page, highlight=highlight, query_string=query_string, spelling_query=spelling_query, result_class=result_class)
         else:
             if self.include_spelling:
                 if spelling_query:
@@ -449,7 +485,6 @@ class WhooshSearchBackend(BaseSearchBackend):
         field_name = self.content_field_name
         narrow_queries = set()
         narrowed_results = None
-        self.index = self.index.refresh()
 
         if limit_to_registered_models is None:
             limit_to_registered_models = getattr(settings, 'HAYSTACK_LIMIT_TO_REGISTERED_MODELS', True)
@@ -472,25 +507,16 @@ class WhooshSearchBackend(BaseSearchBackend):
         if additional_query_string and additional_query_string != '*':
             narrow_queries.add(additional_query_string)
 
-        narrow_searcher = None
+        searcher = self.get_searcher()
 
         if narrow_queries is not None:
-            # Potentially expensive? I don't see another way to do it in Whoosh...
-            narrow_searcher = self.index.searcher()
-
-            for nq in narrow_queries:
-                recent_narrowed_results = narrow_searcher.search(self.parser.parse(force_unicode(nq)))
+            narrowed_results = self.get_narrow_filter(searcher, narrow_queries)
 
-                if len(recent_narrowed_results) <= 0:
-                    return {
-                        'results': [],
-                        'hits': 0,
-                    }
-
-                if narrowed_results:
-                    narrowed_results.filter(recent_narrowed_results)
-                else:
-                   narrowed_results = recent_narrowed_results
+            if not narrowed_results:
+                return {
+                    'results': [],
+                    'hits': 0,
+                }
 
         # Prevent against Whoosh throwing an error. Requires an end_offset
         # greater than 0.
@@ -514,21 +540,15 @@ class WhooshSearchBackend(BaseSearchBackend):
         # Increment because Whoosh uses 1-based page numbers.
         page_num += 1
 
-        self.index = self.index.refresh()
         raw_results = EmptyResults()
 
-        if self.index.doc_count():
+        if searcher.doc_count():
             query = "%s:%s" % (ID, get_identifier(model_instance))
-            searcher = self.index.searcher()
             parsed_query = self.parser.parse(query)
             results = searcher.search(parsed_query)
 
             if len(results):
-                raw_results = results[0].more_like_this(field_name, top=end_offset)
-
-            # Handle the case where the results have been narrowed.
-            if narrowed_results is not None and hasattr(raw_results, 'filter'):
-                raw_results.filter(narrowed_results)
+                raw_results = results[0].more_like_this(field_name, top=end_offset, filter=narrowed_results)
 
         try:
             raw_page = ResultsPage(raw_results, page_num, page_length)
@@ -542,13 +562,7 @@ class WhooshSearchBackend(BaseSearchBackend):
                 'spelling_suggestion': None,
             }
 
-        results = self._process_results(raw_page, result_class=result_class)
-        searcher.close()
-
-        if hasattr(narrow_searcher, 'close'):
-            narrow_searcher.close()
-
-        return results
+        return self._process_results(raw_page, result_class=result_class)
 
     def _process_results(self, raw_page, highlight=False, query_string='', spelling_query=None, result_class=None):
         from haystack import connections
@@ -308,6 +308,33 @@ class SearchIndex(threading.local):
         """
         return None
 
+    def get_journaled_pks(self, using=None):
+        """
+        Get the primary keys of the objects saved or deleted since they were
+        last indexed, as recorded by a change journal.
+
+        Used by ``update_index --incremental`` to pick up changes which are
+        not reflected by ``get_updated_field`` and to find removed objects
+        without walking the whole index. Should return None if the index
+        keeps no journal.
+        """
+        return None
+
+    def get_last_update_date(self, using=None):
+        """
+        Get the date the last successful incremental ``update_index`` run
+        started, or None if there was none. When None, incremental runs fall
+        back to a full update.
+        """
+        return None
+
+    def set_last_update_date(self, date, using=None):
+        """
+        Records the date a successful incremental ``update_index`` run
+        started. By default nothing is recorded.
+        """
+        pass
+
     def should_update(self, instance, **kwargs):
         """
         Determine if an object should be updated in the index.
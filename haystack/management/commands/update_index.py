@@ -6,6 +6,7 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.management.base import LabelCommand
 from django.db import reset_queries
+from django.db.models import Q
 from django.utils.encoding import smart_str
 from django.utils import timezone
 from haystack import connections as haystack_connections
@@ -88,6 +89,19 @@ def do_remove(backend, index, model, pks_seen, start, upper_bound, verbosity=1):
             backend.remove(".".join([result.app_label, result.model_name, str(result.pk)]))
 
 
+def do_remove_pks(backend, index, model, pks, verbosity=1):
+    # Only the given pks are candidates for removal, so there is no need to
+    # walk through everything in the index.
+    pks_seen = set([smart_str(pk) for pk in index.index_queryset().filter(pk__in=pks).values_list('pk', flat=True)])
+
+    for pk in pks:
+        if not smart_str(pk) in pks_seen:
+            if verbosity >= 2:
+                print "  removing %s." % pk
+
+            backend.remove(".".join([model._meta.app_label, model._meta.module_name, smart_str(pk)]))
+
+
 class Command(LabelCommand):
     help = "Freshens the index for the given app(s)."
     base_options = (
@@ -117,6 +131,9 @@ class Command(LabelCommand):
             default=0, type='int',
             help='Allows for the use multiple workers to parallelize indexing. Requires multiprocessing.'
         ),
+        make_option('-i', '--incremental', action='store_true', dest='incremental',
+            default=False, help='Only index the objects updated or journaled since the last incremental run, and remove the journaled objects which are no longer present in the database.'
+        ),
     )
     option_list = LabelCommand.option_list + base_options
 
@@ -128,6 +145,7 @@ class Command(LabelCommand):
         self.remove = options.get('remove', False)
         self.using = options.get('using')
         self.workers = int(options.get('workers', 0))
+        self.incremental = options.get('incremental', False)
         self.backend = haystack_connections[self.using].get_backend()
 
         age = options.get('age', DEFAULT_AGE)
@@ -206,6 +224,10 @@ class Command(LabelCommand):
                     print "Skipping '%s' - no index." % model
                 continue
 
+            if self.incremental:
+                self.update_incremental(index, model)
+                continue
+
             qs = index.build_queryset(start_date=self.start_date, end_date=self.end_date)
             total = qs.count()
 
@@ -252,3 +274,49 @@ class Command(LabelCommand):
                 if self.workers > 0:
                     pool = multiprocessing.Pool(self.workers)
                     pool.map(worker, ghetto_queue)
+
+    def update_incremental(self, index, model):
+        """
+        Indexes the objects updated since the last incremental run according
+        to the index updated field, together with the ones in the index change
+        journal. Journaled objects missing from the database are removed.
+
+        Falls back to a full update (and a full removal pass, if requested)
+        when there was no previous run or the index has neither an updated
+        field nor a journal.
+        """
+        run_date = timezone.now()
+        last_update_date = index.get_last_update_date(using=self.using)
+        journaled_pks = index.get_journaled_pks(using=self.using)
+        updated_field = index.get_updated_field()
+        qs = index.build_queryset()
+        batch_size = self.batchsize or self.backend.batch_size
+        full_update = last_update_date is None or (journaled_pks is None and not updated_field)
+
+        if not full_update:
+            lookup = Q(pk__in=list(journaled_pks or []))
+
+            if updated_field:
+                lookup |= Q(**{'%s__gte' % updated_field: last_update_date})
+
+            qs = qs.filter(lookup)
+
+        total = qs.count()
+
+        if self.verbosity >= 1:
+            print "Indexing %d %s%s." % (total, smart_str(model._meta.verbose_name_plural), '' if full_update else ' incrementally')
+
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            do_update(self.backend, index, qs, start, end, total, self.verbosity)
+
+        if full_update:
+            if self.remove:
+                pks_seen = set([smart_str(pk) for pk in index.index_queryset().values_list('pk', flat=True)])
+
+                for start in range(0, len(pks_seen), batch_size):
+                    do_remove(self.backend, index, model, pks_seen, start, start + batch_size, self.verbosity)
+        elif journaled_pks:
+            do_remove_pks(self.backend, index, model, journaled_pks, self.verbosity)
+
+        index.set_last_update_date(run_date, using=self.using)